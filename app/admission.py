@@ -0,0 +1,203 @@
+import logging
+from time import perf_counter
+from typing import Callable, Dict, TypeVar
+from fastapi import status
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from starlette.routing import BaseRoute
+from app.config import settings
+from app.context import get_request_context, resolve_route
+from app.metrics import ADMISSION_IN_FLIGHT, ADMISSION_LIMIT, ADMISSION_REJECTED
+
+F = TypeVar("F", bound=Callable)
+
+AUTH = "auth"
+READ = "read"
+WRITE = "write"
+PRIORITY = "priority"
+
+EXEMPT_PREFIXES = ("/metrics", "/admin", "/docs", "/redoc", "/openapi.json")
+AUTH_PREFIXES = ("/auth", "/registration")
+
+logger = logging.getLogger(__name__)
+
+
+def admission_class(name: str) -> Callable[[F], F]:
+    """Put a route in another admission class than the one derived from its path and method."""
+
+    def decorator(endpoint: F) -> F:
+        endpoint.__admission_class__ = name
+        return endpoint
+
+    return decorator
+
+
+class AIMDLimiter():
+    """Concurrency limit growing by one per window of full use, cut by a factor when the pool is congested.
+
+    A cut only applies to requests started after the previous cut, so a burst of congested requests
+    finishing together shrinks the limit once.
+    """
+
+    def __init__(self, name: str, initial: float, minimum: float, maximum: float, backoff: float = 0.9,
+                 shared: "SharedCap | None" = None):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.backoff = backoff
+        self.shared = shared
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        ADMISSION_LIMIT.set(name, value=self.limit)
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        if self.shared is not None and not self.shared.try_acquire():
+            return False
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.inc(self.name)
+        return True
+
+    def release(self, started_at: float, congested: bool) -> None:
+        saturated = self.in_flight >= int(self.limit) // 2
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.dec(self.name)
+        if self.shared is not None:
+            self.shared.release()
+
+        if congested:
+            if started_at >= self._last_decrease:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._last_decrease = perf_counter()
+        elif saturated:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        ADMISSION_LIMIT.set(self.name, value=self.limit)
+
+
+class SharedCap():
+    """Fixed cap on the requests of several classes together, on top of the limit of each class."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        ADMISSION_LIMIT.set(name, value=limit)
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.inc(self.name)
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.dec(self.name)
+
+
+def _new_limiters() -> Dict[str, AIMDLimiter]:
+    # the pool is shared: the other classes together stay below its capacity minus the priority slots,
+    # so the priority requests always find a connection, whatever the floors of the other classes,
+    # and the priority requests alone stay below its capacity
+    pool_capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    shared = SharedCap("non_priority", max(1, pool_capacity - settings.ADMISSION_PRIORITY_RESERVED))
+    limiters = {
+        name: AIMDLimiter(
+            name,
+            initial=min(max(settings.ADMISSION_INITIAL_LIMIT, settings.ADMISSION_MIN_LIMIT), shared.limit),
+            minimum=min(settings.ADMISSION_MIN_LIMIT, shared.limit),
+            maximum=min(settings.ADMISSION_MAX_LIMIT, shared.limit),
+            shared=shared
+        )
+        for name in (AUTH, READ, WRITE)
+    }
+    limiters[PRIORITY] = AIMDLimiter(
+        PRIORITY,
+        initial=min(max(settings.ADMISSION_INITIAL_LIMIT, settings.ADMISSION_PRIORITY_RESERVED), pool_capacity),
+        minimum=min(settings.ADMISSION_PRIORITY_RESERVED, pool_capacity),
+        maximum=min(settings.ADMISSION_MAX_LIMIT, pool_capacity)
+    )
+    return limiters
+
+
+LIMITERS = _new_limiters()
+
+
+def route_class(route: BaseRoute, method: str) -> str | None:
+    """The admission class of a route, None for the routes never shed."""
+    declared = getattr(getattr(route, "endpoint", None), "__admission_class__", None)
+    if declared is not None:
+        return declared
+    path = getattr(route, "path", "")
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith(AUTH_PREFIXES):
+        return AUTH
+    return READ if method in ("GET", "HEAD") else WRITE
+
+
+def overloaded_response(detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": detail},
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+    )
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware capping the concurrent requests of each route class (auth, read, write, priority).
+
+    The limits adapt to the time requests wait for a pooled connection. Requests above the limit are
+    shed at once with 503 and Retry-After instead of queueing in the pool until pool_timeout, and a
+    pool timeout is answered the same way instead of a 500.
+    """
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        route = resolve_route(self.router.routes, scope)
+        name = route_class(route, scope["method"]) if route is not None else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = LIMITERS[name]
+        if not limiter.try_acquire():
+            # label the metrics of the shed request with its route, the router never sees it
+            scope["route"] = route
+            ADMISSION_REJECTED.inc(name, "limit")
+            await overloaded_response("The server is overloaded, retry later")(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        ctx = get_request_context()
+        started_at = ctx.started_at if ctx is not None else perf_counter()
+        congested = False
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except PoolTimeoutError:
+            congested = True
+            if response_started:
+                raise
+            ADMISSION_REJECTED.inc(name, "pool_timeout")
+            logger.warning(f"{scope['method']} {getattr(route, 'path', '')} timed out waiting for a database connection")
+            await overloaded_response("No database connection available, retry later")(scope, receive, send)
+        finally:
+            pool_wait = ctx.pool_wait if ctx is not None else 0.0
+            congested = congested or pool_wait * 1000 > settings.ADMISSION_POOL_WAIT_TARGET_MS
+            limiter.release(started_at, congested)
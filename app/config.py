@@ -10,6 +10,72 @@ class Settings(BaseSettings):
     DB_PASSWORD: str | None = config.get("POSTGRES_PASSWORD")
     DB_NAME: str | None = config.get("POSTGRES_DB")
     DB_TEST_NAME: str | None = config.get("POSTGRES_TEST_DB", "club_db_test")
+    DB_ECHO: bool = config.get("DB_ECHO", False)
+    DB_POOL_SIZE: int = config.get("DB_POOL_SIZE", 5)
+    DB_MAX_OVERFLOW: int = config.get("DB_MAX_OVERFLOW", 10)
+    DB_WARM_UP: bool = config.get("DB_WARM_UP", True) # open the pool and prepare the hot statements on startup
+    DB_PGBOUNCER_MODE: bool = config.get("DB_PGBOUNCER_MODE", False) # set when DB_HOST/DB_PORT point to PgBouncer in transaction pooling
+    DB_PGBOUNCER_POOL_RECYCLE: int = config.get("DB_PGBOUNCER_POOL_RECYCLE", 300) # seconds, below PgBouncer's client_idle_timeout
+    DB_COPY_THRESHOLD: int = config.get("DB_COPY_THRESHOLD", 100) # rows above which a training fan-out is written with COPY
+
+    SECRET_KEY: str | None = config.get("SECRET_KEY")
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = config.get("ACCESS_TOKEN_EXPIRE_MINUTES", 30)
+    ALGHORITHM: str = config.get("ALGHORITHM", "HS256")
+
+    METRICS_ENABLED: bool = config.get("METRICS_ENABLED", True)
+    METRICS_ALLOW_REMOTE: bool = config.get("METRICS_ALLOW_REMOTE", False) # by default /metrics answers only to local scrapers
+
+    ADMIN_TOKEN: str | None = config.get("ADMIN_TOKEN") # admin endpoints are disabled when not set
+
+    SLOW_QUERY_THRESHOLD_MS: float = config.get("SLOW_QUERY_THRESHOLD_MS", 200)
+    SLOW_QUERY_LOG_FILE: str = config.get("SLOW_QUERY_LOG_FILE", "logs/slow_queries.log")
+    SLOW_QUERY_LOG_MAX_BYTES: int = config.get("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024)
+    SLOW_QUERY_LOG_BACKUP_COUNT: int = config.get("SLOW_QUERY_LOG_BACKUP_COUNT", 5)
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = config.get("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.0) # share of slow SELECTs re-run with EXPLAIN ANALYZE
+
+    QUERY_BUDGET_STRICT: bool = config.get("QUERY_BUDGET_STRICT", False) # raise instead of logging, enabled in tests
+    N_PLUS_ONE_THRESHOLD: int = config.get("N_PLUS_ONE_THRESHOLD", 5) # identical statements per request flagged as N+1
+
+    PROFILING_ENABLED: bool = config.get("PROFILING_ENABLED", False)
+    PROFILE_DIR: str = config.get("PROFILE_DIR", "logs/profiles")
+    PROFILE_SAMPLE_INTERVAL_MS: float = config.get("PROFILE_SAMPLE_INTERVAL_MS", 5)
+    PROFILE_MAX_SECONDS: int = config.get("PROFILE_MAX_SECONDS", 60)
+
+    ADMISSION_ENABLED: bool = config.get("ADMISSION_ENABLED", True)
+    ADMISSION_INITIAL_LIMIT: int = config.get("ADMISSION_INITIAL_LIMIT", 20) # concurrent requests per route class
+    ADMISSION_MIN_LIMIT: int = config.get("ADMISSION_MIN_LIMIT", 10)
+    ADMISSION_MAX_LIMIT: int = config.get("ADMISSION_MAX_LIMIT", 200)
+    ADMISSION_PRIORITY_RESERVED: int = config.get("ADMISSION_PRIORITY_RESERVED", 5) # pool connections the other classes leave to subscribe/unsubscribe
+    ADMISSION_POOL_WAIT_TARGET_MS: float = config.get("ADMISSION_POOL_WAIT_TARGET_MS", 100) # pool wait above which limits shrink
+    ADMISSION_RETRY_AFTER_SECONDS: int = config.get("ADMISSION_RETRY_AFTER_SECONDS", 1)
+
+    REQUEST_DEADLINE_SECONDS: float = config.get("REQUEST_DEADLINE_SECONDS", 0) # deadline of the routes without @deadline, 0 for none
+
+    WAITLIST_WORKER_ENABLED: bool = config.get("WAITLIST_WORKER_ENABLED", True) # promote the waitlisted students in the background
+    WAITLIST_BATCH_SIZE: int = config.get("WAITLIST_BATCH_SIZE", 100) # trainings claimed per promotion batch
+    WAITLIST_POLL_INTERVAL_SECONDS: float = config.get("WAITLIST_POLL_INTERVAL_SECONDS", 5) # for the seats freed by other processes
+
+    IDEMPOTENCY_TTL_SECONDS: int = config.get("IDEMPOTENCY_TTL_SECONDS", 86400) # how long a response is replayed to the retries
+    IDEMPOTENCY_LOCK_SECONDS: int = config.get("IDEMPOTENCY_LOCK_SECONDS", 60) # after which the claim of an unfinished request is taken over
+    IDEMPOTENCY_CLEANUP_ENABLED: bool = config.get("IDEMPOTENCY_CLEANUP_ENABLED", True) # delete the expired keys in the background
+    IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS: float = config.get("IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS", 3600)
+
+    PARTITION_MONTHS_AHEAD: int = config.get("PARTITION_MONTHS_AHEAD", 12) # monthly partitions of the trainings created ahead of time
+    PARTITION_MAINTENANCE_ENABLED: bool = config.get("PARTITION_MAINTENANCE_ENABLED", True) # keep creating the partitions ahead as the months pass
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: float = config.get("PARTITION_MAINTENANCE_INTERVAL_SECONDS", 86400)
+
+    RETENTION_ENABLED: bool = config.get("RETENTION_ENABLED", True) # prune the past availability and archive the old subscriptions
+    RETENTION_BATCH_SIZE: int = config.get("RETENTION_BATCH_SIZE", 5000) # rows deleted or moved per transaction
+    RETENTION_INTERVAL_SECONDS: float = config.get("RETENTION_INTERVAL_SECONDS", 3600)
+    RETENTION_LOCK_TIMEOUT_MS: float = config.get("RETENTION_LOCK_TIMEOUT_MS", 100) # the requests wait that long at most behind a partition drop
+    RETENTION_LOCK_ATTEMPTS: int = config.get("RETENTION_LOCK_ATTEMPTS", 5)
+    SUBSCRIPTIONS_ARCHIVE_AFTER_DAYS: int = config.get("SUBSCRIPTIONS_ARCHIVE_AFTER_DAYS", 90) # after the start of their training
+
+    AGE_ROLLOVER_ENABLED: bool = config.get("AGE_ROLLOVER_ENABLED", True) # move the users to their new age_type as they age
+    AGE_ROLLOVER_BATCH_SIZE: int = config.get("AGE_ROLLOVER_BATCH_SIZE", 500) # users re-targeted per transaction
+    AGE_ROLLOVER_INTERVAL_SECONDS: float = config.get("AGE_ROLLOVER_INTERVAL_SECONDS", 86400)
+
+    BATCH_MAX_CONCURRENCY: int = config.get("BATCH_MAX_CONCURRENCY", 4) # reads of a batch run at once, each holds a pooled connection
 
     @property # called as settings.db_url
     def get_db_url_with_psycopg(self) -> str:
@@ -0,0 +1,98 @@
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, Sequence
+from starlette.routing import BaseRoute, Match
+
+
+@dataclass
+class RequestContext:
+    """Per-request state shared by the middlewares, the database events and the handlers."""
+    scope: Dict[str, Any]
+    started_at: float = field(default_factory=perf_counter)
+    statements: int = 0
+    statement_shapes: Dict[str, int] = field(default_factory=dict)
+    pool_wait: float = 0.0
+    deadline: float | None = None # perf_counter() value the request must complete by
+    resolved_route: BaseRoute | None = None
+    route_resolved: bool = False
+    query_budget: int | None = None # set by the handlers whose budget depends on the request, e.g. /batch
+    principal: Any = None # user authenticated by the request, reused by the sub-requests of a batch
+    principal_token: str | None = None
+
+    @property
+    def method(self) -> str:
+        return self.scope.get("method", "")
+
+    @property
+    def route(self) -> str:
+        # the route is only known once the router has matched the request,
+        # unmatched paths share one label to keep the metrics cardinality bounded
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+    @property
+    def endpoint(self) -> Callable | None:
+        return getattr(self.scope.get("route"), "endpoint", None)
+
+
+_request_context: ContextVar[RequestContext | None] = ContextVar("request_context", default=None)
+
+
+def get_request_context() -> RequestContext | None:
+    """Return the context of the request being handled, None outside of a request."""
+    return _request_context.get()
+
+
+def iter_routes(routes: Sequence[BaseRoute]) -> Iterator[BaseRoute]:
+    """Yield the routes of an app, the ones of the included routers too."""
+    for route in routes:
+        # recent FastAPI versions keep included routers as a single route
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            yield from iter_routes(included.routes)
+        else:
+            yield route
+
+
+def match_route(routes: Sequence[BaseRoute], scope: Dict[str, Any]) -> BaseRoute | None:
+    """Find the route the router will dispatch a request to, for middlewares running before the router."""
+    for route in iter_routes(routes):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def resolve_route(routes: Sequence[BaseRoute], scope: Dict[str, Any]) -> BaseRoute | None:
+    """match_route() done once per request, several middlewares need the route before the router runs."""
+    ctx = get_request_context()
+    if ctx is None:
+        return match_route(routes, scope)
+    if not ctx.route_resolved:
+        ctx.resolved_route = match_route(routes, scope)
+        ctx.route_resolved = True
+    return ctx.resolved_route
+
+
+# execution option of the statements run by the app itself (e.g. SET LOCAL statement_timeout),
+# they are not counted against the statement budgets of the routes
+INTERNAL_STATEMENT = "internal_statement"
+
+
+class RequestContextMiddleware:
+    """ASGI middleware opening a RequestContext for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_context.set(RequestContext(scope=scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_context.reset(token)
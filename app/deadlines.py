@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from time import perf_counter
+from typing import Callable, TypeVar
+from fastapi import status
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.context import INTERNAL_STATEMENT, get_request_context, resolve_route
+
+F = TypeVar("F", bound=Callable)
+
+QUERY_CANCELED = "57014" # sqlstate of a statement cancelled by statement_timeout
+
+# the database gets the remaining budget, the request is cancelled a little later
+# so that a slow statement is stopped by the server and its connection stays usable
+CANCEL_GRACE_SECONDS = 0.25
+
+logger = logging.getLogger(__name__)
+
+
+def deadline(seconds: float) -> Callable[[F], F]:
+    """Declare how long a route may take, its SQL statements included."""
+
+    def decorator(endpoint: F) -> F:
+        endpoint.__deadline__ = seconds
+        return endpoint
+
+    return decorator
+
+
+def remaining_budget() -> float | None:
+    """Seconds left before the deadline of the current request, None without a deadline."""
+    ctx = get_request_context()
+    if ctx is None or ctx.deadline is None:
+        return None
+    return ctx.deadline - perf_counter()
+
+
+def _set_statement_timeout(session, transaction, connection) -> None:
+    remaining = remaining_budget()
+    if remaining is None:
+        return
+    connection.exec_driver_sql(
+        f"SET LOCAL statement_timeout = {max(1, int(remaining * 1000))}",
+        execution_options={INTERNAL_STATEMENT: True}
+    )
+
+
+def instrument_deadlines() -> None:
+    """Propagate the deadline of the request into every transaction it opens as SET LOCAL statement_timeout."""
+    if not event.contains(Session, "after_begin", _set_statement_timeout):
+        event.listen(Session, "after_begin", _set_statement_timeout)
+
+
+def deadline_exceeded_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"detail": "The request did not complete within its deadline"}
+    )
+
+
+class DeadlineMiddleware:
+    """ASGI middleware enforcing the deadline of the routes declared with @deadline.
+
+    The handler is cancelled once its budget is spent, and a statement cancelled by the propagated
+    statement_timeout ends the request the same way: with a 504 instead of holding a pool slot.
+    """
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        ctx = get_request_context()
+        if scope["type"] != "http" or ctx is None:
+            await self.app(scope, receive, send)
+            return
+
+        route = resolve_route(self.router.routes, scope)
+        seconds = getattr(getattr(route, "endpoint", None), "__deadline__", None) or settings.REQUEST_DEADLINE_SECONDS
+        if not seconds:
+            await self.app(scope, receive, send)
+            return
+
+        ctx.deadline = ctx.started_at + seconds
+        path = getattr(route, "path", scope["path"])
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            async with asyncio.timeout(max(0.0, remaining_budget()) + CANCEL_GRACE_SECONDS):
+                await self.app(scope, receive, send_wrapper)
+        except TimeoutError:
+            if response_started:
+                raise
+            logger.warning(f"{scope['method']} {path} cancelled after its {seconds}s deadline")
+            await deadline_exceeded_response()(scope, receive, send)
+        except DBAPIError as exc:
+            if response_started or getattr(exc.orig, "sqlstate", None) != QUERY_CANCELED:
+                raise
+            logger.warning(f"{scope['method']} {path} hit the statement timeout of its {seconds}s deadline")
+            await deadline_exceeded_response()(scope, receive, send)
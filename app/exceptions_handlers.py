@@ -1,6 +1,6 @@
 from fastapi import Request
 from fastapi.responses import JSONResponse
-from schemas.exceptions import BusinessRulesValidationError, InvalidPermissionsError, RegistrationError, TimeValidationError
+from schemas.exceptions import BusinessRulesValidationError, InvalidPermissionsError, RegistrationError, TimeValidationError, TrainingIsFullError
 
 
 def setup_exception_handlers(app):
@@ -38,4 +38,13 @@ def setup_exception_handlers(app):
             content={
                 "detail": exc.message
             }
+        )
+
+    @app.exception_handler(TrainingIsFullError)
+    async def training_is_full_exception_handler(request: Request, exc: TrainingIsFullError):
+        return JSONResponse(
+            status_code=409,
+            content={
+                "detail": exc.message
+            }
         )
\ No newline at end of file
@@ -0,0 +1,47 @@
+from functools import lru_cache
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, TypeVar
+from starlette.concurrency import run_in_threadpool
+from app.metrics import ARGON2_DURATION, ARGON2_QUEUE_DEPTH
+
+if TYPE_CHECKING:
+    from argon2 import PasswordHasher
+
+T = TypeVar("T")
+
+@lru_cache(maxsize=None)
+def password_hasher() -> "PasswordHasher":
+    """The Argon2 hasher, argon2 and its cffi bindings are loaded on the first use instead of at startup."""
+    from argon2 import PasswordHasher
+    return PasswordHasher()
+
+def verify_password(hashed_password: str, plain_password: str) -> bool:
+    """Verify if the provided password matches the hashed password."""
+    from argon2.exceptions import VerifyMismatchError
+
+    is_correct = True
+    try:
+        password_hasher().verify(hashed_password, plain_password)
+    except VerifyMismatchError:
+        is_correct = False
+    return is_correct
+
+def get_password_hash(password: str) -> str:
+    """Hash the provided password using Argon2."""
+    return password_hasher().hash(password)
+
+async def _run_argon2(operation: str, func: Callable[..., T], *args) -> T:
+    """Run an Argon2 operation in the thread pool so it does not block the event loop."""
+    ARGON2_QUEUE_DEPTH.inc()
+    start = perf_counter()
+    try:
+        return await run_in_threadpool(func, *args)
+    finally:
+        ARGON2_QUEUE_DEPTH.dec()
+        ARGON2_DURATION.observe(operation, value=perf_counter() - start)
+
+async def verify_password_async(hashed_password: str, plain_password: str) -> bool:
+    return await _run_argon2("verify", verify_password, hashed_password, plain_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_argon2("hash", get_password_hash, password)
@@ -0,0 +1,137 @@
+import re
+from itertools import islice
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+from schemas.exceptions import BusinessRulesValidationError
+
+_datetime_re = re.compile(r"(\d{4})(\d{2})(\d{2})(?:T(\d{2})(\d{2})(\d{2})Z?)?")
+_weekdays = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+MAX_RECURRENCE_WEEKS = 520 # weeks a recurrence is expanded over, whatever its COUNT or UNTIL
+
+
+@dataclass
+class CalendarEvent:
+    title: str
+    description: str | None
+    start: datetime
+    end: datetime
+
+
+def _unfold(text: str) -> Iterator[str]:
+    """Lines of an iCalendar file, the continuation lines (starting with a space or a tab) joined."""
+    line = None
+    for raw in text.splitlines():
+        if raw[:1] in (" ", "\t") and line is not None:
+            line += raw[1:]
+            continue
+        if line is not None:
+            yield line
+        line = raw
+    if line is not None:
+        yield line
+
+
+def _unescape(value: str) -> str:
+    return value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+
+def _parse_datetime(value: str) -> datetime:
+    # the times are kept as written, like the times of the trainings created one by one
+    match = _datetime_re.fullmatch(value)
+    if match is None:
+        raise BusinessRulesValidationError(f"Invalid iCalendar date: {value}")
+    year, month, day, hour, minute, second = (int(group) if group else 0 for group in match.groups())
+    try:
+        return datetime(year, month, day, hour, minute, second)
+    except ValueError:
+        raise BusinessRulesValidationError(f"Invalid iCalendar date: {value}")
+
+
+def _positive_int(rule: Dict[str, str], name: str, default: int | None = None) -> int | None:
+    if name not in rule:
+        return default
+    if not rule[name].isdigit() or int(rule[name]) < 1:
+        raise BusinessRulesValidationError(f"The {name} of an RRULE must be a positive integer")
+    return int(rule[name])
+
+
+def _occurrences(start: datetime, rule: Dict[str, str]) -> Iterator[datetime]:
+    """Starts of the occurrences of a weekly RRULE, bounded by COUNT or UNTIL and by MAX_RECURRENCE_WEEKS."""
+    if rule.get("FREQ") != "WEEKLY" or not ("COUNT" in rule or "UNTIL" in rule):
+        raise BusinessRulesValidationError("Only weekly RRULEs with a COUNT or an UNTIL are supported")
+    interval = _positive_int(rule, "INTERVAL", 1)
+    count = _positive_int(rule, "COUNT")
+    until = _parse_datetime(rule["UNTIL"]) if "UNTIL" in rule else None
+    if until is not None and len(rule["UNTIL"]) == 8:
+        until += timedelta(days=1) - timedelta(seconds=1)
+    days = rule["BYDAY"].split(",") if "BYDAY" in rule else [_weekdays[start.weekday()]]
+    if not all(day in _weekdays for day in days):
+        raise BusinessRulesValidationError(f"Unsupported BYDAY in an RRULE: {rule['BYDAY']}")
+    weekdays = sorted({_weekdays.index(day) for day in days})
+
+    week_start = start - timedelta(days=start.weekday())
+    produced = 0
+    for _ in range(0, MAX_RECURRENCE_WEEKS, interval):
+        for weekday in weekdays:
+            occurrence = week_start + timedelta(days=weekday)
+            if occurrence < start:
+                continue
+            if (count is not None and produced >= count) or (until is not None and occurrence > until):
+                return
+            produced += 1
+            yield occurrence
+        week_start += timedelta(weeks=interval)
+    raise BusinessRulesValidationError(f"Recurrences longer than {MAX_RECURRENCE_WEEKS} weeks are not supported")
+
+
+def parse_events(text: str, max_events: int) -> List[CalendarEvent]:
+    """Events of an iCalendar file, the weekly recurring ones expanded.
+
+    Raises BusinessRulesValidationError for what a training can't be made of: an event without an
+    end, spanning several days, or a file expanding to more than max_events trainings.
+    """
+    events: List[CalendarEvent] = []
+    properties: Dict[str, str] | None = None
+    for line in _unfold(text):
+        name, _, value = line.partition(":")
+        # the parameters (e.g. TZID) are ignored
+        name = name.partition(";")[0].upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            properties = {}
+        elif name == "END" and value.upper() == "VEVENT" and properties is not None:
+            # a long recurrence is not expanded past what the limit lets through
+            events.extend(islice(_event_occurrences(properties), max_events - len(events) + 1))
+            properties = None
+            if len(events) > max_events:
+                raise BusinessRulesValidationError(f"The calendar has more than {max_events} trainings")
+        elif properties is not None:
+            properties[name] = value
+    if not events:
+        raise BusinessRulesValidationError("The calendar has no events")
+    return events
+
+
+def _event_occurrences(properties: Dict[str, str]) -> Iterator[CalendarEvent]:
+    if "DTSTART" not in properties or not ("DTEND" in properties or "DURATION" in properties):
+        raise BusinessRulesValidationError("Every event needs a DTSTART and a DTEND")
+    if "DURATION" in properties and "DTEND" not in properties:
+        raise BusinessRulesValidationError("Events with a DURATION are not supported, use DTEND")
+    start = _parse_datetime(properties["DTSTART"])
+    end = _parse_datetime(properties["DTEND"])
+    if end.date() != start.date():
+        raise BusinessRulesValidationError(f"The event starting at {start} must end the same day")
+
+    title = _unescape(properties.get("SUMMARY", "New training"))
+    description = _unescape(properties["DESCRIPTION"]) if "DESCRIPTION" in properties else None
+    if "RRULE" not in properties:
+        yield CalendarEvent(title, description, start, end)
+        return
+
+    rule = dict(part.partition("=")[::2] for part in properties["RRULE"].upper().split(";") if part)
+    excluded = {_parse_datetime(value).date() for value in properties.get("EXDATE", "").split(",") if value}
+    duration = end - start
+    for occurrence in _occurrences(start, rule):
+        if occurrence.date() not in excluded:
+            yield CalendarEvent(title, description, occurrence, occurrence + duration)
+
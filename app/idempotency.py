@@ -0,0 +1,137 @@
+import hashlib
+from typing import Callable, TypeVar
+from fastapi import Request, status
+from fastapi.responses import JSONResponse, Response
+from app.context import get_request_context, resolve_route
+from app.metrics import IDEMPOTENT_REPLAYS
+from db.database import IdempotencyService
+
+F = TypeVar("F", bound=Callable)
+
+IDEMPOTENCY_KEY_HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+
+
+def idempotent(endpoint: F) -> F:
+    """Let the clients retry a write with an Idempotency-Key header without running it twice."""
+    endpoint.__idempotent__ = True
+    return endpoint
+
+
+def request_owner(request: Request) -> bytes:
+    """Keys are scoped to the credentials of the request, a client never sees the responses of another one.
+
+    The anonymous requests (registration) are scoped to the address of the client instead.
+    """
+    credentials = request.headers.get("authorization") or request.cookies.get("access_token")
+    if credentials is None:
+        credentials = f"anonymous:{request.client.host if request.client is not None else ''}"
+    else:
+        credentials = f"credentials:{credentials}"
+    return hashlib.sha256(credentials.encode()).digest()
+
+
+def request_fingerprint(request: Request, body: bytes) -> bytes:
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.url.path.encode(), request.url.query.encode(), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.digest()
+
+
+def error_response(status_code: int, detail: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"detail": detail})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying the stored response of a write retried with the same Idempotency-Key.
+
+    Only the routes declared with @idempotent are concerned, and only the requests sending the header.
+    The first request claims the key and runs, its response is stored unless it is a server error,
+    so a retry after a 5xx runs the write again. A retry arriving while the first request runs gets
+    409, a key reused for another request 422.
+    """
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = resolve_route(self.router.routes, scope)
+        request = Request(scope)
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if key is None or not getattr(getattr(route, "endpoint", None), "__idempotent__", False):
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            await error_response(status.HTTP_400_BAD_REQUEST, f"Idempotency-Key must have 1 to {MAX_KEY_LENGTH} characters")(scope, receive, send)
+            return
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        owner = request_owner(request)
+        fingerprint = request_fingerprint(request, body)
+        stored = await IdempotencyService.claim(owner, key, fingerprint)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                response = error_response(status.HTTP_422_UNPROCESSABLE_ENTITY, "Idempotency-Key already used for another request")
+            elif stored.status_code is None:
+                response = error_response(status.HTTP_409_CONFLICT, "A request with this Idempotency-Key is in progress")
+            else:
+                IDEMPOTENT_REPLAYS.inc()
+                response = Response(
+                    content=stored.body,
+                    status_code=stored.status_code,
+                    media_type=stored.content_type,
+                    headers={"Idempotent-Replayed": "true"}
+                )
+            # label the metrics of the answered request with its route, the router never sees it
+            scope["route"] = route
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        status_code, content_type, response_chunks = 500, None, []
+
+        async def send_wrapper(message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"").decode() or None
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        failed = True
+        try:
+            await self.app(scope, receive_body, send_wrapper)
+            failed = False
+        finally:
+            # the deadline of the route covers the handler, storing its response is not cut short
+            ctx = get_request_context()
+            if ctx is not None:
+                ctx.deadline = None
+            if failed or status_code >= 500:
+                await IdempotencyService.release(owner, key)
+            else:
+                await IdempotencyService.complete(owner, key, status_code, content_type, b"".join(response_chunks))
@@ -1,15 +1,75 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.admission import AdmissionControlMiddleware
+from app.config import settings
+from app.context import RequestContextMiddleware
+from app.deadlines import DeadlineMiddleware, instrument_deadlines
+from app.idempotency import IdempotencyMiddleware
+from app.metrics import MetricsMiddleware, instrument_engine
+from app.profiler import ProfilerMiddleware
+from app.query_budget import QueryBudgetMiddleware, instrument_query_budget
+from app.routers.admin import router as admin_router
 from app.routers.auth import router as auth_router
+from app.routers.batch import router as batch_router
 from app.routers.client import router as client_router
 from app.routers.coach import router as coach_router
+from app.routers.metrics import router as metrics_router
 from app.routers.registration import router as registration_router
 from app.exceptions_handlers import setup_exception_handlers
+from app.slow_queries import instrument_slow_queries
+from app.workers import age_rollover_worker, idempotency_keys_cleaner, partitions_maintainer, retention_worker, waitlist_worker
+from db.database import dispose_engine, init_engine, warm_up_engine
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    engine = init_engine()
+    instrument_engine(engine)
+    instrument_slow_queries(engine)
+    instrument_query_budget(engine)
+    instrument_deadlines()
+    if settings.DB_WARM_UP:
+        await warm_up_engine(engine, prepare=not settings.DB_PGBOUNCER_MODE)
+    if settings.WAITLIST_WORKER_ENABLED:
+        waitlist_worker.start()
+    if settings.IDEMPOTENCY_CLEANUP_ENABLED:
+        idempotency_keys_cleaner.start()
+    if settings.PARTITION_MAINTENANCE_ENABLED:
+        partitions_maintainer.start()
+    if settings.RETENTION_ENABLED:
+        retention_worker.start()
+    if settings.AGE_ROLLOVER_ENABLED:
+        age_rollover_worker.start()
+
+    yield
+
+    await age_rollover_worker.stop()
+    await retention_worker.stop()
+    await partitions_maintainer.stop()
+    await idempotency_keys_cleaner.stop()
+    await waitlist_worker.stop()
+    # uvicorn lets the in-flight requests finish before the shutdown, the pooled connections are closed cleanly
+    await dispose_engine()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(registration_router)
 app.include_router(auth_router)
 app.include_router(client_router)
 app.include_router(coach_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
+app.include_router(batch_router)
+
+setup_exception_handlers(app)
 
-setup_exception_handlers(app)
\ No newline at end of file
+# the last added middleware is the outermost one
+app.add_middleware(DeadlineMiddleware, router=app.router)
+app.add_middleware(AdmissionControlMiddleware, router=app.router)
+# replays of the stored responses skip the admission control and the deadlines
+app.add_middleware(IdempotencyMiddleware, router=app.router)
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware)
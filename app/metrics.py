@@ -0,0 +1,310 @@
+from math import inf
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.context import INTERNAL_STATEMENT, get_request_context
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+MAINTENANCE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric():
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self.values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, *label_values: str, value: float) -> None:
+        self.values[label_values] = value
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (inf,)
+        self.series: Dict[Tuple[str, ...], List[float]] = {} # per label set: bucket counts, then sum, then count
+
+    def observe(self, *label_values: str, value: float) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[idx] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in self.series.items():
+            for idx, bound in enumerate(self.buckets):
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {series[idx]}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(series[-2]))}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry():
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callable refreshing gauges right before they are rendered."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "http_requests_total", "Number of handled HTTP requests.", ("method", "route", "status")
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Latency of HTTP requests.", ("method", "route")
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Number of HTTP requests being handled."
+))
+SQL_STATEMENTS_TOTAL = REGISTRY.register(Counter(
+    "db_statements_total", "Number of SQL statements executed, per route.", ("route",)
+))
+SQL_STATEMENTS_PER_REQUEST = REGISTRY.register(Histogram(
+    "db_statements_per_request", "Number of SQL statements executed by one request.", ("route",), STATEMENT_BUCKETS
+))
+POOL_SIZE = REGISTRY.register(Gauge(
+    "db_pool_size", "Configured size of the connection pool."
+))
+POOL_CHECKED_OUT = REGISTRY.register(Gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool."
+))
+POOL_OVERFLOW = REGISTRY.register(Gauge(
+    "db_pool_overflow", "Connections opened above the pool size."
+))
+POOL_CHECKOUT_WAIT = REGISTRY.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a connection from the pool.", (), POOL_WAIT_BUCKETS
+))
+ARGON2_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "argon2_queue_depth", "Argon2 hash and verify operations queued or running in the thread pool."
+))
+ARGON2_DURATION = REGISTRY.register(Histogram(
+    "argon2_operation_duration_seconds", "Duration of Argon2 operations, including the thread pool queueing.", ("operation",)
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result")
+))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "cache_hit_ratio", "Share of cache lookups served from the cache.", ("cache",)
+))
+
+ADMISSION_LIMIT = REGISTRY.register(Gauge(
+    "admission_limit", "Current concurrency limit of a route class.", ("class",)
+))
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge(
+    "admission_in_flight", "Admitted requests being handled, per route class.", ("class",)
+))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "admission_rejected_total", "Requests shed with 503, per route class and reason.", ("class", "reason")
+))
+
+IDEMPOTENT_REPLAYS = REGISTRY.register(Counter(
+    "idempotent_replays_total", "Retries answered with the stored response of their Idempotency-Key."
+))
+WAITLIST_PROMOTED = REGISTRY.register(Counter(
+    "waitlist_promoted_total", "Waitlisted students subscribed by the waitlist worker."
+))
+WAITLIST_BATCHES = REGISTRY.register(Histogram(
+    "waitlist_promotion_batch_duration_seconds", "Duration of the promotion batches of the waitlist worker."
+))
+RETENTION_ROWS_RECLAIMED = REGISTRY.register(Counter(
+    "retention_rows_reclaimed_total", "Rows removed by the retention worker, per table and method.", ("table", "method")
+))
+RETENTION_RUN_DURATION = REGISTRY.register(Histogram(
+    "retention_run_duration_seconds", "Duration of the runs of the retention worker.", (), MAINTENANCE_BUCKETS
+))
+AGE_ROLLOVER_USERS = REGISTRY.register(Counter(
+    "age_rollover_users_total", "Users moved to their new age_type by the age rollover worker."
+))
+AVAILABILITY_RETARGETED = REGISTRY.register(Counter(
+    "availability_retargeted_rows_total", "Rows of available_trainings removed or added by a re-targeting, per cause and change.",
+    ("cause", "change")
+))
+
+
+def observe_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def _collect_cache_hit_ratio() -> None:
+    caches = {cache for cache, _ in CACHE_REQUESTS.values}
+    for cache in caches:
+        hits = CACHE_REQUESTS.get(cache, "hit")
+        total = hits + CACHE_REQUESTS.get(cache, "miss")
+        CACHE_HIT_RATIO.set(cache, value=hits / total if total else 0.0)
+
+
+REGISTRY.register_collector(_collect_cache_hit_ratio)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Connection pool recording how long checkouts wait for a free connection."""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = perf_counter() - start
+            POOL_CHECKOUT_WAIT.observe(value=waited)
+            ctx = get_request_context()
+            if ctx is not None:
+                ctx.pool_wait += waited
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Count statements per route and record the compiled cache usage of the engine."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        ctx = get_request_context()
+        if ctx is not None:
+            if context is not None and context.execution_options.get(INTERNAL_STATEMENT):
+                return
+            ctx.statements += 1
+        else:
+            SQL_STATEMENTS_TOTAL.inc("background")
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        cache_hit = getattr(context, "cache_hit", None)
+        if cache_hit is CACHE_HIT or cache_hit is CACHE_MISS:
+            observe_cache("sqlalchemy_compiled", cache_hit is CACHE_HIT)
+
+    global _pool_engine
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    _pool_engine = engine
+
+
+# the engine is recreated by every lifespan of the app, the pool gauges follow the last instrumented one
+_pool_engine: AsyncEngine | None = None
+
+
+def collect_pool() -> None:
+    pool = _pool_engine.pool if _pool_engine is not None else None
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        POOL_SIZE.set(value=pool.size())
+        POOL_CHECKED_OUT.set(value=pool.checkedout())
+        POOL_OVERFLOW.set(value=max(pool.overflow(), 0))
+
+
+REGISTRY.register_collector(collect_pool)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and statement count of every request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            ctx = get_request_context()
+            route = ctx.route if ctx is not None else "unmatched"
+            method = scope.get("method", "")
+            REQUEST_DURATION.observe(method, route, value=perf_counter() - start)
+            REQUESTS_TOTAL.inc(method, route, str(status_code))
+            if ctx is not None:
+                SQL_STATEMENTS_TOTAL.inc(route, amount=ctx.statements)
+                SQL_STATEMENTS_PER_REQUEST.observe(route, value=ctx.statements)
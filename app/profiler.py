@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+from app.config import settings
+from app.context import get_request_context
+from app.security import is_admin_token
+
+PROFILE_HEADER = b"x-profile"
+ADMIN_TOKEN_HEADER = b"x-admin-token"
+
+_profile_id_re = re.compile(r"^[\w\-]+$")
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler():
+    """Sample the stack of one thread from a background thread and count identical stacks.
+
+    The counts are written in the collapsed-stack format understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+def collapse(counts: Dict[str, int]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+def new_profile_id(label: str) -> str:
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    label = re.sub(r"[^\w]+", "_", label).strip("_") or "profile"
+    return f"{timestamp}-{label}-{uuid.uuid4().hex[:8]}"
+
+
+def profile_path(profile_id: str) -> Path:
+    if not _profile_id_re.match(profile_id):
+        raise ValueError(f"Invalid profile id: {profile_id}")
+    return Path(settings.PROFILE_DIR) / f"{profile_id}.collapsed"
+
+
+def save_profile(profile_id: str, counts: Dict[str, int]) -> Path:
+    path = profile_path(profile_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(collapse(counts))
+    return path
+
+
+def list_profiles() -> List[str]:
+    directory = Path(settings.PROFILE_DIR)
+    if not directory.exists():
+        return []
+    return sorted((path.stem for path in directory.glob("*.collapsed")), reverse=True)
+
+
+def start_profiler() -> SamplingProfiler:
+    """Profile the thread running the event loop, which handles every request."""
+    return SamplingProfiler(
+        thread_id=threading.get_ident(),
+        interval=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+    ).start()
+
+
+_window_task: asyncio.Task | None = None
+
+
+def profiling_window_running() -> bool:
+    return _window_task is not None and not _window_task.done()
+
+
+def start_profiling_window(seconds: float) -> str:
+    """Profile all the traffic for the next seconds and store the result, returns the profile id."""
+    global _window_task
+
+    if profiling_window_running():
+        raise RuntimeError("A profiling window is already running")
+
+    profile_id = new_profile_id(f"window-{seconds:g}s")
+
+    async def run() -> None:
+        profiler = start_profiler()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            save_profile(profile_id, profiler.stop())
+            logger.info(f"Stored profile {profile_id}")
+
+    _window_task = asyncio.create_task(run())
+    return profile_id
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling single requests sent with X-Profile and a valid X-Admin-Token.
+
+    The profile id is returned in the X-Profile-Id header and the collapsed stacks can be
+    downloaded from /admin/profiles/{profile_id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.PROFILING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if PROFILE_HEADER not in headers or not is_admin_token(headers.get(ADMIN_TOKEN_HEADER, b"").decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = new_profile_id(f"{scope.get('method', '')}-{scope.get('path', '')}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = start_profiler()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            counts = profiler.stop()
+            save_profile(profile_id, counts)
+            ctx = get_request_context()
+            route = ctx.route if ctx is not None else scope.get("path")
+            logger.info(f"Stored profile {profile_id} of {route} ({time.perf_counter() - start:.3f}s)")
@@ -0,0 +1,86 @@
+import logging
+import re
+from typing import Callable, List, TypeVar
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.config import settings
+from app.context import INTERNAL_STATEMENT, RequestContext, get_request_context
+from schemas.exceptions import QueryBudgetExceededError
+
+F = TypeVar("F", bound=Callable)
+
+logger = logging.getLogger(__name__)
+
+_placeholder_re = re.compile(r"(\$\d+|%\(\w+\)s|%s)(::(TIMESTAMP WITH(OUT)? TIME ZONE|DOUBLE PRECISION|[A-Z_]+)(\[\])?)?")
+_placeholder_list_re = re.compile(r"\(\s*\?(\s*,\s*\?)*\s*\)")
+_rows_list_re = re.compile(r"\(\?, \.\.\.\)(\s*,\s*\(\?, \.\.\.\))+")
+_whitespace_re = re.compile(r"\s+")
+
+
+def query_budget(max_statements: int) -> Callable[[F], F]:
+    """Declare how many SQL statements a route may run, the authentication lookup included."""
+
+    def decorator(endpoint: F) -> F:
+        endpoint.__query_budget__ = max_statements
+        return endpoint
+
+    return decorator
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so executions differing only by their parameters compare equal."""
+    shape = _placeholder_re.sub("?", statement)
+    shape = _placeholder_list_re.sub("(?, ...)", shape)
+    shape = _rows_list_re.sub("(?, ...)", shape)
+    return _whitespace_re.sub(" ", shape).strip()
+
+
+def find_violations(ctx: RequestContext) -> List[str]:
+    violations = []
+
+    budget = ctx.query_budget if ctx.query_budget is not None else getattr(ctx.endpoint, "__query_budget__", None)
+    if budget is not None and ctx.statements > budget:
+        violations.append(f"{ctx.method} {ctx.route} ran {ctx.statements} SQL statements, its budget is {budget}")
+
+    for shape, count in ctx.statement_shapes.items():
+        if count >= settings.N_PLUS_ONE_THRESHOLD:
+            violations.append(f"{ctx.method} {ctx.route} ran the same statement {count} times (possible N+1): {shape}")
+
+    return violations
+
+
+def instrument_query_budget(engine: AsyncEngine) -> None:
+    """Track the shapes of the statements run by each request."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        ctx = get_request_context()
+        if ctx is not None and not (context is not None and context.execution_options.get(INTERNAL_STATEMENT)):
+            shape = statement_shape(statement)
+            ctx.statement_shapes[shape] = ctx.statement_shapes.get(shape, 0) + 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware checking the statements of a request against its route budget.
+
+    Violations are logged, or raised when QUERY_BUDGET_STRICT is set so that tests fail.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+        ctx = get_request_context()
+        if scope["type"] != "http" or ctx is None:
+            return
+
+        violations = find_violations(ctx)
+        if not violations:
+            return
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceededError("; ".join(violations))
+        for violation in violations:
+            logger.warning(violation)
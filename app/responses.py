@@ -0,0 +1,18 @@
+from typing import Any, Sequence
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+from schemas.schemas import dto_list_adapter
+
+
+class DTOListResponse(JSONResponse):
+    """JSON response for the DTO lists built by the services, serialized once straight to bytes.
+
+    Handlers return it instead of the bare list: FastAPI then skips the response_model validation
+    and jsonable_encoder, response_model is only kept for the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, Sequence) and content and isinstance(content[0], BaseModel):
+            return dto_list_adapter(type(content[0])).dump_json(content)
+        return to_json(content)
@@ -0,0 +1,67 @@
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from app.config import settings
+from app.profiler import list_profiles, profile_path, start_profiling_window
+from app.security import require_admin
+from app.slow_queries import recent_slow_queries
+
+def require_profiling_enabled() -> None:
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profiling is disabled"
+        )
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)]
+)
+
+@router.get("/slow-queries", status_code=status.HTTP_200_OK)
+async def read_slow_queries(limit: int = 50) -> List[Dict[str, Any]]:
+    """Return the most recent slow queries, newest first."""
+    entries = list(recent_slow_queries)
+    entries.reverse()
+    return entries[:max(limit, 0)]
+
+@router.post("/profiler/window", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_profiling_enabled)])
+async def start_profiler_window(seconds: float = 10) -> Dict[str, Any]:
+    """Profile all the traffic for the given number of seconds."""
+    if not 0 < seconds <= settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"seconds must be between 0 and {settings.PROFILE_MAX_SECONDS}"
+        )
+    try:
+        profile_id = start_profiling_window(seconds)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    return {
+        "profile_id": profile_id,
+        "seconds": seconds
+    }
+
+@router.get("/profiles", status_code=status.HTTP_200_OK, dependencies=[Depends(require_profiling_enabled)])
+async def read_profiles() -> List[str]:
+    return list_profiles()
+
+@router.get("/profiles/{profile_id}", status_code=status.HTTP_200_OK, dependencies=[Depends(require_profiling_enabled)])
+async def read_profile(profile_id: str) -> Response:
+    """Download a profile as collapsed stacks, ready for flamegraph.pl or speedscope."""
+    try:
+        path = profile_path(profile_id)
+    except ValueError:
+        path = None
+    if path is None or not path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="There is not any profile with this ID."
+        )
+    return Response(
+        content=path.read_text(),
+        media_type="text/plain; charset=utf-8"
+    )
@@ -1,44 +1,27 @@
 from datetime import datetime, timedelta, timezone
-import os
 from typing import Annotated
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
 from fastapi import APIRouter, Depends, HTTPException, Body, Depends, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import jwt
 from pydantic import ValidationError
+from app.config import settings
+from app.context import get_request_context
+from app.hashing import verify_password_async
+from app.query_budget import query_budget
 from db.database import ORMBase, async_session_factory
-from dotenv import load_dotenv
 from schemas.schemas import AccessToken, TokenData, UserDTO, UserLoginDTO
 
-load_dotenv()
-
-jwt_key = os.getenv("SECRET_KEY")
-jwt_expire_delta = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
-jwt_alghorithm = os.getenv("ALGHORITHM")
+jwt_key = settings.SECRET_KEY
+jwt_expire_delta = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+jwt_alghorithm = settings.ALGHORITHM
 
 router = APIRouter(
     prefix="/auth",
     tags=["Auth"]
 )
 
-ph = PasswordHasher()
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-def verify_password(hashed_password: str, plain_password: str) -> bool:
-    """Verify if the provided password matches the hashed password."""
-    is_correct = True
-    try:
-        ph.verify(hashed_password, plain_password)
-    except VerifyMismatchError:
-        is_correct = False
-    return is_correct
-
-def get_password_hash(password: str) -> str:
-    """Hash the provided password using Argon2."""
-    return ph.hash(password)
-
 async def get_user(identifier: str) -> UserDTO | None:
     """Retrieve a user by identifier from the database."""
     async with async_session_factory() as session:
@@ -54,7 +37,7 @@ async def authenticate_user(login_form: UserLoginDTO) -> UserDTO | bool:
     user = await get_user(login_form.email)
     if not user:
         return False
-    if not verify_password(user.password, login_form.password):
+    if not await verify_password_async(user.password, login_form.password):
         return False
     return user
     
@@ -88,6 +71,11 @@ async def get_current_user(
     if not token:
         raise credentials_exception
 
+    # the sub-requests of a batch share the principal authenticated by the batch itself
+    ctx = get_request_context()
+    if ctx is not None and ctx.principal is not None and ctx.principal_token == token:
+        return ctx.principal
+
     try:
         payload = jwt.decode(token, jwt_key, algorithms=[jwt_alghorithm])
         identifier = payload.get("sub")
@@ -100,10 +88,19 @@ async def get_current_user(
     user = await get_user(identifier=token_data.identifier)
     if not user:
         raise credentials_exception
+    if ctx is not None:
+        ctx.principal, ctx.principal_token = user, token
     return user
 
+def replace_principal(user: UserDTO) -> None:
+    """Give the next sub-requests of a batch the user as updated by this request, not the one it authenticated."""
+    ctx = get_request_context()
+    if ctx is not None and ctx.principal is not None:
+        ctx.principal = user
+
 
 @router.post('/token')
+@query_budget(1)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> AccessToken:
@@ -139,6 +136,7 @@ async def login_for_access_token(
     )
 
 @router.post("/login-cookie", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(1)
 async def login_with_cookie(
     response: Response,
     form_data: UserLoginDTO = Body()
@@ -169,11 +167,13 @@ async def login_with_cookie(
     return 
 
 @router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(0)
 async def logout(response: Response) -> None:
     response.delete_cookie(key="access_token", path="/")
     return 
 
 @router.get("/users/me", response_model=UserDTO)
+@query_budget(1)
 async def read_users_me(
     current_user: Annotated[UserDTO, Depends(get_current_user)]
 ) -> UserDTO:
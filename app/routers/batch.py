@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from time import perf_counter
+from typing import Annotated, Any, Dict, List, Tuple
+from urllib.parse import urlencode
+from fastapi import APIRouter, Depends, Request, Response
+from pydantic_core import to_json
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from starlette.routing import BaseRoute, Match
+from app.admission import LIMITERS, route_class
+from app.config import settings
+from app.context import get_request_context, iter_routes
+from app.deadlines import QUERY_CANCELED, deadline
+from app.idempotency import IDEMPOTENCY_KEY_HEADER, idempotent
+from app.metrics import ADMISSION_REJECTED
+from app.routers.auth import get_current_user
+from schemas.schemas import BatchDTO, BatchResultDTO, BatchSubRequestDTO, UserDTO
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/batch",
+    tags=["Batch"]
+)
+
+# keys of the batch scope a sub-request inherits, with what the middlewares of the app set up
+# for the router: the exception handlers and the exit stack closing the uploaded files
+INHERITED_SCOPE_KEYS = (
+    "type", "asgi", "http_version", "scheme", "server", "client", "root_path", "app", "state",
+    "starlette.exception_handlers", "fastapi_middleware_astack"
+)
+# the Idempotency-Key of a batch is the key of the whole batch, see run_batch
+DROPPED_HEADERS = {b"content-length", b"content-type", IDEMPOTENCY_KEY_HEADER.encode()}
+
+SubResult = Tuple[int, bytes]
+
+
+def sub_request_scope(scope: Dict[str, Any], sub_request: BatchSubRequestDTO, body: bytes) -> Dict[str, Any]:
+    """Scope of a sub-request, with the headers of the batch: its Authorization header or cookie included."""
+    path, _, query = sub_request.path.partition("?")
+    if sub_request.params:
+        query = "&".join(filter(None, [query, urlencode(sub_request.params, doseq=True)]))
+
+    headers = [(name, value) for name, value in scope["headers"] if name not in DROPPED_HEADERS]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+
+    sub_scope = {key: scope[key] for key in INHERITED_SCOPE_KEYS if key in scope}
+    sub_scope.update(method=sub_request.method, path=path, raw_path=path.encode(), query_string=query.encode(), headers=headers)
+    return sub_scope
+
+
+def match_sub_request(routes: List[BaseRoute], scope: Dict[str, Any]) -> BaseRoute | None:
+    """Find the route of a sub-request. A path matched with another method is kept for its 405."""
+    partial = None
+    for route in iter_routes(routes):
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            scope.update(child_scope)
+            return route
+        if match == Match.PARTIAL and partial is None:
+            partial = route, child_scope
+    if partial is None:
+        return None
+    scope.update(partial[1])
+    return partial[0]
+
+
+async def run_sub_request(route: BaseRoute, scope: Dict[str, Any], body: bytes) -> SubResult:
+    """Run a sub-request through its route and collect the response, as JSON."""
+    body_sent = False
+    status_code, content_type, chunks = 500, b"", []
+
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            return {"type": "http.disconnect"}
+        body_sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status_code, content_type
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await route.handle(scope, receive, send)
+    except PoolTimeoutError:
+        raise
+    except Exception as exc:
+        # a statement cancelled by the deadline ends the whole batch, see DeadlineMiddleware
+        if isinstance(exc, DBAPIError) and getattr(exc.orig, "sqlstate", None) == QUERY_CANCELED:
+            raise
+        logger.exception(f"batch sub-request {scope['method']} {scope['path']} failed")
+        return 500, to_json({"detail": "Internal Server Error"})
+
+    content = b"".join(chunks)
+    if not content:
+        return status_code, b"null"
+    if not content_type.startswith(b"application/json"):
+        content = to_json(content.decode(errors="replace"))
+    return status_code, content
+
+
+async def run_admitted_sub_request(route: BaseRoute, scope: Dict[str, Any], body: bytes) -> SubResult:
+    """Run a sub-request within the admission limit of its route class, like the request it stands for.
+
+    A sub-request above the limit, or timing out waiting for a pooled connection, is answered 503
+    in its slot of the batch, see AdmissionControlMiddleware.
+    """
+    name = route_class(route, scope["method"]) if settings.ADMISSION_ENABLED else None
+    limiter = LIMITERS[name] if name is not None else None
+    if limiter is not None and not limiter.try_acquire():
+        ADMISSION_REJECTED.inc(name, "limit")
+        return 503, to_json({"detail": "The server is overloaded, retry later"})
+
+    ctx = get_request_context()
+    pool_wait = ctx.pool_wait if ctx is not None else 0.0
+    started_at = perf_counter()
+    congested = False
+    try:
+        return await run_sub_request(route, scope, body)
+    except PoolTimeoutError:
+        congested = True
+        if name is not None:
+            ADMISSION_REJECTED.inc(name, "pool_timeout")
+        return 503, to_json({"detail": "No database connection available, retry later"})
+    finally:
+        if limiter is not None:
+            # the sub-requests share the context of the batch, its pool wait grows with the concurrent ones too
+            waited = (ctx.pool_wait if ctx is not None else 0.0) - pool_wait
+            limiter.release(started_at, congested or waited * 1000 > settings.ADMISSION_POOL_WAIT_TARGET_MS)
+
+
+@router.post("", response_model=List[BatchResultDTO])
+@deadline(5)
+@idempotent
+async def run_batch(
+    request: Request,
+    batch: BatchDTO,
+    current_user: Annotated[UserDTO, Depends(get_current_user)]
+) -> Response:
+    """Run sub-requests against the other routes of the API and return their responses in order.
+
+    The batch is authenticated once, the sub-requests reuse its principal. Consecutive GETs run
+    concurrently, at most BATCH_MAX_CONCURRENCY at once, the other methods one after the other in
+    their order. Identical GETs with no write between them run once.
+
+    Each sub-request takes a slot of the admission class of its route on top of the slot of the
+    batch. The sub-requests bypass the middlewares: an Idempotency-Key is the key of the whole
+    batch, a retried batch gets the stored responses of all its sub-requests.
+    """
+    ctx = get_request_context()
+    results: List[SubResult | None] = [None] * len(batch.requests)
+    pending: Dict[int, Tuple[BaseRoute, Dict[str, Any], bytes]] = {}
+    duplicates: Dict[int, int] = {}
+    reads: Dict[Tuple[str, bytes], int] = {}
+    # the authentication lookup is shared, each route budget counts it once
+    budget: int | None = 1
+
+    for index, sub_request in enumerate(batch.requests):
+        body = to_json(sub_request.body) if sub_request.body is not None else b""
+        scope = sub_request_scope(request.scope, sub_request, body)
+        route = match_sub_request(request.app.router.routes, scope)
+        if route is None:
+            results[index] = 404, to_json({"detail": "Not Found"})
+            continue
+        if getattr(route, "endpoint", None) is run_batch:
+            results[index] = 400, to_json({"detail": "Batches cannot be nested"})
+            continue
+        if sub_request.method == "GET":
+            key = scope["path"], scope["query_string"]
+            if key in reads:
+                duplicates[index] = reads[key]
+                continue
+            reads[key] = index
+        else:
+            # a read after a write runs again
+            reads.clear()
+
+        pending[index] = route, scope, body
+        route_budget = getattr(getattr(route, "endpoint", None), "__query_budget__", None)
+        budget = None if budget is None or route_budget is None else budget + max(route_budget - 1, 0)
+
+    if ctx is not None:
+        ctx.query_budget = budget
+
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+
+    async def run(index: int) -> None:
+        async with semaphore:
+            results[index] = await run_admitted_sub_request(*pending[index])
+
+    concurrent_reads: List[int] = []
+    for index in pending:
+        if batch.requests[index].method == "GET":
+            concurrent_reads.append(index)
+            continue
+        # a write sees the reads before it completed, and the reads after it see the write
+        await asyncio.gather(*(run(read) for read in concurrent_reads))
+        concurrent_reads = []
+        await run(index)
+    await asyncio.gather(*(run(read) for read in concurrent_reads))
+
+    for index, original in duplicates.items():
+        results[index] = results[original]
+
+    # the sub-responses are already JSON, they are spliced instead of decoded and encoded again
+    content = b"[" + b",".join(b'{"status":%d,"body":%s}' % result for result in results) + b"]"
+    return Response(content=content, media_type="application/json")
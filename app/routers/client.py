@@ -1,9 +1,17 @@
+from datetime import date
 from typing import Annotated, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from db.database import ClientService
-from models.enums import Role
-from schemas.schemas import SubscriptionDTO, TrainingDTO, UserDTO
-from app.routers.auth import get_current_user
+from models.enums import Discipline, Role
+from schemas.schemas import (
+    InterestsUpdateDTO, SubscriptionDTO, SubscriptionResultDTO, TrainingDTO, TrainingIdsDTO, UserDTO, UserProfileUpdateDTO, WaitlistDTO
+)
+from app.admission import PRIORITY, admission_class
+from app.deadlines import deadline
+from app.idempotency import idempotent
+from app.query_budget import query_budget
+from app.responses import DTOListResponse
+from app.routers.auth import get_current_user, replace_principal
 
 router = APIRouter(
     prefix="/client",
@@ -21,13 +29,40 @@ def get_current_client(user: UserDTO = Depends(get_current_user)) -> UserDTO:
     return user
 
 @router.get("/users/me/client", response_model=UserDTO)
+@query_budget(1)
 async def read_current_client(
     current_user: Annotated[UserDTO, Depends(get_current_client)]
 ) -> UserDTO:
     service = ClientService(current_user)
     return service.get_user()
 
-@router.get("/users/me/client/subscriptions/", response_model=List[TrainingDTO])
+@router.patch("/users/me/client", response_model=UserDTO)
+@query_budget(3)
+@deadline(3)
+async def update_own_profile(
+    current_user: Annotated[UserDTO, Depends(get_current_client)],
+    update_data: UserProfileUpdateDTO = Body()
+) -> UserDTO:
+    """Update the profile, the available trainings follow the new gender, level and age group."""
+    service = ClientService(current_user)
+    updated = await service.update_profile(**update_data.model_dump())
+    replace_principal(updated)
+    return updated
+
+@router.patch("/users/me/client/interests", response_model=List[Discipline])
+@query_budget(6)
+@deadline(3)
+async def update_own_interests(
+    current_user: Annotated[UserDTO, Depends(get_current_client)],
+    update_data: InterestsUpdateDTO = Body()
+) -> List[Discipline]:
+    """Add and remove interests, the available trainings of their disciplines follow."""
+    service = ClientService(current_user)
+    return await service.update_interests(add=update_data.add, remove=update_data.remove)
+
+@router.get("/users/me/client/subscriptions/", response_model=List[TrainingDTO], response_class=DTOListResponse)
+@query_budget(3)
+@deadline(3)
 async def read_own_subscriptions(
     current_user: Annotated[UserDTO, Depends(get_current_client)]
 ) -> List[TrainingDTO]:
@@ -39,22 +74,32 @@ async def read_own_subscriptions(
             detail="You have no subscriptions",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    return subs
+    return DTOListResponse(subs)
 
-@router.get("/users/me/client/available_trainings/", response_model=List[TrainingDTO])
+@router.get("/users/me/client/available_trainings/", response_model=List[TrainingDTO], response_class=DTOListResponse)
+@query_budget(2)
+@deadline(3)
 async def read_own_available_trainings(
-    current_user: Annotated[UserDTO, Depends(get_current_client)] ) -> List[TrainingDTO]:
+    current_user: Annotated[UserDTO, Depends(get_current_client)],
+    date_start: date | None = None,
+    date_end: date | None = None
+) -> List[TrainingDTO]:
+    """The trainings between date_start and date_end included, every available training without them."""
     service = ClientService(current_user)
-    available_trainings = await service.show_available_trainings()
+    available_trainings = await service.show_available_trainings(date_start=date_start, date_end=date_end)
     if len(available_trainings) == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="You have no available trainings",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    return available_trainings
+    return DTOListResponse(available_trainings)
 
 @router.post("/users/me/client/available_trainings/subscribe/", response_model=SubscriptionDTO)
+@query_budget(3)
+@deadline(3)
+@admission_class(PRIORITY)
+@idempotent
 async def subscribe_to_trainig(
     training_id: int,
     current_user: Annotated[UserDTO, Depends(get_current_client)]
@@ -73,7 +118,35 @@ async def subscribe_to_trainig(
             headers={"WWW-Authenticate": "Bearer"}
         )
     
+@router.post("/users/me/client/available_trainings/subscribe/batch", response_model=List[SubscriptionResultDTO])
+@query_budget(2)
+@deadline(3)
+@admission_class(PRIORITY)
+@idempotent
+async def subscribe_to_trainings(
+    current_user: Annotated[UserDTO, Depends(get_current_client)],
+    batch: TrainingIdsDTO = Body()
+):
+    service = ClientService(current_user)
+    return await service.subscribe_to_trainings(training_ids=batch.training_ids)
+
+@router.post("/users/me/client/subscriptions/unsubscribe/batch", response_model=List[SubscriptionResultDTO])
+@query_budget(2)
+@deadline(3)
+@admission_class(PRIORITY)
+@idempotent
+async def unsubscribe_from_trainings(
+    current_user: Annotated[UserDTO, Depends(get_current_client)],
+    batch: TrainingIdsDTO = Body()
+):
+    service = ClientService(current_user)
+    return await service.unsubscribe_from_trainings(training_ids=batch.training_ids)
+    
 @router.delete("/users/me/client/subscriptions/unsubscribe", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(3)
+@deadline(3)
+@admission_class(PRIORITY)
+@idempotent
 async def unsubscribe_from_training(
     training_id: int,
     current_user: Annotated[UserDTO, Depends(get_current_client)]
@@ -85,4 +158,48 @@ async def unsubscribe_from_training(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"A subscription on a training with id={training_id} was not found in your subscriptions."
+        )
+
+@router.get("/users/me/client/waitlist/", response_model=List[WaitlistDTO])
+@query_budget(2)
+@deadline(3)
+async def read_own_waitlist(
+    current_user: Annotated[UserDTO, Depends(get_current_client)]
+) -> List[WaitlistDTO]:
+    service = ClientService(current_user)
+    return await service.show_my_waitlist()
+
+@router.post("/users/me/client/waitlist/join", response_model=WaitlistDTO, status_code=status.HTTP_201_CREATED)
+@query_budget(3)
+@deadline(3)
+@admission_class(PRIORITY)
+async def join_waitlist(
+    training_id: int,
+    current_user: Annotated[UserDTO, Depends(get_current_client)]
+):
+    service = ClientService(current_user)
+    try:
+        entry = await service.join_waitlist(training_id=training_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No available trainings with this ID",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return entry
+
+@router.delete("/users/me/client/waitlist/leave", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(2)
+@deadline(3)
+async def leave_waitlist(
+    training_id: int,
+    current_user: Annotated[UserDTO, Depends(get_current_client)]
+):
+    service = ClientService(current_user)
+    try:
+        await service.leave_waitlist(training_id=training_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"You are not on the waitlist of the training with id={training_id}."
         )
\ No newline at end of file
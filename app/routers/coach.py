@@ -1,17 +1,40 @@
 from datetime import datetime
 from typing import Annotated, List
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
 from db.database import CoachService
 from models.enums import Auditory, Discipline, Gender, Role, TrainingType
-from schemas.schemas import TrainingAddDTO, TrainingDTO, TrainingOnInputDTO, TrainingOnInputToUpdateDTO, TrainingSearchDTO, UserDTO
+from schemas.schemas import (
+    TrainingAddDTO, TrainingDTO, TrainingOnInputDTO, TrainingOnInputToUpdateDTO, TrainingSearchDTO, TrainingsImportDTO,
+    TrainingsSelectionDTO, TrainingsShiftDTO, TrainingTemplateDTO, UserDTO, TRAININGS_IMPORT_MAX_SIZE
+)
+from app.deadlines import deadline
+from app.ical import parse_events
+from app.idempotency import idempotent
+from app.query_budget import query_budget
+from app.responses import DTOListResponse
 from app.routers.auth import get_current_user
-from datetime import datetime, date as date_, time as time_
 
 router = APIRouter(
     prefix="/coach",
     tags=["Coach"]
 )
 
+def to_training_add_dto(training_data: TrainingOnInputDTO, coach_id: int) -> TrainingAddDTO:
+    return TrainingAddDTO(
+        title=training_data.title,
+        description=training_data.description,
+        time_start=datetime.combine(training_data.date, training_data.time_start),
+        time_end=datetime.combine(training_data.date, training_data.time_end),
+        type=TrainingType(training_data.type),
+        discipline=Discipline(training_data.discipline),
+        coach_id=coach_id,
+        individual_for_id=training_data.individual_for_id,
+        target_auditory=training_data.target_auditory,
+        target_gender=training_data.target_gender,
+        target_usertype=training_data.target_usertype,
+        capacity=training_data.capacity
+    )
+
 def get_curent_coach(user: UserDTO = Depends(get_current_user)) -> UserDTO:
     if user.role != Role.COACH:
         raise HTTPException(
@@ -23,21 +46,24 @@ def get_curent_coach(user: UserDTO = Depends(get_current_user)) -> UserDTO:
     return user
 
 @router.get("/users/me/coach", response_model=UserDTO)
+@query_budget(1)
 async def read_current_coach(
     current_user: Annotated[UserDTO, Depends(get_curent_coach)]
 ) -> UserDTO:
     service = CoachService(current_user)
     return service.get_user()
 
-@router.get("/users/me/coach/trainings/get", status_code=status.HTTP_200_OK, response_model=List[TrainingDTO])
+@router.get("/users/me/coach/trainings/get", status_code=status.HTTP_200_OK, response_model=List[TrainingDTO], response_class=DTOListResponse)
+@query_budget(2)
+@deadline(5)
 async def get_trainings_by_parameters(
     current_user: Annotated[UserDTO, Depends(get_curent_coach)],
     title: str | None = None,
     description: str | None = None,
-    date_start_search: str | None = date_(2025, 1, 1),
-    date_end_search: str | None = date_(2025, 12, 31),
-    time_start_search: str | None = time_(0, 0, 0),
-    time_end_search: str | None = time_(23, 59, 59),
+    date_start_search: str | None = "2025-01-01",
+    date_end_search: str | None = "2025-12-31",
+    time_start_search: str | None = "00:00:00",
+    time_end_search: str | None = "23:59:59",
     type_: TrainingType | None = None,
     individual_for_id: int | None = None,
     discipline: Discipline | None = None,
@@ -60,9 +86,11 @@ async def get_trainings_by_parameters(
     )
     
     result = await service.get_trainings(training_dto)
-    return result
+    return DTOListResponse(result)
 
-@router.get('/users/me/coach/trainings/get_students_on_training/{training_id}', status_code=status.HTTP_200_OK, response_model=List[UserDTO])
+@router.get('/users/me/coach/trainings/get_students_on_training/{training_id}', status_code=status.HTTP_200_OK, response_model=List[UserDTO], response_class=DTOListResponse)
+@query_budget(3)
+@deadline(5)
 async def get_students_on_training(
     training_id: int,
     current_user: Annotated[UserDTO, Depends(get_curent_coach)]
@@ -77,7 +105,7 @@ async def get_students_on_training(
                 headers={"WWW-Authenticate": "Bearer"}
             )
         
-        return students
+        return DTOListResponse(students)
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -86,28 +114,15 @@ async def get_students_on_training(
         )
 
 @router.post("/users/me/coach/trainings/create", status_code=status.HTTP_201_CREATED)
+@query_budget(4)
+@deadline(10)
+@idempotent
 async def create_training(
     current_user: Annotated[UserDTO, Depends(get_curent_coach)],
     training_data: TrainingOnInputDTO = Body()
     ):
     service = CoachService(current_user)
-    training_dict = training_data.model_dump()
-    date_time_start = datetime.strptime(f"{training_dict["date"]} {training_dict["time_start"]}", "%Y-%m-%d %H:%M:%S")
-    date_time_end = datetime.strptime(f"{training_dict["date"]} {training_dict["time_end"]}", "%Y-%m-%d %H:%M:%S")
-
-    training_dto = TrainingAddDTO(
-        title=training_dict.get("title"),
-        description=training_dict.get("description"),
-        time_start=date_time_start,
-        time_end=date_time_end,
-        type=TrainingType(training_dict.get("type")),
-        discipline=Discipline(training_dict.get("discipline")),
-        coach_id=current_user.id,
-        individual_for_id=training_dict.get("individual_for_id"),
-        target_auditory=training_dict.get("target_auditory"),
-        target_gender=training_dict.get("target_gender"),
-        target_usertype=training_dict.get("target_usertype")
-    )
+    training_dto = to_training_add_dto(training_data, current_user.id)
     new_training = await service.create_training(training_data=training_dto)
     return {
         "code": 201,
@@ -118,7 +133,93 @@ async def create_training(
         }
     }
 
+@router.post("/users/me/coach/trainings/import", status_code=status.HTTP_201_CREATED)
+@query_budget(2)
+@deadline(10)
+@idempotent
+async def import_trainings(
+    current_user: Annotated[UserDTO, Depends(get_curent_coach)],
+    season: TrainingsImportDTO = Body()
+    ):
+    service = CoachService(current_user)
+    new_trainings = await service.create_trainings([to_training_add_dto(training, current_user.id) for training in season.trainings])
+    return {
+        "code": 201,
+        "status": "created",
+        "detail": {
+            "created_at": str(datetime.now()),
+            "content": new_trainings
+        }
+    }
+
+@router.post(
+    "/users/me/coach/trainings/import/ical",
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={"requestBody": {"required": True, "content": {"text/calendar": {"schema": {"type": "string"}}}}}
+)
+@query_budget(2)
+@deadline(10)
+@idempotent
+async def import_trainings_from_calendar(
+    request: Request,
+    current_user: Annotated[UserDTO, Depends(get_curent_coach)],
+    template: Annotated[TrainingTemplateDTO, Query()]
+    ):
+    """Create a training per event of an iCalendar file, the weekly recurring events expanded."""
+    events = parse_events((await request.body()).decode(errors="replace"), TRAININGS_IMPORT_MAX_SIZE)
+    season = TrainingsImportDTO(trainings=[
+        {
+            **template.model_dump(),
+            "title": event.title,
+            "description": event.description,
+            "date": event.start.date(),
+            "time_start": event.start.time(),
+            "time_end": event.end.time()
+        }
+        for event in events
+    ])
+    return await import_trainings(current_user=current_user, season=season)
+
+@router.patch("/users/me/coach/trainings/shift", status_code=status.HTTP_200_OK)
+@query_budget(2)
+@deadline(10)
+@idempotent
+async def shift_trainings(
+    current_user: Annotated[UserDTO, Depends(get_curent_coach)],
+    shift: TrainingsShiftDTO = Body()
+    ):
+    """Move all the selected trainings by the same number of minutes, e.g. when the gym opens later."""
+    service = CoachService(current_user)
+    shifted_trainings = await service.shift_trainings(selection=shift, minutes=shift.minutes)
+    return {
+        "code": 200,
+        "status": "updated",
+        "detail": {
+            "updated_at": str(datetime.now()),
+            "content": shifted_trainings
+        }
+    }
+
+@router.post("/users/me/coach/trainings/cancel", status_code=status.HTTP_200_OK)
+@query_budget(2)
+@deadline(10)
+@idempotent
+async def cancel_trainings(
+    current_user: Annotated[UserDTO, Depends(get_curent_coach)],
+    selection: TrainingsSelectionDTO = Body()
+    ):
+    """Delete all the selected trainings, e.g. the ones of a holiday week."""
+    service = CoachService(current_user)
+    cancelled_ids = await service.cancel_trainings(selection=selection)
+    return {
+        "code": 200,
+        "status": "deleted",
+        "ids": cancelled_ids
+    }
+
 @router.delete("/users/me/coach/trainings/delete/{training_id}", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(3)
+@deadline(5)
 async def delete_training(
     training_id: int,
     current_user: Annotated[UserDTO, Depends(get_curent_coach)]) -> None:
@@ -141,6 +242,8 @@ async def delete_training(
         )
     
 @router.patch("/users/me/coach/trainings/update/{training_id}", status_code=status.HTTP_200_OK)
+@query_budget(6)
+@deadline(10)
 async def update_training(
     current_user: Annotated[UserDTO, Depends(get_curent_coach)],
     training_id: int,
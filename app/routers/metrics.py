@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from app.config import settings
+from app.metrics import REGISTRY
+
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+router = APIRouter(
+    tags=["Metrics"]
+)
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics(request: Request) -> Response:
+    client_host = request.client.host if request.client else None
+    if not settings.METRICS_ENABLED or (not settings.METRICS_ALLOW_REMOTE and client_host not in LOCAL_HOSTS):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+
+    return Response(
+        content=REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
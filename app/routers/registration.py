@@ -1,5 +1,8 @@
 from fastapi import APIRouter, status
-from schemas.schemas import UserAddDTO, UserRegisterDTO
+from schemas.schemas import UserRegisterDTO, UserRegisteredDTO
+from app.deadlines import deadline
+from app.idempotency import idempotent
+from app.query_budget import query_budget
 from db.database import RegistrationService
 
 
@@ -8,7 +11,10 @@ router = APIRouter(
     tags=["Registration"]
 )
 
-@router.post("/register", response_model=UserAddDTO, status_code=status.HTTP_201_CREATED)
+@router.post("/register", response_model=UserRegisteredDTO, status_code=status.HTTP_201_CREATED)
+@query_budget(5)
+@deadline(10)
+@idempotent
 async def register_new_user(
     user_data: UserRegisterDTO
 ):
@@ -0,0 +1,23 @@
+import secrets
+from typing import Annotated
+from fastapi import Header, HTTPException, status
+from app.config import settings
+
+def is_admin_token(token: str | None) -> bool:
+    """Check a token against ADMIN_TOKEN, always False while no admin token is configured."""
+    if not settings.ADMIN_TOKEN or token is None:
+        return False
+    return secrets.compare_digest(token, settings.ADMIN_TOKEN)
+
+def require_admin(x_admin_token: Annotated[str | None, Header()] = None) -> None:
+    # the admin endpoints do not exist as long as no admin token is configured
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions. Admin access only."
+        )
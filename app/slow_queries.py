@@ -0,0 +1,112 @@
+import json
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Deque, Dict, List
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.config import settings
+from app.context import get_request_context
+
+RECENT_ENTRIES_LIMIT = 200
+
+logger = logging.getLogger(__name__)
+
+slow_query_logger = logging.getLogger("slow_queries")
+slow_query_logger.propagate = False
+
+recent_slow_queries: Deque[Dict[str, Any]] = deque(maxlen=RECENT_ENTRIES_LIMIT)
+
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> Any:
+    """Replace bound values by their type names, keeping the shape of the parameters."""
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return {key: f"<{type(value).__name__}>" for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [f"<{type(value).__name__}>" for value in parameters]
+    return None
+
+
+def _explain(conn, statement: str, parameters: Any) -> List[str] | None:
+    # only plain SELECTs are re-run: EXPLAIN ANALYZE executes the statement
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        # it runs in the transaction of the request, a failure, e.g. on its statement_timeout, must not abort it
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = [row[0] for row in cursor.fetchall()]
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    except Exception as ex:
+        logger.warning(f"Could not capture the plan of a slow query: {ex}")
+        return None
+    finally:
+        cursor.close()
+
+
+def record_slow_query(entry: Dict[str, Any]) -> None:
+    recent_slow_queries.append(entry)
+    slow_query_logger.warning(json.dumps(entry, default=str))
+
+
+def _setup_log_file() -> None:
+    if slow_query_logger.handlers:
+        return
+    path = Path(settings.SLOW_QUERY_LOG_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_query_logger.addHandler(handler)
+
+
+def instrument_slow_queries(engine: AsyncEngine) -> None:
+    """Record statements slower than SLOW_QUERY_THRESHOLD_MS to a rotating file and to memory."""
+    _setup_log_file()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (perf_counter() - conn.info["query_start_time"].pop()) * 1000
+        if duration_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+            return
+
+        ctx = get_request_context()
+        entry = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "route": ctx.route if ctx is not None else None,
+            "method": ctx.method if ctx is not None else None,
+            "statement": statement,
+            "parameters": redact_parameters(parameters, executemany),
+            "plan": None
+        }
+        if not executemany and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+            entry["plan"] = _explain(conn, statement, parameters)
+        record_slow_query(entry)
+
+    def handle_error(exception_context):
+        # keep the timing stack balanced when a statement fails
+        starts = exception_context.connection.info.get("query_start_time") if exception_context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", handle_error)
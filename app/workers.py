@@ -0,0 +1,280 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from time import perf_counter
+from typing import Dict, Tuple
+from app.config import settings
+from app.metrics import (
+    AGE_ROLLOVER_USERS, AVAILABILITY_RETARGETED, RETENTION_ROWS_RECLAIMED, RETENTION_RUN_DURATION, WAITLIST_BATCHES, WAITLIST_PROMOTED
+)
+from db.database import AgeRolloverService, IdempotencyService, PartitionService, RetentionService, WaitlistService, seat_freed_listeners
+from db.partitions import months_from
+
+logger = logging.getLogger(__name__)
+
+
+class WaitlistWorker():
+    """Background task subscribing the waitlisted students when seats free up.
+
+    It runs when the services of this process report a seat freed for a waitlist, and every
+    poll_interval for the seats freed by the other processes. Each batch claims its trainings with
+    SKIP LOCKED, so several workers, one per process, share the work without promoting a student twice.
+    """
+
+    def __init__(self, batch_size: int, poll_interval: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            # created here, on the event loop of the app
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="waitlist-worker")
+            seat_freed_listeners.append(self.notify)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            seat_freed_listeners.remove(self.notify)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+
+    def notify(self, training_id: int | None = None) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run_once(self) -> int:
+        """Promote until no training with a free seat has a waitlist, returns the number of promotions."""
+        total = 0
+        while True:
+            start = perf_counter()
+            promoted = await WaitlistService.promote_waitlisted(self.batch_size)
+            WAITLIST_BATCHES.observe(value=perf_counter() - start)
+            if not promoted:
+                return total
+            WAITLIST_PROMOTED.inc(amount=len(promoted))
+            total += len(promoted)
+            for subscription in promoted:
+                logger.info(f"user {subscription.user_id} promoted from the waitlist of training {subscription.training_id}")
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("waitlist promotion failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except TimeoutError:
+                pass
+
+
+class IdempotencyKeysCleaner():
+    """Background task deleting the idempotency keys older than IDEMPOTENCY_TTL_SECONDS every interval."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="idempotency-keys-cleaner")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                deleted = await IdempotencyService.delete_expired()
+                if deleted:
+                    logger.info(f"{deleted} expired idempotency keys deleted")
+            except Exception:
+                logger.exception("idempotency keys cleanup failed")
+            await asyncio.sleep(self.interval)
+
+
+class PartitionsMaintainer():
+    """Background task creating the monthly partitions of the trainings months_ahead months ahead every interval."""
+
+    def __init__(self, months_ahead: int, interval: float):
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="partitions-maintainer")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> int:
+        """Create the missing partitions from the current month on, returns the number of months created."""
+        created = 0
+        for month in months_from(date.today(), self.months_ahead + 1):
+            # a month failing, e.g. on a lock timeout, is retried at the next run
+            try:
+                if await PartitionService.create_month_partitions(month):
+                    logger.info(f"partitions of {month:%Y-%m} created")
+                    created += 1
+            except Exception:
+                logger.exception(f"creating the partitions of {month:%Y-%m} failed")
+        return created
+
+    async def _run(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+
+class RetentionWorker():
+    """Background task removing the rows of the past trainings every interval, see db.database.RetentionService.
+
+    The first run waits an interval, a restart of the app doesn't start with a prune.
+    """
+
+    def __init__(self, batch_size: int, archive_after_days: int, interval: float):
+        self.batch_size = batch_size
+        self.archive_after_days = archive_after_days
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="retention-worker")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> Dict[str, int]:
+        """Prune the past availability and waitlists, archive the old subscriptions, returns the rows reclaimed per method."""
+        start = perf_counter()
+        reclaimed = {"dropped": 0, "deleted": 0, "waitlist": 0, "archived": 0}
+        for partition in await RetentionService.past_availability_partitions(date.today()):
+            # a partition failing, e.g. on a lock timeout, is retried at the next run
+            try:
+                rows = await RetentionService.drop_availability_partition(partition)
+            except Exception:
+                logger.exception(f"dropping the partition {partition} failed")
+                continue
+            logger.info(f"partition {partition} dropped, about {rows} rows reclaimed")
+            RETENTION_ROWS_RECLAIMED.inc("available_trainings", "dropped", amount=rows)
+            reclaimed["dropped"] += rows
+
+        reclaimed["deleted"] = await RetentionService.delete_past_availability(self.batch_size)
+        RETENTION_ROWS_RECLAIMED.inc("available_trainings", "deleted", amount=reclaimed["deleted"])
+
+        reclaimed["waitlist"] = await RetentionService.delete_started_waitlists(self.batch_size)
+        RETENTION_ROWS_RECLAIMED.inc("waitlist", "deleted", amount=reclaimed["waitlist"])
+
+        before = datetime.now(timezone.utc) - timedelta(days=self.archive_after_days)
+        reclaimed["archived"] = await RetentionService.archive_subscriptions(before, self.batch_size)
+        RETENTION_ROWS_RECLAIMED.inc("subscriptions", "archived", amount=reclaimed["archived"])
+
+        RETENTION_RUN_DURATION.observe(value=perf_counter() - start)
+        return reclaimed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                reclaimed = await self.run_once()
+                if any(reclaimed.values()):
+                    logger.info(f"retention: {reclaimed}")
+            except Exception:
+                logger.exception("retention run failed")
+
+
+class AgeRolloverWorker():
+    """Background task moving the users whose age_type changed to their new one every interval, see AgeRolloverService."""
+
+    def __init__(self, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="age-rollover-worker")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> Tuple[int, int, int]:
+        """Roll over the users due today by batches, returns the numbers of users, of removed and of added available trainings."""
+        total = [0, 0, 0]
+        while True:
+            users, removed, added = await AgeRolloverService.roll_over(date.today(), self.batch_size)
+            AGE_ROLLOVER_USERS.inc(amount=users)
+            AVAILABILITY_RETARGETED.inc("age_rollover", "removed", amount=removed)
+            AVAILABILITY_RETARGETED.inc("age_rollover", "added", amount=added)
+            total = [total[0] + users, total[1] + removed, total[2] + added]
+            # fewer than a batch: the rest is done or claimed by another process
+            if users < self.batch_size:
+                return tuple(total)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                users, removed, added = await self.run_once()
+                if users:
+                    logger.info(f"{users} users rolled over to their new age_type, {removed} available trainings removed, {added} added")
+            except Exception:
+                logger.exception("age rollover failed")
+            await asyncio.sleep(self.interval)
+
+
+waitlist_worker = WaitlistWorker(
+    batch_size=settings.WAITLIST_BATCH_SIZE,
+    poll_interval=settings.WAITLIST_POLL_INTERVAL_SECONDS
+)
+
+idempotency_keys_cleaner = IdempotencyKeysCleaner(interval=settings.IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS)
+
+partitions_maintainer = PartitionsMaintainer(
+    months_ahead=settings.PARTITION_MONTHS_AHEAD,
+    interval=settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS
+)
+
+retention_worker = RetentionWorker(
+    batch_size=settings.RETENTION_BATCH_SIZE,
+    archive_after_days=settings.SUBSCRIPTIONS_ARCHIVE_AFTER_DAYS,
+    interval=settings.RETENTION_INTERVAL_SECONDS
+)
+
+age_rollover_worker = AgeRolloverWorker(
+    batch_size=settings.AGE_ROLLOVER_BATCH_SIZE,
+    interval=settings.AGE_ROLLOVER_INTERVAL_SECONDS
+)
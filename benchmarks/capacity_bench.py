@@ -0,0 +1,137 @@
+"""Concurrency benchmark of ClientService.subscribe_to_training on a training with a capacity.
+
+Usage:
+    python -m benchmarks.capacity_bench
+    python -m benchmarks.capacity_bench --subscribers 1000 --capacity 100 --pool-size 20
+    python -m benchmarks.capacity_bench --compare benchmarks/results/capacity-<timestamp>.json
+
+Runs against the seeded dataset (python -m db.seed). A training with --capacity seats is made
+available to --subscribers seeded students, who all subscribe at once. The run reports the
+latencies of the subscriptions and the outcomes, then checks that seats_taken matches the
+subscriptions and never exceeds the capacity: the exit code is 1 on oversubscription. The training
+is deleted afterwards.
+"""
+import argparse
+import asyncio
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Sequence, Tuple
+from sqlalchemy import delete, func, select
+from app.config import settings
+from benchmarks.common import compare_results, load_results, print_table, save_results, summarize_latencies
+import db.database as database
+from db.database import ClientService
+from models.enums import Discipline, Role, TrainingType
+from models.models import AvailableTraining, Subscription, Training, User
+from schemas.exceptions import TrainingIsFullError
+from schemas.schemas import UserDTO
+
+
+async def prepare(subscribers: int, capacity: int) -> Tuple[int, List[UserDTO]]:
+    async with database.async_session_factory() as session:
+        students = (await session.execute(
+            select(User).where(User.role == Role.STUDENT).order_by(User.id).limit(subscribers)
+        )).scalars().all()
+        coach_id = (await session.execute(select(User.id).where(User.role == Role.COACH).limit(1))).scalar_one()
+
+        training = Training(
+            title="Capacity bench", time_start=datetime(2025, 12, 31, 18), time_end=datetime(2025, 12, 31, 19),
+            type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=coach_id, capacity=capacity
+        )
+        session.add(training)
+        await session.flush()
+        await database.insert_available_trainings(
+            session, [{"user_id": student.id, "training_id": training.id, "training_time_start": training.time_start} for student in students]
+        )
+        training_id = training.id
+        dtos = [UserDTO.model_validate(student, from_attributes=True) for student in students]
+        await session.commit()
+    return training_id, dtos
+
+
+async def subscribe(student: UserDTO, training_id: int) -> Tuple[str, float]:
+    start = perf_counter()
+    try:
+        await ClientService(student).subscribe_to_training(training_id)
+        outcome = "subscribed"
+    except TrainingIsFullError:
+        outcome = "full"
+    except Exception as ex:
+        outcome = type(ex).__name__
+    return outcome, perf_counter() - start
+
+
+async def run(args: argparse.Namespace) -> Tuple[Dict[str, Dict], bool]:
+    settings.DB_POOL_SIZE = args.pool_size
+    database.init_engine()
+    try:
+        training_id, students = await prepare(args.subscribers, args.capacity)
+        try:
+            start = perf_counter()
+            outcomes = await asyncio.gather(*(subscribe(student, training_id) for student in students))
+            elapsed = perf_counter() - start
+
+            async with database.async_session_factory() as session:
+                seats_taken = (await session.get(Training, training_id)).seats_taken
+                subscriptions = (await session.execute(
+                    select(func.count()).select_from(Subscription).where(Subscription.training_id == training_id)
+                )).scalar()
+        finally:
+            async with database.async_session_factory() as session:
+                await session.execute(delete(Training).where(Training.id == training_id))
+                await session.commit()
+    finally:
+        await database.dispose_engine()
+
+    counts = Counter(outcome for outcome, _ in outcomes)
+    summary = summarize_latencies([latency for _, latency in outcomes], elapsed, len(outcomes) - counts["subscribed"] - counts["full"])
+    summary.update({"subscribed": counts["subscribed"], "full": counts["full"], "seats_taken": seats_taken})
+    results = {f"subscribe@c{len(students)}": summary}
+    print_table(results)
+
+    consistent = seats_taken == subscriptions == counts["subscribed"] <= args.capacity
+    if not consistent:
+        print(f"OVERSUBSCRIBED capacity={args.capacity} seats_taken={seats_taken} subscriptions={subscriptions} "
+              f"successful={counts['subscribed']}")
+    for outcome, count in counts.items():
+        if outcome not in ("subscribed", "full"):
+            print(f"{count} subscriptions failed with {outcome}")
+    return results, consistent
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark concurrent subscriptions to a training with a capacity.")
+    parser.add_argument("--subscribers", type=int, default=1000, help="seeded students subscribing at once")
+    parser.add_argument("--capacity", type=int, default=100, help="seats of the training")
+    parser.add_argument("--pool-size", type=int, default=settings.DB_POOL_SIZE, help="connections of the engine")
+    parser.add_argument("--output", type=Path, help="where to store the results (default: benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, help="a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(argv)
+    results, consistent = asyncio.run(run(args))
+    path = save_results("capacity", results, {
+        "subscribers": args.subscribers,
+        "capacity": args.capacity,
+        "pool_size": args.pool_size
+    }, args.output)
+    print(f"results stored in {path}")
+
+    if not consistent:
+        return 1
+    if args.compare:
+        regressions = compare_results(results, load_results(args.compare), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import json
+import math
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# metrics where a higher value is better, every other compared metric is a latency
+HIGHER_IS_BETTER = {"throughput_rps", "ops_per_second", "rows_per_second"}
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence, q in [0, 100]."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize_latencies(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """Summarize latencies given in seconds, the summary is in milliseconds."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3)
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(suite: str, results: Dict[str, Any], parameters: Dict[str, Any], output: Path | None = None) -> Path:
+    """Store a run as JSON, by default under benchmarks/results/<suite>-<timestamp>.json."""
+    timestamp = datetime.now(timezone.utc)
+    if output is None:
+        output = RESULTS_DIR / f"{suite}-{timestamp.strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "suite": suite,
+        "recorded_at": timestamp.isoformat(),
+        "revision": git_revision(),
+        "parameters": parameters,
+        "results": results
+    }, indent=2, default=str))
+    return output
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """List the metrics of current that regressed by more than threshold (0.1 = 10%) against baseline.
+
+    Both are the "results" mapping of a stored run: {case: {metric: value}}.
+    """
+    regressions = []
+    for case, metrics in current.items():
+        baseline_metrics = baseline.get(case)
+        if not baseline_metrics:
+            continue
+        for metric, value in metrics.items():
+            before = baseline_metrics.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                change = (before - value) / before
+            elif metric.endswith("_ms") or metric.endswith("_us") or metric.endswith("_seconds"):
+                change = (value - before) / before
+            else:
+                continue
+            if change > threshold:
+                regressions.append(f"{case} {metric}: {before} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def load_results(path: Path) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text())["results"]
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    for case, metrics in results.items():
+        print(f"{case:45} " + "  ".join(f"{key}={value}" for key, value in metrics.items()))
@@ -0,0 +1,175 @@
+"""Micro-benchmarks of the validation and serialization cost of the DTOs in schemas.schemas.
+
+Usage:
+    python -m benchmarks.dto_bench
+    python -m benchmarks.dto_bench --cases training_input user_add --number 20000
+    python -m benchmarks.dto_bench --compare benchmarks/results/dto-<timestamp>.json
+
+Every case reports the cost of one object in microseconds (best of --repeat runs). Cases named
+*_reference run the previous implementation next to the optimized one, so the speedup is visible
+in a single run. No database is needed.
+"""
+import argparse
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, Sequence
+from fastapi.responses import JSONResponse
+from app.responses import DTOListResponse
+from benchmarks.common import compare_results, load_results, print_table, save_results
+from models.enums import Auditory, Discipline, Gender, Role, TrainingType, UserType
+from schemas.schemas import (
+    TrainingDTO, TrainingOnInputDTO, TrainingSearchDTO, UserAddDTO, UserDTO, UserRegisterDTO,
+    dto_list_adapter, dtos_from_orm, parse_date, parse_time
+)
+
+TRAINING_INPUT = {
+    "title": "Evening MMA",
+    "description": "Sparring and drills",
+    "date": "2025-12-31",
+    "time_start": "18:00:00",
+    "time_end": "19:30:00",
+    "type": "group",
+    "discipline": "MMA",
+    "target_auditory": "adults"
+}
+
+TRAINING_SEARCH = {
+    "date_start_search": "2025-01-01",
+    "date_end_search": "2025-12-31",
+    "time_start_search": "00:00:00",
+    "time_end_search": "23:59:59",
+    "discipline": "MMA"
+}
+
+USER_ADD = {
+    "name": "Bench User",
+    "email": "bench@bench.example.com",
+    "password": "$argon2id$v=19$m=65536,t=3,p=4$c2FsdHNhbHQ$aGFzaGhhc2hoYXNo",
+    "role": "student",
+    "age": 30,
+    "gender": "men"
+}
+
+USER_REGISTER = {
+    "name": "Bench User",
+    "email": "bench@bench.example.com",
+    "password": "BenchPass123",
+    "password_confirmation": "BenchPass123",
+    "role": "student",
+    "birth_date": "1990-01-01",
+    "gender": "men",
+    "level": "beginner",
+    "interests": ["MMA", "BJJ"]
+}
+
+# stand-ins for ORM rows, attribute access is all model_validate(from_attributes=True) relies on
+TRAINING_ROW = SimpleNamespace(
+    id=1,
+    title="Evening MMA",
+    description="Sparring and drills",
+    time_start=datetime(2025, 12, 31, 18, 0, tzinfo=timezone.utc),
+    time_end=datetime(2025, 12, 31, 19, 30, tzinfo=timezone.utc),
+    type=TrainingType.GROUP,
+    discipline=Discipline.MMA,
+    coach_id=1,
+    individual_for_id=None,
+    target_auditory=Auditory.ADULTS,
+    target_gender=None,
+    target_usertype=None
+)
+
+USER_ROW = SimpleNamespace(
+    id=1,
+    name="Bench User",
+    email="bench@bench.example.com",
+    password=USER_ADD["password"],
+    role=Role.STUDENT,
+    age=30,
+    gender=Gender.M,
+    age_type=Auditory.ADULTS,
+    user_type=UserType.NON_COMPETITOR
+)
+
+PAGE_SIZE = 100
+
+training_rows = [TRAINING_ROW] * PAGE_SIZE
+user_rows = [USER_ROW] * PAGE_SIZE
+training_dto = TrainingDTO.model_validate(TRAINING_ROW, from_attributes=True)
+training_page = [training_dto] * PAGE_SIZE
+training_list_adapter = dto_list_adapter(TrainingDTO)
+
+CASES: Dict[str, Callable[[], object]] = {
+    # parsing of the request fields
+    "parse_date": lambda: parse_date("2025-12-31"),
+    "parse_date_reference": lambda: datetime.strptime("2025-12-31", "%Y-%m-%d").date(),
+    "parse_time": lambda: parse_time("18:00:00"),
+    "parse_time_reference": lambda: datetime.strptime("18:00:00", "%H:%M:%S").time(),
+    # validation of the request bodies and query parameters
+    "training_input": lambda: TrainingOnInputDTO(**TRAINING_INPUT),
+    "training_search": lambda: TrainingSearchDTO(**TRAINING_SEARCH),
+    "user_add": lambda: UserAddDTO(**USER_ADD),
+    "user_register": lambda: UserRegisterDTO(**USER_REGISTER),
+    # DTOs built from the rows returned by db.database
+    "training_page_from_orm": lambda: dtos_from_orm(TrainingDTO, training_rows),
+    "training_page_from_orm_reference": lambda: [TrainingDTO.model_validate(row, from_attributes=True) for row in training_rows],
+    "user_page_from_orm": lambda: dtos_from_orm(UserDTO, user_rows),
+    "user_page_from_orm_reference": lambda: [UserDTO.model_validate(row, from_attributes=True) for row in user_rows],
+    # serialization of the responses
+    "training_dump": lambda: training_dto.model_dump(),
+    "training_dump_json": lambda: training_dto.model_dump_json(),
+    "training_page_dump_json": lambda: training_list_adapter.dump_json(training_page),
+    "training_page_response": lambda: DTOListResponse(training_page).body,
+    # what FastAPI does with a returned list: dump, validate against response_model, serialize, encode
+    "training_page_response_reference": lambda: JSONResponse(training_list_adapter.dump_python(
+        training_list_adapter.validate_python([dto.model_dump() for dto in training_page]), mode="json"
+    )).body,
+}
+
+
+def run_case(function: Callable[[], object], number: int, repeat: int) -> Dict[str, float]:
+    best = min(timeit.repeat(function, number=number, repeat=repeat)) / number
+    return {
+        "per_object_us": round(best * 1_000_000, 3),
+        "ops_per_second": round(1 / best, 1)
+    }
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the validation and serialization of the DTOs.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--number", type=int, default=10000, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs, the best one is reported")
+    parser.add_argument("--output", type=Path, help="where to store the results (default: benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, help="a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(argv)
+    results = {}
+    for name in args.cases:
+        # page cases time a whole page, report the cost of one object
+        number = args.number // PAGE_SIZE if "_page_" in name else args.number
+        results[name] = run_case(CASES[name], max(1, number), args.repeat)
+        if "_page_" in name:
+            results[name]["per_object_us"] = round(results[name]["per_object_us"] / PAGE_SIZE, 3)
+            results[name]["ops_per_second"] = round(results[name]["ops_per_second"] * PAGE_SIZE, 1)
+        print_table({name: results[name]})
+
+    path = save_results("dto", results, {"number": args.number, "repeat": args.repeat}, args.output)
+    print(f"results stored in {path}")
+
+    if args.compare:
+        regressions = compare_results(results, load_results(args.compare), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
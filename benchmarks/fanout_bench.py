@@ -0,0 +1,113 @@
+"""Benchmark of the writers of a training fan-out into available_trainings.
+
+Usage:
+    python -m benchmarks.fanout_bench
+    python -m benchmarks.fanout_bench --rows 1000 10000 100000 --repeat 5
+    python -m benchmarks.fanout_bench --compare benchmarks/results/fanout-<timestamp>.json
+
+Runs against the seeded dataset (python -m db.seed). For every size both writers of
+db.database.insert_available_trainings are timed: "insert", the multi-row INSERT ... ON CONFLICT DO
+NOTHING, and "copy", COPY into a temporary table merged with INSERT ... SELECT. Sizes above the
+number of seeded students are spread over several new trainings. Every run is rolled back.
+"""
+import argparse
+import asyncio
+import math
+import sys
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, List, Sequence
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from benchmarks.common import compare_results, load_results, print_table, save_results
+from db.database import create_engine, insert_available_trainings
+from models.enums import Discipline, Role, TrainingType
+from models.models import Training, User
+
+# the threshold forcing each writer, whatever the size
+WRITERS = {"insert": math.inf, "copy": 0}
+
+
+async def fanout_rows(session: AsyncSession, size: int) -> List[Dict[str, Any]]:
+    student_ids = (await session.execute(select(User.id).where(User.role == Role.STUDENT))).scalars().all()
+    coach_id = (await session.execute(select(User.id).where(User.role == Role.COACH).limit(1))).scalar_one()
+
+    trainings = [
+        Training(
+            title="Fan-out bench", time_start=datetime(2025, 12, 31, 18), time_end=datetime(2025, 12, 31, 19),
+            type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=coach_id
+        )
+        for _ in range(math.ceil(size / len(student_ids)))
+    ]
+    session.add_all(trainings)
+    await session.flush()
+
+    return [
+        {"user_id": user_id, "training_id": training.id, "training_time_start": training.time_start}
+        for training in trainings
+        for user_id in student_ids
+    ][:size]
+
+
+async def run_case(engine, writer: str, size: int, repeat: int) -> Dict[str, float]:
+    best = math.inf
+    for _ in range(repeat):
+        async with AsyncSession(bind=engine) as session:
+            rows = await fanout_rows(session, size)
+            settings.DB_COPY_THRESHOLD = WRITERS[writer]
+            start = perf_counter()
+            await insert_available_trainings(session, rows)
+            best = min(best, perf_counter() - start)
+            await session.rollback()
+    return {
+        "seconds": round(best, 4),
+        "rows_per_second": round(size / best, 1)
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict]:
+    engine = create_engine(args.url)
+    threshold = settings.DB_COPY_THRESHOLD
+    results = {}
+    try:
+        for size in args.rows:
+            for writer in args.writers:
+                name = f"{writer}@{size}"
+                results[name] = await run_case(engine, writer, size, args.repeat)
+                print_table({name: results[name]})
+    finally:
+        settings.DB_COPY_THRESHOLD = threshold
+        await engine.dispose()
+    return results
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the writers of a training fan-out.")
+    parser.add_argument("--url", default=settings.get_db_url_with_asyncpg, help="database with the seeded dataset")
+    parser.add_argument("--rows", nargs="+", type=int, default=[1000, 10000, 100000], help="fan-out sizes")
+    parser.add_argument("--writers", nargs="+", choices=list(WRITERS), default=list(WRITERS))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the best one is reported")
+    parser.add_argument("--output", type=Path, help="where to store the results (default: benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, help="a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    path = save_results("fanout", results, {"rows": args.rows, "repeat": args.repeat}, args.output)
+    print(f"results stored in {path}")
+
+    if args.compare:
+        regressions = compare_results(results, load_results(args.compare), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""End-to-end HTTP benchmarks of the hot endpoints, run against the seeded dataset (python -m db.seed).
+
+Usage:
+    python -m benchmarks.http_bench                                        # in-process, through ASGITransport
+    python -m benchmarks.http_bench --base-url http://127.0.0.1:8000       # against a live uvicorn
+    python -m benchmarks.http_bench --concurrency 1 8 32 --requests 400
+    python -m benchmarks.http_bench --compare benchmarks/results/http-<timestamp>.json
+
+Each (scenario, concurrency) case reports throughput and p50/p95/p99 latencies. The run is stored as
+JSON under benchmarks/results/, and --compare exits with 1 when a case regressed by more than
+--threshold against a previous run.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import uuid
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, Sequence, Tuple
+import httpx
+from benchmarks.common import compare_results, load_results, print_table, save_results, summarize_latencies
+from db.seed import COACH_EMAIL, SEED_PASSWORD, STUDENT_EMAIL
+from models.enums import Discipline
+
+SCENARIOS = ("login", "register", "available_trainings", "subscribe_unsubscribe", "week_subscribe", "app_open", "coach_search", "create_training", "create_training_retry")
+
+OpResult = Tuple[str, httpx.Response, float]
+
+
+@dataclass
+class VirtualUser:
+    index: int
+    student_email: str
+    student_headers: Dict[str, str] = field(default_factory=dict)
+    coach_headers: Dict[str, str] = field(default_factory=dict)
+    training_ids: List[int] = field(default_factory=list)
+
+
+async def timed(name: str, request: Awaitable[httpx.Response]) -> OpResult:
+    start = perf_counter()
+    response = await request
+    return name, response, perf_counter() - start
+
+
+async def login(client: httpx.AsyncClient, email: str) -> Dict[str, str]:
+    response = await client.post("/auth/token", data={"username": email, "password": SEED_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def prepare_users(client: httpx.AsyncClient, count: int, coach_accounts: int) -> List[VirtualUser]:
+    users = []
+    for index in range(count):
+        user = VirtualUser(index=index, student_email=STUDENT_EMAIL.format(index))
+        user.student_headers = await login(client, user.student_email)
+        user.coach_headers = await login(client, COACH_EMAIL.format(index % coach_accounts))
+        response = await client.get("/client/users/me/client/available_trainings/", headers=user.student_headers)
+        if response.status_code == 200:
+            user.training_ids = [training["id"] for training in response.json()]
+        users.append(user)
+    return users
+
+
+async def op_login(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    return [await timed("login", client.post("/auth/token", data={"username": user.student_email, "password": SEED_PASSWORD}))]
+
+
+async def op_register(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    password = "BenchPass123"
+    return [await timed("register", client.post("/registration/register", json={
+        "name": "Bench User",
+        "email": f"bench-{uuid.uuid4().hex[:16]}@bench.example.com",
+        "password": password,
+        "password_confirmation": password,
+        "role": "student",
+        "birth_date": "1990-01-01",
+        "gender": random.choice(("men", "woman")),
+        "level": random.choice(("beginner", "competitor", "non_competitor")),
+        "interests": random.sample([discipline.value for discipline in Discipline], k=2)
+    }))]
+
+
+async def op_available_trainings(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    return [await timed("available_trainings", client.get("/client/users/me/client/available_trainings/", headers=user.student_headers))]
+
+
+async def op_subscribe_unsubscribe(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    # subscribing then unsubscribing leaves the dataset as it was
+    if not user.training_ids:
+        return []
+    training_id = random.choice(user.training_ids)
+    subscribe = await timed("subscribe", client.post(
+        "/client/users/me/client/available_trainings/subscribe/",
+        params={"training_id": training_id},
+        headers=user.student_headers
+    ))
+    unsubscribe = await timed("unsubscribe", client.delete(
+        "/client/users/me/client/subscriptions/unsubscribe",
+        params={"training_id": training_id},
+        headers=user.student_headers
+    ))
+    return [subscribe, unsubscribe]
+
+
+WEEK_TRAININGS = 7
+
+
+async def op_week_subscribe(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    """Subscribe to a week of trainings one call per training, then with the batch endpoint."""
+    if not user.training_ids:
+        return []
+    training_ids = random.sample(user.training_ids, k=min(WEEK_TRAININGS, len(user.training_ids)))
+
+    start = perf_counter()
+    for training_id in training_ids:
+        response = await client.post(
+            "/client/users/me/client/available_trainings/subscribe/",
+            params={"training_id": training_id},
+            headers=user.student_headers
+        )
+    singles = ("week_subscribe_single_calls", response, perf_counter() - start)
+    await client.post("/client/users/me/client/subscriptions/unsubscribe/batch", json={"training_ids": training_ids}, headers=user.student_headers)
+
+    batch = await timed("week_subscribe_batch", client.post(
+        "/client/users/me/client/available_trainings/subscribe/batch",
+        json={"training_ids": training_ids},
+        headers=user.student_headers
+    ))
+    unsubscribe = await timed("week_unsubscribe_batch", client.post(
+        "/client/users/me/client/subscriptions/unsubscribe/batch",
+        json={"training_ids": training_ids},
+        headers=user.student_headers
+    ))
+    return [singles, batch, unsubscribe]
+
+
+# the calls of the mobile client when the app opens
+APP_OPEN_PATHS = (
+    "/client/users/me/client",
+    "/client/users/me/client/subscriptions/",
+    "/client/users/me/client/available_trainings/",
+    "/client/users/me/client/waitlist/"
+)
+
+
+async def op_app_open(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    """Load the app-open data with concurrent calls, then with one call to /batch."""
+    start = perf_counter()
+    responses = await asyncio.gather(*(client.get(path, headers=user.student_headers) for path in APP_OPEN_PATHS))
+    singles = ("app_open_single_calls", responses[0], perf_counter() - start)
+
+    batch = await timed("app_open_batch", client.post("/batch", headers=user.student_headers, json={
+        "requests": [{"method": "GET", "path": path} for path in APP_OPEN_PATHS]
+    }))
+    return [singles, batch]
+
+
+async def op_coach_search(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    today = date.today()
+    return [await timed("coach_search", client.get("/coach/users/me/coach/trainings/get", headers=user.coach_headers, params={
+        "date_start_search": str(today - timedelta(days=7)),
+        "date_end_search": str(today + timedelta(days=21)),
+        "time_start_search": "00:00:00",
+        "time_end_search": "23:59:59"
+    }))]
+
+
+def training_payload() -> Dict[str, str]:
+    return {
+        "title": "Bench training",
+        "description": "Created by benchmarks.http_bench",
+        "date": str(date.today() + timedelta(days=random.randint(1, 28))),
+        "time_start": "18:00:00",
+        "time_end": "19:30:00",
+        "type": "group",
+        "discipline": random.choice([discipline.value for discipline in Discipline])
+    }
+
+
+async def op_create_training(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    return [await timed("create_training", client.post("/coach/users/me/coach/trainings/create", headers=user.coach_headers, json=training_payload()))]
+
+
+async def op_create_training_retry(client: httpx.AsyncClient, user: VirtualUser) -> List[OpResult]:
+    """Create a training with an Idempotency-Key, then retry it as a client losing the first response would."""
+    headers = {**user.coach_headers, "Idempotency-Key": uuid.uuid4().hex}
+    payload = training_payload()
+    first = await timed("create_training_keyed", client.post("/coach/users/me/coach/trainings/create", headers=headers, json=payload))
+    retry = await timed("create_training_replayed", client.post("/coach/users/me/coach/trainings/create", headers=headers, json=payload))
+    return [first, retry]
+
+
+OPERATIONS: Dict[str, Callable[[httpx.AsyncClient, VirtualUser], Awaitable[List[OpResult]]]] = {
+    "login": op_login,
+    "register": op_register,
+    "available_trainings": op_available_trainings,
+    "subscribe_unsubscribe": op_subscribe_unsubscribe,
+    "week_subscribe": op_week_subscribe,
+    "app_open": op_app_open,
+    "coach_search": op_coach_search,
+    "create_training": op_create_training,
+    "create_training_retry": op_create_training_retry
+}
+
+
+async def run_case(client: httpx.AsyncClient, scenario: str, users: Sequence[VirtualUser], requests: int) -> Dict[str, Dict]:
+    """Run `requests` iterations of a scenario spread over one worker per virtual user."""
+    operation = OPERATIONS[scenario]
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    per_worker = max(1, requests // len(users))
+
+    async def worker(user: VirtualUser) -> None:
+        for _ in range(per_worker):
+            for name, response, latency in await operation(client, user):
+                latencies.setdefault(name, []).append(latency)
+                errors.setdefault(name, 0)
+                if response.status_code >= 400:
+                    errors[name] += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(worker(user) for user in users))
+    elapsed = perf_counter() - start
+
+    return {
+        name: summarize_latencies(values, elapsed, errors[name])
+        for name, values in latencies.items()
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict]:
+    results = {}
+    async with AsyncExitStack() as stack:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        if args.base_url:
+            client = await stack.enter_async_context(httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60))
+        else:
+            from app.main import app
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = await stack.enter_async_context(httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://bench", timeout=60
+            ))
+
+        users = await prepare_users(client, max(args.concurrency), args.coach_accounts)
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                case = await run_case(client, scenario, users[:concurrency], args.requests)
+                for name, summary in case.items():
+                    results[f"{name}@c{concurrency}"] = summary
+                    print_table({f"{name}@c{concurrency}": summary})
+    return results
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the hot HTTP endpoints.")
+    parser.add_argument("--base-url", help="benchmark a live server instead of the in-process app")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="iterations per scenario and concurrency level")
+    parser.add_argument("--coach-accounts", type=int, default=10, help="seeded coaches shared by the virtual users")
+    parser.add_argument("--output", type=Path, help="where to store the results (default: benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, help="a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    path = save_results("http", results, {
+        "target": args.base_url or "asgi",
+        "scenarios": args.scenarios,
+        "concurrency": args.concurrency,
+        "requests": args.requests
+    }, args.output)
+    print(f"results stored in {path}")
+
+    if args.compare:
+        regressions = compare_results(results, load_results(args.compare), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
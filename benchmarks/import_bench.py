@@ -0,0 +1,113 @@
+"""Benchmark of the creation of a season of trainings: one create_training per training against one import.
+
+Usage:
+    python -m benchmarks.import_bench
+    python -m benchmarks.import_bench --weeks 15 --slots 6 --repeat 3
+    python -m benchmarks.import_bench --compare benchmarks/results/import-<timestamp>.json
+
+Runs against the seeded dataset (python -m db.seed). A season is --weeks weeks of --slots weekly group
+trainings of a seeded coach, spread over the disciplines and targeting tuples. "single" creates it
+with CoachService.create_training, one transaction per training, "import" with
+CoachService.create_trainings. The trainings are deleted after every run.
+"""
+import argparse
+import asyncio
+import math
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Sequence
+from sqlalchemy import delete, select
+from app.config import settings
+from benchmarks.common import compare_results, load_results, print_table, save_results
+import db.database as database
+from db.database import CoachService
+from models.enums import Auditory, Discipline, Gender, Role, TrainingType
+from models.models import Training, User
+from schemas.schemas import TrainingAddDTO, UserDTO
+
+SEASON_START = datetime(2026, 9, 7, 18)
+TARGETS = [(None, None), (Auditory.ADULTS, None), (None, Gender.W), (Auditory.CHILDREN, Gender.M)]
+
+
+def season(coach_id: int, weeks: int, slots: int) -> List[TrainingAddDTO]:
+    disciplines = list(Discipline)
+    trainings = []
+    for slot in range(slots):
+        auditory, gender = TARGETS[slot % len(TARGETS)]
+        for week in range(weeks):
+            start = SEASON_START + timedelta(weeks=week, days=slot % 6)
+            trainings.append(TrainingAddDTO(
+                title=f"Import bench {slot}", time_start=start, time_end=start + timedelta(hours=1),
+                type=TrainingType.GROUP, discipline=disciplines[slot % len(disciplines)], coach_id=coach_id,
+                target_auditory=auditory, target_gender=gender
+            ))
+    return trainings
+
+
+async def run_case(service: CoachService, trainings: List[TrainingAddDTO], writer: str, repeat: int) -> Dict[str, float]:
+    best = math.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        if writer == "single":
+            for training in trainings:
+                await service.create_training(training)
+        else:
+            await service.create_trainings(trainings)
+        best = min(best, perf_counter() - start)
+
+        async with database.async_session_factory() as session:
+            await session.execute(delete(Training).where(Training.title.like("Import bench %")))
+            await session.commit()
+    return {
+        "seconds": round(best, 4),
+        "trainings_per_second": round(len(trainings) / best, 1)
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict]:
+    database.init_engine()
+    results = {}
+    try:
+        async with database.async_session_factory() as session:
+            coach = (await session.execute(select(User).where(User.role == Role.COACH).limit(1))).scalar_one()
+            service = CoachService(UserDTO.model_validate(coach, from_attributes=True))
+        trainings = season(service.user.id, args.weeks, args.slots)
+        for writer in args.writers:
+            name = f"{writer}@{len(trainings)}"
+            results[name] = await run_case(service, trainings, writer, args.repeat)
+            print_table({name: results[name]})
+    finally:
+        await database.dispose_engine()
+    return results
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the import of a season of trainings.")
+    parser.add_argument("--weeks", type=int, default=15, help="weeks of the season")
+    parser.add_argument("--slots", type=int, default=6, help="group trainings a week")
+    parser.add_argument("--writers", nargs="+", choices=("single", "import"), default=["single", "import"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the best one is reported")
+    parser.add_argument("--output", type=Path, help="where to store the results (default: benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, help="a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    path = save_results("import", results, {"weeks": args.weeks, "slots": args.slots, "repeat": args.repeat}, args.output)
+    print(f"results stored in {path}")
+
+    if args.compare:
+        regressions = compare_results(results, load_results(args.compare), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
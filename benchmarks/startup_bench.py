@@ -0,0 +1,104 @@
+"""Cold start benchmark: time to import app.main and to run the startup of its lifespan.
+
+Usage:
+    python -m benchmarks.startup_bench                     # import time only, no database needed
+    python -m benchmarks.startup_bench --lifespan          # plus engine creation and pool warm-up
+    python -m benchmarks.startup_bench --report 30         # the 30 slowest modules of the import
+    python -m benchmarks.startup_bench --compare benchmarks/results/startup-<timestamp>.json
+
+Every run starts a fresh interpreter, so nothing is cached in sys.modules. The import profile is
+taken with python -X importtime, the raw log is stored next to the results and can be opened with
+tuna for a full tree.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+from benchmarks.common import RESULTS_DIR, compare_results, load_results, print_table, save_results
+
+# run in the child interpreter, prints the phases as JSON on the last line of stdout
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+result = {"import_seconds": imported - start}
+if LIFESPAN:
+    async def startup():
+        async with app.router.lifespan_context(app):
+            result["lifespan_startup_seconds"] = time.perf_counter() - imported
+    asyncio.run(startup())
+print(json.dumps(result))
+"""
+
+_importtime_re = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_probe(lifespan: bool, importtime: bool = False) -> Tuple[Dict[str, float], str]:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", f"LIFESPAN = {lifespan}\n{PROBE}"]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True, env=os.environ.copy())
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_modules(importtime_log: str, count: int) -> List[Tuple[str, float, float]]:
+    """(module, self ms, cumulative ms) of the modules with the largest cumulative import time."""
+    modules = []
+    for match in _importtime_re.finditer(importtime_log):
+        modules.append((match[4], int(match[1]) / 1000, int(match[2]) / 1000))
+    return sorted(modules, key=lambda module: module[2], reverse=True)[:count]
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the app.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start, the median is reported")
+    parser.add_argument("--lifespan", action="store_true", help="also run the lifespan startup (needs the database)")
+    parser.add_argument("--report", type=int, default=20, help="slowest modules to list, 0 to skip the import profile")
+    parser.add_argument("--output", type=Path, help="where to store the results (default: benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, help="a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(argv)
+
+    runs = [run_probe(args.lifespan)[0] for _ in range(args.runs)]
+    results = {
+        "startup": {
+            phase: round(statistics.median(run[phase] for run in runs), 4)
+            for phase in runs[0]
+        }
+    }
+    print_table(results)
+
+    if args.report:
+        _, importtime_log = run_probe(lifespan=False, importtime=True)
+        print(f"\n{'module':60} {'self ms':>10} {'cumulative ms':>14}")
+        for module, self_ms, cumulative_ms in slowest_modules(importtime_log, args.report):
+            print(f"{module:60} {self_ms:10.1f} {cumulative_ms:14.1f}")
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        log_path = RESULTS_DIR / "startup-importtime.log"
+        log_path.write_text(importtime_log)
+        print(f"\nimport profile stored in {log_path}")
+
+    path = save_results("startup", results, {"runs": args.runs, "lifespan": args.lifespan}, args.output)
+    print(f"results stored in {path}")
+
+    if args.compare:
+        regressions = compare_results(results, load_results(args.compare), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
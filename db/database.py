@@ -4,29 +4,700 @@ import pathlib
 root_path = pathlib.Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(root_path))
 
-from typing import Any, Dict, List, Sequence
-from schemas.exceptions import InvalidPermissionsError
-from sqlalchemy import delete, exists, select, and_, or_, cast, Date, Time, text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import selectinload
+import asyncio
+import uuid
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from models.enums import Discipline, Gender, Role, SubscriptionStatus, UserType
+from schemas.exceptions import BusinessRulesValidationError, InvalidPermissionsError, RegistrationError, TrainingIsFullError
+from sqlalchemy import any_, bindparam, delete, exists, func, literal, select, tuple_, update, and_, or_, cast, Integer, Time, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased, selectinload
 from sqlalchemy.dialects import postgresql
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from app.config import settings
-from models.models import Interest, User, Training, TrainingType, Subscription, AvailableTraining
-from datetime import date, datetime, time
-from schemas.schemas import *
-from argon2 import PasswordHasher
-
-async_engine = create_async_engine(
-    url=settings.get_db_url_with_asyncpg, 
-    echo=True,
-    pool_size=5,
-    max_overflow=10
+from app.context import INTERNAL_STATEMENT
+from app.hashing import get_password_hash_async
+from app.metrics import AVAILABILITY_RETARGETED, InstrumentedQueuePool
+from db.partitions import add_months, create_partition_statements, month_start, partition_month, partition_name, partitioned_until
+from models.models import Interest, User, Training, TrainingType, Subscription, SubscriptionHistory, AvailableTraining, WaitlistEntry, IdempotencyKey
+from datetime import date, datetime, time, timedelta
+from schemas.schemas import (
+    StoredResponseDTO, SubscriptionDTO, SubscriptionResultDTO, TrainingAddDTO, TrainingDTO, TrainingSearchDTO, TrainingsSelectionDTO,
+    UserAddDTO, UserDTO, UserRegisterDTO, WaitlistDTO, age_on, age_type_of, dtos_from_orm, next_age_type_change
 )
 
-ph = PasswordHasher()
+LOCK_NOT_AVAILABLE = "55P03" # sqlstate of a lock not granted within lock_timeout
+CHECK_VIOLATION = "23514"
+
+# the engine is created and disposed by the lifespan of the app (app.main), sessions are bound to it by init_engine()
+async_engine: AsyncEngine | None = None
+async_session_factory = async_sessionmaker()
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4().hex}__"
+
+
+def create_engine(url: str, pgbouncer_mode: bool = False) -> AsyncEngine:
+    """Create the engine of the app, pgbouncer_mode makes it safe behind PgBouncer in transaction pooling.
+
+    PgBouncer hands every transaction to any server connection, so a statement prepared in one
+    transaction is unknown to the next one: both prepared statement caches are disabled and the
+    statements get unique names instead of asyncpg's per-connection counters.
+    """
+    options = {}
+    if pgbouncer_mode:
+        options["connect_args"] = {
+            "statement_cache_size": 0, # asyncpg's cache
+            "prepared_statement_cache_size": 0, # SQLAlchemy's cache
+            "prepared_statement_name_func": _unique_statement_name
+        }
+        # connections to PgBouncer are cheap and it closes the idle ones, recycle them before it does
+        options["pool_recycle"] = settings.DB_PGBOUNCER_POOL_RECYCLE
+
+    return create_async_engine(
+        url=url,
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        poolclass=InstrumentedQueuePool,
+        **options
+    )
+
+
+def init_engine() -> AsyncEngine:
+    global async_engine
+
+    async_engine = create_engine(settings.get_db_url_with_asyncpg, pgbouncer_mode=settings.DB_PGBOUNCER_MODE)
+    async_session_factory.configure(bind=async_engine)
+    return async_engine
+
+
+# called with the id of a training when one of its seats may go to its waitlist, see app.workers
+seat_freed_listeners: List[Callable[[int], None]] = []
+
+
+def notify_seat_freed(training_id: int) -> None:
+    for listener in seat_freed_listeners:
+        listener(training_id)
+
+
+async def dispose_engine() -> None:
+    global async_engine
+
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
+
+
+# statements of the hot paths, shared by the services and warm_up_engine() so both prepare the same SQL
+
+def day_window(column, date_start: date | None, date_end: date | None) -> List[Any]:
+    """Conditions keeping the times of column from date_start to date_end included.
+
+    A range on the column itself, not on its date, so that an index on it is used and the
+    partitions of the other months are pruned.
+    """
+    filters = []
+    if date_start is not None:
+        filters.append(column >= datetime.combine(date_start, time.min))
+    if date_end is not None:
+        filters.append(column < datetime.combine(date_end + timedelta(days=1), time.min))
+    return filters
+
+def training_key(training_id, training_time_start):
+    """The reference to a training from its fan-out, its time_start lets Postgres prune the partitions of the trainings."""
+    return tuple_(Training.id, Training.time_start) == tuple_(training_id, training_time_start)
+
+def audience_filters(targets, age_type, gender, user_type) -> List[Any]:
+    """Conditions of the targeting of a group training matching a user, shared by every computation of the availability.
+
+    targets has the target_* columns, Training or a CTE, the user attributes are columns or values.
+    The discipline, matched against the interests, and the type of the training are left to the caller.
+    """
+    return [
+        or_(targets.target_auditory.is_(None), targets.target_auditory == age_type),
+        or_(targets.target_gender.is_(None), targets.target_gender == gender),
+        or_(targets.target_usertype.is_(None), targets.target_usertype == user_type)
+    ]
+
+def user_by_email_query(email: str):
+    return select(User).where(User.email == email)
+
+def available_trainings_query(user_id: int, *filters):
+    return select(
+        Training
+    ).join(
+        AvailableTraining, training_key(AvailableTraining.training_id, AvailableTraining.training_time_start)
+    ).where(
+        AvailableTraining.user_id == user_id, *filters
+    )
+
+def available_trainings_window_query(user_id: int, date_start: date | None, date_end: date | None, *filters):
+    """The available trainings of a user between date_start and date_end included, see day_window()."""
+    return available_trainings_query(
+        user_id,
+        *day_window(AvailableTraining.training_time_start, date_start, date_end),
+        *day_window(Training.time_start, date_start, date_end),
+        *filters
+    )
+
+def available_training_delete(user_id: int, training_id: int):
+    return delete(
+        AvailableTraining
+    ).where(
+        AvailableTraining.user_id == user_id,
+        AvailableTraining.training_id == training_id
+    ).returning(
+        AvailableTraining.training_id, AvailableTraining.training_time_start
+    )
+
+def available_training_insert(user_id: int, training_id: int, training_time_start: datetime):
+    return pg_insert(
+        AvailableTraining
+    ).values(
+        user_id=user_id,
+        training_id=training_id,
+        training_time_start=training_time_start
+    ).on_conflict_do_nothing(
+        index_elements=["user_id", "training_id", "training_time_start"]
+    )
+
+def subscribe_statement(user_id: int, training_id: int):
+    """Move a training from the available trainings of a user to its subscriptions, taking a seat.
+
+    A single statement: the seat is taken by UPDATE ... WHERE seats_taken < capacity, which rechecks
+    the condition on the latest row version when concurrent subscribers wait on the same training,
+    so a training is never oversubscribed. Returns (available, seated, subscribed), the caller rolls
+    back unless all three are true.
+    """
+    moved = available_training_delete(user_id, training_id).cte("moved")
+    seat = update(
+        Training
+    ).where(
+        tuple_(Training.id, Training.time_start).in_(select(moved.c.training_id, moved.c.training_time_start)),
+        or_(Training.capacity.is_(None), Training.seats_taken < Training.capacity),
+        # a freed seat goes to the waitlist first, promote_waitlisted_statement() takes it
+        ~exists().where(WaitlistEntry.training_id == Training.id)
+    ).values(
+        seats_taken=Training.seats_taken + 1
+    ).returning(
+        Training.id, Training.time_start
+    ).cte("seat")
+    subscribed = pg_insert(
+        Subscription
+    ).from_select(
+        ["student_id", "training_id", "training_time_start"], select(literal(user_id, Integer), seat.c.id, seat.c.time_start)
+    ).on_conflict_do_nothing(
+        index_elements=["student_id", "training_id", "training_time_start"]
+    ).returning(
+        Subscription.training_id
+    ).cte("subscribed")
+    return select(
+        exists(select(moved.c.training_id)).label("available"),
+        exists(select(seat.c.id)).label("seated"),
+        exists(select(subscribed.c.training_id)).label("subscribed")
+    )
+
+def unsubscribe_statement(user_id: int, training_id: int):
+    """Move a training from the subscriptions of a user back to its available trainings, freeing its seat.
+
+    A single statement, returns the id of the training and whether students wait for its seats, or
+    nothing when the user was not subscribed.
+    """
+    removed = delete(
+        Subscription
+    ).where(
+        and_(
+            Subscription.training_id == training_id,
+            Subscription.student_id == user_id
+        )
+    ).returning(
+        Subscription.training_id, Subscription.training_time_start
+    ).cte("removed")
+    freed = update(
+        Training
+    ).where(
+        tuple_(Training.id, Training.time_start).in_(select(removed.c.training_id, removed.c.training_time_start))
+    ).values(
+        seats_taken=Training.seats_taken - 1
+    ).returning(
+        Training.id
+    ).cte("freed")
+    restored = pg_insert(
+        AvailableTraining
+    ).from_select(
+        ["user_id", "training_id", "training_time_start"],
+        select(literal(user_id, Integer), removed.c.training_id, removed.c.training_time_start)
+    ).on_conflict_do_nothing(
+        index_elements=["user_id", "training_id", "training_time_start"]
+    ).returning(
+        AvailableTraining.training_id
+    ).cte("restored")
+    # the data-modifying CTEs not read by the main query are only rendered when added explicitly
+    return select(
+        removed.c.training_id,
+        exists().where(WaitlistEntry.training_id == removed.c.training_id).label("waitlisted")
+    ).add_cte(freed, restored)
+
+def subscribe_many_statement(user_id: int, training_ids: Sequence[int]):
+    """Set-based subscribe_statement() over a list of trainings, one row per requested id.
+
+    The available rows of the user are locked first, so a concurrent request of the same user can't
+    take a seat for a row it did not delete, and the trainings are locked in id order before their
+    seats are taken, so batches sharing trainings don't deadlock. The requested trainings that are
+    full or not available are left untouched. Returns (id, available, subscribed).
+    """
+    ids = bindparam("training_ids", list(training_ids), type_=ARRAY(Integer))
+    locked = select(
+        AvailableTraining.training_id, AvailableTraining.training_time_start
+    ).where(
+        AvailableTraining.user_id == user_id,
+        AvailableTraining.training_id == any_(ids)
+    ).with_for_update().cte("locked")
+    open_trainings = select(
+        Training.id, Training.time_start
+    ).where(
+        tuple_(Training.id, Training.time_start).in_(select(locked.c.training_id, locked.c.training_time_start)),
+        or_(Training.capacity.is_(None), Training.seats_taken < Training.capacity),
+        ~exists().where(WaitlistEntry.training_id == Training.id)
+    ).order_by(
+        Training.id
+    ).with_for_update().cte("open_trainings")
+    seat = update(
+        Training
+    ).where(
+        tuple_(Training.id, Training.time_start).in_(select(open_trainings.c.id, open_trainings.c.time_start))
+    ).values(
+        seats_taken=Training.seats_taken + 1
+    ).returning(
+        Training.id, Training.time_start
+    ).cte("seat")
+    moved = delete(
+        AvailableTraining
+    ).where(
+        AvailableTraining.user_id == user_id,
+        tuple_(AvailableTraining.training_id, AvailableTraining.training_time_start).in_(select(seat.c.id, seat.c.time_start))
+    ).returning(
+        AvailableTraining.training_id, AvailableTraining.training_time_start
+    ).cte("moved")
+    subscribed = pg_insert(
+        Subscription
+    ).from_select(
+        ["student_id", "training_id", "training_time_start"],
+        select(literal(user_id, Integer), moved.c.training_id, moved.c.training_time_start)
+    ).on_conflict_do_nothing(
+        index_elements=["student_id", "training_id", "training_time_start"]
+    ).returning(
+        Subscription.training_id
+    ).cte("subscribed")
+    requested = func.unnest(ids).table_valued("id").render_derived("requested")
+    return select(
+        requested.c.id,
+        requested.c.id.in_(select(locked.c.training_id)).label("available"),
+        requested.c.id.in_(select(subscribed.c.training_id)).label("subscribed")
+    )
+
+def unsubscribe_many_statement(user_id: int, training_ids: Sequence[int]):
+    """Set-based unsubscribe_statement() over a list of trainings, one row per requested id.
+
+    Returns (id, unsubscribed, waitlisted), the trainings are locked in id order as in
+    subscribe_many_statement().
+    """
+    ids = bindparam("training_ids", list(training_ids), type_=ARRAY(Integer))
+    removed = delete(
+        Subscription
+    ).where(
+        Subscription.student_id == user_id,
+        Subscription.training_id == any_(ids)
+    ).returning(
+        Subscription.training_id, Subscription.training_time_start
+    ).cte("removed")
+    locked = select(
+        Training.id, Training.time_start
+    ).where(
+        tuple_(Training.id, Training.time_start).in_(select(removed.c.training_id, removed.c.training_time_start))
+    ).order_by(
+        Training.id
+    ).with_for_update().cte("locked")
+    freed = update(
+        Training
+    ).where(
+        tuple_(Training.id, Training.time_start).in_(select(locked.c.id, locked.c.time_start))
+    ).values(
+        seats_taken=Training.seats_taken - 1
+    ).returning(
+        Training.id
+    ).cte("freed")
+    restored = pg_insert(
+        AvailableTraining
+    ).from_select(
+        ["user_id", "training_id", "training_time_start"],
+        select(literal(user_id, Integer), removed.c.training_id, removed.c.training_time_start)
+    ).on_conflict_do_nothing(
+        index_elements=["user_id", "training_id", "training_time_start"]
+    ).returning(
+        AvailableTraining.training_id
+    ).cte("restored")
+    requested = func.unnest(ids).table_valued("id").render_derived("requested")
+    return select(
+        requested.c.id,
+        requested.c.id.in_(select(removed.c.training_id)).label("unsubscribed"),
+        exists().where(WaitlistEntry.training_id == requested.c.id).label("waitlisted")
+    ).add_cte(freed, restored)
+
+def waitlist_position():
+    """Position of the waitlist entries of a user, 1 for the next student to be promoted."""
+    ahead = aliased(WaitlistEntry)
+    return select(
+        func.count()
+    ).where(
+        ahead.training_id == WaitlistEntry.training_id,
+        ahead.id <= WaitlistEntry.id
+    ).scalar_subquery().label("position")
+
+def promote_waitlisted_statement(batch_size: int):
+    """Subscribe the head of the waitlists of up to batch_size trainings with free seats.
+
+    The trainings are claimed with FOR UPDATE SKIP LOCKED, so concurrent workers promote for
+    different trainings and a subscriber waits for the promotion of the training it targets. The
+    promoted entries are deleted in the same statement, running it again promotes nobody twice.
+    The started trainings are left, their waitlists are deleted by RetentionService, and so are the
+    students the training no longer targets since they joined (their availability was re-targeted).
+    Returns the (student_id, training_id) of the new subscriptions.
+    """
+    claimed = select(
+        Training.id,
+        func.coalesce(Training.capacity - Training.seats_taken, batch_size).label("free")
+    ).where(
+        Training.time_start > func.now(),
+        or_(Training.capacity.is_(None), Training.seats_taken < Training.capacity),
+        exists().where(WaitlistEntry.training_id == Training.id)
+    ).order_by(
+        Training.id
+    ).limit(
+        batch_size
+    ).with_for_update(
+        skip_locked=True
+    ).cte("claimed")
+    ranked = select(
+        WaitlistEntry.id,
+        WaitlistEntry.training_id,
+        func.row_number().over(partition_by=WaitlistEntry.training_id, order_by=WaitlistEntry.id).label("rank")
+    ).where(
+        WaitlistEntry.training_id.in_(select(claimed.c.id)),
+        exists().where(
+            AvailableTraining.user_id == WaitlistEntry.student_id,
+            AvailableTraining.training_id == WaitlistEntry.training_id,
+            AvailableTraining.training_time_start == WaitlistEntry.training_time_start
+        )
+    ).subquery()
+    promoted = delete(
+        WaitlistEntry
+    ).where(
+        WaitlistEntry.id.in_(
+            select(ranked.c.id).join(claimed, claimed.c.id == ranked.c.training_id).where(ranked.c.rank <= claimed.c.free)
+        )
+    ).returning(
+        WaitlistEntry.student_id, WaitlistEntry.training_id, WaitlistEntry.training_time_start
+    ).cte("promoted")
+    subscribed = pg_insert(
+        Subscription
+    ).from_select(
+        ["student_id", "training_id", "training_time_start"],
+        select(promoted.c.student_id, promoted.c.training_id, promoted.c.training_time_start)
+    ).on_conflict_do_nothing(
+        index_elements=["student_id", "training_id", "training_time_start"]
+    ).returning(
+        Subscription.student_id, Subscription.training_id, Subscription.training_time_start
+    ).cte("subscribed")
+    unavailable = delete(
+        AvailableTraining
+    ).where(
+        AvailableTraining.user_id == subscribed.c.student_id,
+        AvailableTraining.training_id == subscribed.c.training_id,
+        AvailableTraining.training_time_start == subscribed.c.training_time_start
+    ).returning(
+        AvailableTraining.training_id
+    ).cte("unavailable")
+    taken = select(
+        subscribed.c.training_id, subscribed.c.training_time_start, func.count().label("taken")
+    ).group_by(
+        subscribed.c.training_id, subscribed.c.training_time_start
+    ).subquery()
+    seated = update(
+        Training
+    ).where(
+        training_key(taken.c.training_id, taken.c.training_time_start)
+    ).values(
+        seats_taken=Training.seats_taken + taken.c.taken
+    ).returning(
+        Training.id
+    ).cte("seated")
+    return select(subscribed.c.student_id, subscribed.c.training_id).add_cte(unavailable, seated)
+
+
+def check_partitioned(starts: Sequence[datetime]) -> None:
+    """Refuse trainings starting after the months partitioned ahead, see db.partitions.
+
+    Their rows would land in the DEFAULT partitions, and their month could no longer be given its own partitions.
+    """
+    until = partitioned_until(date.today(), settings.PARTITION_MONTHS_AHEAD)
+    if any(start.date() >= until for start in starts):
+        raise BusinessRulesValidationError(f"Trainings can't start after {add_months(until, -1):%Y-%m}")
+
+
+def create_trainings_statement(trainings: Sequence[TrainingAddDTO]):
+    """Insert trainings and their fan-out to available_trainings in one statement.
+
+    The audience of the group trainings is selected once per targeting tuple (discipline, auditory,
+    gender, user type) of the new trainings, a season repeating a few slots a week selects a few
+    audiences for hundreds of trainings. Returns the new trainings.
+    """
+    new = pg_insert(
+        Training
+    ).values(
+        [training.model_dump() for training in trainings]
+    ).returning(
+        *Training.__table__.c
+    ).cte("new")
+    targets = select(
+        new.c.discipline, new.c.target_auditory, new.c.target_gender, new.c.target_usertype
+    ).where(
+        new.c.type == TrainingType.GROUP
+    ).distinct().cte("targets")
+    audience = select(
+        targets, User.id.label("user_id")
+    ).join(
+        Interest, Interest.discipline == targets.c.discipline
+    ).join(
+        User, User.id == Interest.user_id
+    ).where(
+        User.role == Role.STUDENT,
+        *audience_filters(targets.c, User.age_type, User.gender, User.user_type)
+    ).cte("audience")
+    group_rows = select(
+        audience.c.user_id, new.c.id, new.c.time_start
+    ).join(
+        new, and_(
+            new.c.type == TrainingType.GROUP,
+            new.c.discipline == audience.c.discipline,
+            new.c.target_auditory.is_not_distinct_from(audience.c.target_auditory),
+            new.c.target_gender.is_not_distinct_from(audience.c.target_gender),
+            new.c.target_usertype.is_not_distinct_from(audience.c.target_usertype)
+        )
+    )
+    individual_rows = select(new.c.individual_for_id, new.c.id, new.c.time_start).where(new.c.type == TrainingType.INDIVIDUAL)
+    fanout = pg_insert(
+        AvailableTraining
+    ).from_select(
+        ["user_id", "training_id", "training_time_start"], group_rows.union_all(individual_rows)
+    ).on_conflict_do_nothing(
+        index_elements=["user_id", "training_id", "training_time_start"]
+    ).cte("fanout")
+    return select(new).add_cte(fanout).order_by(new.c.time_start, new.c.id)
+
+
+def retarget_statement(users):
+    """Bring the availability of the upcoming group trainings of users in line with their profile and interests.
+
+    users has the id, role, age_type, gender and user_type of the users, read after their change in
+    the same transaction. Only the difference is written: the rows of the trainings they are no
+    longer targeted by are deleted, the rows of the trainings they are targeted by now are inserted.
+    The subscriptions are not touched, a subscribed training isn't made available again. Returns
+    (removed, added), the numbers of rows.
+    """
+    upcoming_group = and_(Training.type == TrainingType.GROUP, Training.time_start >= func.now())
+    students = select(users.c.id).where(users.c.role == Role.STUDENT)
+    target = select(
+        users.c.id.label("user_id"), Training.id.label("training_id"), Training.time_start.label("training_time_start")
+    ).join(
+        Interest, Interest.user_id == users.c.id
+    ).join(
+        Training, and_(
+            Training.discipline == Interest.discipline,
+            upcoming_group,
+            *audience_filters(Training, users.c.age_type, users.c.gender, users.c.user_type)
+        )
+    ).where(
+        users.c.role == Role.STUDENT,
+        ~exists().where(Subscription.student_id == users.c.id, Subscription.training_id == Training.id)
+    ).cte("target")
+    removed = delete(
+        AvailableTraining
+    ).where(
+        AvailableTraining.user_id.in_(students),
+        training_key(AvailableTraining.training_id, AvailableTraining.training_time_start),
+        upcoming_group,
+        tuple_(AvailableTraining.user_id, AvailableTraining.training_id).not_in(select(target.c.user_id, target.c.training_id))
+    ).returning(
+        AvailableTraining.user_id
+    ).cte("removed")
+    added = pg_insert(
+        AvailableTraining
+    ).from_select(
+        ["user_id", "training_id", "training_time_start"], select(target)
+    ).on_conflict_do_nothing(
+        index_elements=["user_id", "training_id", "training_time_start"]
+    ).returning(
+        AvailableTraining.user_id
+    ).cte("added")
+    return select(
+        select(func.count()).select_from(removed).scalar_subquery().label("removed"),
+        select(func.count()).select_from(added).scalar_subquery().label("added")
+    )
+
+
+def coach_trainings_filters(coach_id: int, selection: TrainingsSelectionDTO) -> List[Any]:
+    """WHERE clauses of the trainings of a coach a bulk operation applies to, the ownership check included."""
+    filters = [Training.coach_id == coach_id, *day_window(Training.time_start, selection.date_start, selection.date_end)]
+    if selection.discipline is not None:
+        filters.append(Training.discipline == selection.discipline)
+    if selection.title is not None:
+        filters.append(Training.title == selection.title)
+    if selection.training_ids is not None:
+        filters.append(Training.id == any_(bindparam("training_ids", selection.training_ids, type_=ARRAY(Integer))))
+    return filters
+
+def shift_trainings_statement(coach_id: int, selection: TrainingsSelectionDTO, minutes: int):
+    """Move the selected trainings of a coach by a number of minutes, returns them.
+
+    The targeting does not change, the subscriptions and the available trainings stay as they are.
+    """
+    shift = timedelta(minutes=minutes)
+    return update(
+        Training
+    ).where(
+        *coach_trainings_filters(coach_id, selection)
+    ).values(
+        time_start=Training.time_start + shift,
+        time_end=Training.time_end + shift
+    ).returning(
+        *Training.__table__.c
+    )
+
+def cancel_trainings_statement(coach_id: int, selection: TrainingsSelectionDTO):
+    """Delete the selected trainings of a coach, returns their ids.
+
+    Their subscriptions, available trainings and waitlists go with them (ON DELETE CASCADE).
+    """
+    return delete(
+        Training
+    ).where(
+        *coach_trainings_filters(coach_id, selection)
+    ).returning(
+        Training.id
+    )
+
+
+def idempotency_claim_statement(owner: bytes, key: str, fingerprint: bytes):
+    """Claim an idempotency key for a request about to run.
+
+    An expired key, or the claim of a request that never completed, is taken over. Returns no row
+    when the key is held: its stored response, or the request still running, is then looked up.
+    """
+    statement = pg_insert(IdempotencyKey).values(owner=owner, key=key, fingerprint=fingerprint)
+    return statement.on_conflict_do_update(
+        index_elements=["owner", "key"],
+        set_={
+            "fingerprint": statement.excluded.fingerprint,
+            "status_code": None,
+            "content_type": None,
+            "body": None,
+            "created_at": func.now()
+        },
+        where=or_(
+            IdempotencyKey.created_at < func.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+            and_(
+                IdempotencyKey.status_code.is_(None),
+                IdempotencyKey.created_at < func.now() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+            )
+        )
+    ).returning(IdempotencyKey.key)
+
+
+# a bind parameter per column and row, asyncpg refuses statements with more than 32767
+MAX_INSERT_ROWS = 32767 // 3
+
+
+async def insert_available_trainings(session: AsyncSession, rows: Sequence[Dict[str, Any]]) -> None:
+    """Write the fan-out of a training to available_trainings, skipping the pairs already there.
+
+    Up to settings.DB_COPY_THRESHOLD rows this is a multi-row INSERT ... ON CONFLICT DO NOTHING.
+    Above it the rows are copied into a temporary table with the COPY protocol and merged with a
+    single INSERT ... SELECT, the temporary table is dropped with the transaction.
+    """
+    if not rows:
+        return
+
+    if len(rows) <= settings.DB_COPY_THRESHOLD:
+        for start in range(0, len(rows), MAX_INSERT_ROWS):
+            await session.execute(
+                pg_insert(AvailableTraining).values(
+                    rows[start:start + MAX_INSERT_ROWS]
+                ).on_conflict_do_nothing(
+                    index_elements=["user_id", "training_id", "training_time_start"]
+                )
+            )
+        return
+
+    # the staging table is bookkeeping, like SET LOCAL it does not count against the query budget
+    await session.execute(text(
+        "CREATE TEMPORARY TABLE available_trainings_staging "
+        "(user_id integer, training_id integer, training_time_start timestamp with time zone) ON COMMIT DROP"
+    ), execution_options={INTERNAL_STATEMENT: True})
+    connection = await (await session.connection()).get_raw_connection()
+    await connection.driver_connection.copy_records_to_table(
+        "available_trainings_staging",
+        records=[(row["user_id"], row["training_id"], row["training_time_start"]) for row in rows],
+        columns=("user_id", "training_id", "training_time_start")
+    )
+    await session.execute(text(
+        "INSERT INTO available_trainings (user_id, training_id, training_time_start) "
+        "SELECT user_id, training_id, training_time_start FROM available_trainings_staging "
+        "ON CONFLICT (user_id, training_id, training_time_start) DO NOTHING"
+    ))
+    # a second fan-out in the same transaction creates it again
+    await session.execute(text("DROP TABLE available_trainings_staging"), execution_options={INTERNAL_STATEMENT: True})
+
+
+def warm_up_statements() -> List[Any]:
+    """The hot statements of the services, with ids that match no row, 0 is never assigned by the id sequences."""
+    today = date.today()
+    return [
+        user_by_email_query(""),
+        # /available_trainings/ without and with its window
+        available_trainings_window_query(0, None, None),
+        available_trainings_window_query(0, today, today),
+        subscribe_statement(0, 0),
+        unsubscribe_statement(0, 0)
+    ]
+
+
+async def warm_up_engine(engine: AsyncEngine, prepare: bool = True) -> None:
+    """Open pool_size connections and prepare the hot statements on each of them.
+
+    asyncpg prepares a statement per connection, the warm-up runs every hot statement once, built as
+    the services build it, with ids that match no row, in transactions that are rolled back. Without
+    prepare the connections are only opened, as nothing is cached in PgBouncer mode.
+    """
+    statements = warm_up_statements()
+
+    async def warm_up(connection: AsyncConnection) -> None:
+        if not prepare:
+            return
+        async with AsyncSession(bind=connection) as session:
+            for statement in statements:
+                await session.execute(statement)
+                await session.rollback()
+
+    connections = await asyncio.gather(*(engine.connect() for _ in range(engine.pool.size())))
+    try:
+        await asyncio.gather(*(warm_up(connection) for connection in connections))
+    finally:
+        await asyncio.gather(*(connection.close() for connection in connections))
 
-async_session_factory = async_sessionmaker(bind=async_engine)
 
 class ORMBase(): 
     @staticmethod
@@ -34,14 +705,14 @@ class ORMBase():
         if session is None:
             async with async_session_factory() as session:
                 result = await session.execute(select(User))
-                return [UserDTO.model_validate(user, from_attributes=True) for user in result.scalars().all()]
+                return dtos_from_orm(UserDTO, result.scalars().all())
         else:
             result = await session.execute(
                 select(
                     User
                 )
             )
-            return [UserDTO.model_validate(user, from_attributes=True) for user in result.scalars().all()]
+            return dtos_from_orm(UserDTO, result.scalars().all())
         
     @staticmethod
     async def get_all_trainings(session: AsyncSession | None = None) -> List[TrainingDTO]:
@@ -52,7 +723,7 @@ class ORMBase():
                 )
 
                 result = await session.execute(query)
-                return [TrainingDTO.model_validate(training, from_attributes=True) for training in result.scalars().all()]
+                return dtos_from_orm(TrainingDTO, result.scalars().all())
             
         else:
             result = await session.execute(
@@ -60,7 +731,7 @@ class ORMBase():
                     Training
                 )
             )
-            return [TrainingDTO.model_validate(training, from_attributes=True) for training in result.scalars().all()]
+            return dtos_from_orm(TrainingDTO, result.scalars().all())
         
     @staticmethod 
     async def get_user_by_id(id: int, session: AsyncSession | None = None) -> UserDTO | None:   # throws MultipleResultsFound
@@ -88,23 +759,11 @@ class ORMBase():
     async def get_user_by_email(email: str, session: AsyncSession | None = None) -> UserDTO | None: # throws MultipleResultsFound
         if session is None:
             async with async_session_factory() as session:
-                query = select(
-                    User
-                ).where(
-                    User.email == email
-                )
-
-                result = await session.execute(query)
+                result = await session.execute(user_by_email_query(email))
                 return UserDTO.model_validate(result.scalar_one_or_none(), from_attributes=True)
         
         else:
-            result = await session.execute(
-                select(
-                    User
-                ).where(
-                    User.email == email
-                )
-            )
+            result = await session.execute(user_by_email_query(email))
             return UserDTO.model_validate(result.scalar_one_or_none(), from_attributes=True)
         
     @staticmethod
@@ -118,7 +777,7 @@ class ORMBase():
                 )
 
                 result = await session.execute(query)
-                return [UserDTO.model_validate(user, from_attributes=True) for user in result.scalars().all()]
+                return dtos_from_orm(UserDTO, result.scalars().all())
         else:
             result = await session.execute(
                 select(
@@ -127,7 +786,7 @@ class ORMBase():
                     User.role == role
                 )
             )
-            return [UserDTO.model_validate(user, from_attributes=True) for user in result.scalars().all()]
+            return dtos_from_orm(UserDTO, result.scalars().all())
         
     @staticmethod
     async def user_exists(name: str, email: str, session: AsyncSession | None = None) -> bool:
@@ -233,11 +892,11 @@ class ORMBase():
         if session is None:
             async with async_session_factory() as session:
                 result = await session.execute(query)
-                return [TrainingDTO.model_validate(training, from_attributes=True) for training in result.scalars().all()]
+                return dtos_from_orm(TrainingDTO, result.scalars().all())
             
         else:
             result = await session.execute(query)
-            return [TrainingDTO.model_validate(training, from_attributes=True) for training in result.scalars().all()]
+            return dtos_from_orm(TrainingDTO, result.scalars().all())
 
     @staticmethod
     async def training_exists(session: AsyncSession | None = None, **kwargs) -> bool:
@@ -322,10 +981,16 @@ class ClientService():
             )
 
             result = await session.execute(query)
-            return [TrainingDTO.model_validate(training, from_attributes=True) for training in result.scalar_one_or_none().subs]
+            return dtos_from_orm(TrainingDTO, result.scalar_one_or_none().subs)
         
-    async def show_available_trainings(self, session: AsyncSession | None = None, **kwargs) -> List[TrainingDTO]:
-        """Show available trainigs for the user by filtering with kwargs."""
+    async def show_available_trainings(
+        self, session: AsyncSession | None = None, date_start: date | None = None, date_end: date | None = None, **kwargs
+    ) -> List[TrainingDTO]:
+        """Show available trainigs for the user by filtering with kwargs.
+
+        The window from date_start to date_end is applied to both sides of the join, only the
+        partitions of its months are read.
+        """
         filters = []
 
         filter_map = {
@@ -335,7 +1000,7 @@ class ClientService():
             'time_end': Training.time_end,
             'type': Training.type,
             'discipline': Training.discipline,
-            'coach_id': User.id,
+            'coach_id': Training.coach_id,
             "individual_for_id": Training.individual_for_id,
             "target_auditory": Training.target_auditory,
             "target_gender": Training.target_gender
@@ -346,63 +1011,36 @@ class ClientService():
             if column is not None and value is not None:
                 filters.append(column == value)
 
-        query = select(
-                Training
-            ).join(
-                User.avilable
-            ).where(
-                User.id == self.user.id, *filters
-            )
+        query = available_trainings_window_query(self.user.id, date_start, date_end, *filters)
         
         if session is None:
             async with async_session_factory() as session:
                 result = await session.execute(query)
-                return [TrainingDTO.model_validate(training, from_attributes=True) for training in result.scalars().all()]
+                return dtos_from_orm(TrainingDTO, result.scalars().all())
             
         else:
             result = await session.execute(query)
-            return [TrainingDTO.model_validate(training, from_attributes=True) for training in result.scalars().all()]
+            return dtos_from_orm(TrainingDTO, result.scalars().all())
         
 
     async def subscribe_to_training(self, training_id: int) -> SubscriptionDTO:
         async with async_session_factory() as session:
             try:
-
-                if not await self.available_training_exists(training_id, session):
+                # nothing is moved if the user is not available for the training, no seat is taken if it is full
+                result = (await session.execute(subscribe_statement(self.user.id, training_id))).one()
+                if not result.available:
                     raise ValueError("You are not available for this training")
-                
-                subscription_data = SubscriptionDTO(
-                    user_id=self.user.id,
-                    training_id=training_id
-                )
-
-                insert_stmt = pg_insert(
-                    Subscription
-                ).values(
-                    student_id=subscription_data.user_id,
-                    training_id=subscription_data.training_id
-                ).on_conflict_do_nothing(
-                    index_elements=['student_id', 'training_id']
-                )
-
-                delete_stmt = delete(
-                    AvailableTraining
-                ).where(
-                    AvailableTraining.user_id == self.user.id,
-                    AvailableTraining.training_id == training_id
-                )
-
-                # delete the training from available trainings
-                await session.execute(
-                    insert_stmt
-                )
-                await session.execute(
-                    delete_stmt
-                )
+                if not result.seated:
+                    raise TrainingIsFullError(f"No seat of the training with id={training_id} is free, join its waitlist")
+                if not result.subscribed:
+                    raise ValueError("You are already subscribed to this training")
 
                 await session.commit()
 
-                return subscription_data
+                return SubscriptionDTO(
+                    user_id=self.user.id,
+                    training_id=training_id
+                )
 
             except Exception as ex:
                 await session.rollback()
@@ -410,40 +1048,125 @@ class ClientService():
             
     async def unsubscribe_from_training(self, training_id: int) -> SubscriptionDTO:
         async with async_session_factory() as session:
-            subscription_exists = await ORMBase.subscription_exists(session=session, user_id=self.user.id, training_id=training_id)
-            
-            if not subscription_exists:
-                raise ValueError(f"Training with id={training_id} was not found in your subscriptions")
-            
             subscription_dto = SubscriptionDTO(
                 user_id = self.user.id,
                 training_id=training_id
             )
             
-            query = delete(
-                Subscription
-            ).where(
-                and_(
-                    Subscription.training_id == subscription_dto.training_id,
-                    Subscription.student_id == subscription_dto.user_id
-                )
+            result = await session.execute(
+                unsubscribe_statement(subscription_dto.user_id, subscription_dto.training_id)
             )
+            removed = result.one_or_none()
+            if removed is None:
+                raise ValueError(f"Training with id={training_id} was not found in your subscriptions")
 
-            await session.execute(query)
-            available_training_insert_stmt = pg_insert(
-                AvailableTraining
-            ).values(
-                user_id = self.user.id,
-                training_id = training_id
-            ).on_conflict_do_nothing(
-                index_elements=["user_id", "training_id"]
+            await session.commit()
+            if removed.waitlisted:
+                notify_seat_freed(training_id)
+
+            return subscription_dto
+
+
+    async def subscribe_to_trainings(self, training_ids: Sequence[int]) -> List[SubscriptionResultDTO]:
+        """Subscribe to several trainings in one transaction, the result tells what happened to each of them."""
+        training_ids = list(dict.fromkeys(training_ids))
+        async with async_session_factory() as session:
+            result = await session.execute(subscribe_many_statement(self.user.id, training_ids))
+            rows = {row.id: row for row in result}
+            await session.commit()
+
+        return [
+            SubscriptionResultDTO(
+                training_id=training_id,
+                status=SubscriptionStatus.SUBSCRIBED if rows[training_id].subscribed
+                else SubscriptionStatus.FULL if rows[training_id].available
+                else SubscriptionStatus.NOT_AVAILABLE
             )
+            for training_id in training_ids
+        ]
 
-            await session.execute(available_training_insert_stmt)
+    async def unsubscribe_from_trainings(self, training_ids: Sequence[int]) -> List[SubscriptionResultDTO]:
+        """Unsubscribe from several trainings in one transaction, the result tells what happened to each of them."""
+        training_ids = list(dict.fromkeys(training_ids))
+        async with async_session_factory() as session:
+            result = await session.execute(unsubscribe_many_statement(self.user.id, training_ids))
+            rows = {row.id: row for row in result}
             await session.commit()
 
-            return subscription_dto
+        for training_id, row in rows.items():
+            if row.unsubscribed and row.waitlisted:
+                notify_seat_freed(training_id)
+        return [
+            SubscriptionResultDTO(
+                training_id=training_id,
+                status=SubscriptionStatus.UNSUBSCRIBED if rows[training_id].unsubscribed else SubscriptionStatus.NOT_SUBSCRIBED
+            )
+            for training_id in training_ids
+        ]
+
+    async def join_waitlist(self, training_id: int) -> WaitlistDTO:
+        async with async_session_factory() as session:
+            # only the students the training is available to can wait for it, joining twice keeps the first position
+            await session.execute(
+                pg_insert(
+                    WaitlistEntry
+                ).from_select(
+                    ["training_id", "training_time_start", "student_id"],
+                    select(AvailableTraining.training_id, AvailableTraining.training_time_start, AvailableTraining.user_id).where(
+                        AvailableTraining.user_id == self.user.id,
+                        AvailableTraining.training_id == training_id
+                    )
+                ).on_conflict_do_nothing(
+                    index_elements=["training_id", "student_id"]
+                )
+            )
+            result = await session.execute(
+                select(
+                    WaitlistEntry.training_id, waitlist_position()
+                ).where(
+                    WaitlistEntry.student_id == self.user.id,
+                    WaitlistEntry.training_id == training_id
+                )
+            )
+            entry = result.one_or_none()
+            if entry is None:
+                raise ValueError("You are not available for this training")
+            await session.commit()
+            # the training may have had a free seat already
+            notify_seat_freed(training_id)
+
+            return WaitlistDTO(user_id=self.user.id, training_id=entry.training_id, position=entry.position)
+
+    async def leave_waitlist(self, training_id: int) -> None:
+        async with async_session_factory() as session:
+            deleted = await session.execute(
+                delete(
+                    WaitlistEntry
+                ).where(
+                    WaitlistEntry.student_id == self.user.id,
+                    WaitlistEntry.training_id == training_id
+                ).returning(
+                    WaitlistEntry.id
+                )
+            )
+            if deleted.scalar_one_or_none() is None:
+                raise ValueError(f"You are not on the waitlist of the training with id={training_id}")
+            await session.commit()
 
+    async def show_my_waitlist(self) -> List[WaitlistDTO]:
+        async with async_session_factory() as session:
+            result = await session.execute(
+                select(
+                    WaitlistEntry.training_id, waitlist_position()
+                ).where(
+                    WaitlistEntry.student_id == self.user.id
+                ).order_by(
+                    WaitlistEntry.id
+                )
+            )
+            return [
+                WaitlistDTO(user_id=self.user.id, training_id=row.training_id, position=row.position) for row in result
+            ]
 
     async def available_training_exists(self, training_id: int, session: AsyncSession | None = None) -> bool:
         """Check if a user is available for a specific training."""
@@ -461,6 +1184,73 @@ class ClientService():
             result = await session.execute(query)
             return result.scalar()
 
+    async def update_profile(self, name: str | None = None, birth_date: date | None = None,
+                             gender: Gender | None = None, level: UserType | None = None) -> UserDTO:
+        """Update the profile of the user, the availability follows its new targeting in the same transaction.
+
+        Only the difference is applied to available_trainings, see retarget_statement(), the
+        subscriptions are not touched. Returns the updated user.
+        """
+        values = {}
+        if name is not None:
+            values["name"] = name
+        if birth_date is not None:
+            age = age_on(birth_date, date.today())
+            values.update(
+                birth_date=birth_date, age=age, age_type=age_type_of(age), age_type_until=next_age_type_change(birth_date, date.today())
+            )
+        if gender is not None:
+            values["gender"] = gender
+        if level is not None:
+            values["user_type"] = level
+
+        async with async_session_factory() as session:
+            user = (await session.execute(
+                update(User).where(User.id == self.user.id).values(**values).returning(User)
+            )).scalar_one()
+            updated = UserDTO.model_validate(user, from_attributes=True)
+            if (updated.age_type, updated.gender, updated.user_type) != (self.user.age_type, self.user.gender, self.user.user_type):
+                await self._retarget(session, "profile")
+            await session.commit()
+        self.user = updated
+        return updated
+
+    async def update_interests(self, add: Sequence[Discipline] = (), remove: Sequence[Discipline] = ()) -> List[Discipline]:
+        """Add and remove interests of the user, the availability follows in the same transaction.
+
+        Only the trainings of the added and removed disciplines change, see retarget_statement(),
+        the subscriptions are not touched. Returns the interests of the user.
+        """
+        async with async_session_factory() as session:
+            # concurrent updates of the same user are applied one after the other
+            await session.execute(select(User.id).where(User.id == self.user.id).with_for_update())
+            if remove:
+                await session.execute(
+                    delete(Interest).where(Interest.user_id == self.user.id, Interest.discipline.in_(remove))
+                )
+            if add:
+                await session.execute(
+                    pg_insert(Interest).values(
+                        [{"user_id": self.user.id, "discipline": discipline} for discipline in add]
+                    ).on_conflict_do_nothing(index_elements=["user_id", "discipline"])
+                )
+            await self._retarget(session, "interests")
+            interests = (await session.execute(
+                select(Interest.discipline).where(Interest.user_id == self.user.id).order_by(Interest.discipline)
+            )).scalars().all()
+            await session.commit()
+        return interests
+
+    async def _retarget(self, session: AsyncSession, cause: str) -> None:
+        users = select(
+            User.id, User.role, User.age_type, User.gender, User.user_type
+        ).where(
+            User.id == self.user.id
+        ).cte("users")
+        removed, added = (await session.execute(retarget_statement(users))).one()
+        AVAILABILITY_RETARGETED.inc(cause, "removed", amount=removed)
+        AVAILABILITY_RETARGETED.inc(cause, "added", amount=added)
+
     async def get_my_interests(self, session: AsyncSession | None = None) -> List[Discipline]:
         query = select(
                 User
@@ -497,7 +1287,8 @@ class CoachService():
         if training.type == TrainingType.INDIVIDUAL: 
             data.append({
                 "user_id": training.individual_for_id,
-                "training_id": training.id
+                "training_id": training.id,
+                "training_time_start": training.time_start
             })
                 
         # Case of group training
@@ -528,7 +1319,7 @@ class CoachService():
 
             user_ids = [row.id for row in result_query]
 
-            data.extend([{"user_id": uid, "training_id": training.id} for uid in user_ids])
+            data.extend([{"user_id": uid, "training_id": training.id, "training_time_start": training.time_start} for uid in user_ids])
 
         #return query.compile(dialect=postgresql.dialect()).string
         return data
@@ -569,7 +1360,8 @@ class CoachService():
                     and_(
                         cast(Training.time_start, Time).between(time_start_search, time_end_search),
                         cast(Training.time_end, Time).between(time_start_search, time_end_search),
-                        cast(Training.time_start, Date).between(date_start_search, date_end_search)
+                        # sargable, the partitions of the months out of the search are pruned
+                        *day_window(Training.time_start, date_start_search, date_end_search)
                     ),
                     Training.coach_id == self.user.id
                 )
@@ -577,9 +1369,10 @@ class CoachService():
 
             result = await session.execute(query)
 
-            return [TrainingDTO.model_validate(training, from_attributes=True) for training in result.scalars().all()]
+            return dtos_from_orm(TrainingDTO, result.scalars().all())
 
     async def create_training(self, training_data: TrainingAddDTO) -> TrainingAddDTO:
+        check_partitioned([training_data.time_start])
         async with async_session_factory() as session:
 
             training = Training(
@@ -593,21 +1386,44 @@ class CoachService():
                 individual_for_id=training_data.individual_for_id,
                 target_auditory=training_data.target_auditory,
                 target_gender=training_data.target_gender,
-                target_usertype=training_data.target_usertype
+                target_usertype=training_data.target_usertype,
+                capacity=training_data.capacity
             )
 
             session.add(training)
             await session.flush()
 
             target_users_data = await CoachService.calculate_target_users(session, TrainingDTO.model_validate(training, from_attributes=True))
-                    
-            if target_users_data:
-                stmt = pg_insert(AvailableTraining).values(target_users_data).on_conflict_do_nothing(index_elements=['user_id', 'training_id'])
-                await session.execute(stmt)
+            await insert_available_trainings(session, target_users_data)
             await session.commit()
 
             return training_data
             
+    async def create_trainings(self, trainings: Sequence[TrainingAddDTO]) -> List[TrainingDTO]:
+        """Create a season of trainings at once, see create_trainings_statement()."""
+        check_partitioned([training.time_start for training in trainings])
+        async with async_session_factory() as session:
+            result = await session.execute(create_trainings_statement(trainings))
+            created = dtos_from_orm(TrainingDTO, result.all())
+            await session.commit()
+            return created
+
+    async def shift_trainings(self, selection: TrainingsSelectionDTO, minutes: int) -> List[TrainingDTO]:
+        async with async_session_factory() as session:
+            result = await session.execute(shift_trainings_statement(self.user.id, selection, minutes))
+            shifted = dtos_from_orm(TrainingDTO, result.all())
+            # the session rolls the shift back when it is refused
+            check_partitioned([training.time_start for training in shifted])
+            await session.commit()
+            return shifted
+
+    async def cancel_trainings(self, selection: TrainingsSelectionDTO) -> List[int]:
+        async with async_session_factory() as session:
+            result = await session.execute(cancel_trainings_statement(self.user.id, selection))
+            cancelled = result.scalars().all()
+            await session.commit()
+            return cancelled
+
     async def update_training(self, training_id: int, **kwargs: Dict[str, Any]) -> TrainingDTO:
             async with async_session_factory() as session:
                 try:
@@ -620,6 +1436,9 @@ class CoachService():
 
                     if training.coach_id != self.user.id:
                         raise InvalidPermissionsError("You can't modify this training because you are not a coach of this training")
+
+                    if kwargs.get("capacity") is not None and kwargs["capacity"] < training.seats_taken:
+                        raise BusinessRulesValidationError(f"The capacity can't be lower than the {training.seats_taken} seats already taken")
                     
                     filter_params = {
                         "type": training.type,
@@ -634,6 +1453,7 @@ class CoachService():
                     updated_time_end = kwargs.get("time_end", training.time_end.time())
 
                     new_time_start = datetime.combine(updated_date, updated_time_start)
+                    check_partitioned([new_time_start])
                     kwargs["time_start"] = new_time_start
                     new_time_end = datetime.combine(updated_date, updated_time_end)
                     kwargs["time_end"] = new_time_end
@@ -664,14 +1484,19 @@ class CoachService():
 
                         # add new target users for this training
                         data_target_users = await self.calculate_target_users(session, training_dto)
-
-                        if data_target_users:
-                            stmt = pg_insert(AvailableTraining).values(data_target_users).on_conflict_do_nothing(index_elements=['user_id', 'training_id'])
-                            await session.execute(stmt)
+                        await insert_available_trainings(session, data_target_users)
 
                     await session.commit()
+                    if "capacity" in kwargs:
+                        notify_seat_freed(training_id)
                     return training_dto
 
+                except IntegrityError as ex:
+                    await session.rollback()
+                    # a subscription committed after the check of the capacity above
+                    if getattr(ex.orig, "sqlstate", None) == CHECK_VIOLATION and "training_seats_taken_check" in str(ex.orig):
+                        raise BusinessRulesValidationError("The capacity can't be lower than the seats already taken")
+                    raise ex
                 except Exception as ex:
                     await session.rollback()
                     raise ex
@@ -679,9 +1504,6 @@ class CoachService():
     async def get_students_of_training(self, training_id: int) -> List[UserDTO]:
         async with async_session_factory() as session:
             try:
-                training_exists = await ORMBase.training_exists(session=session, id=training_id)
-                if not training_exists:
-                    raise ValueError("Training not found")
                 query = select(
                     Training
                 ).options(
@@ -691,8 +1513,11 @@ class CoachService():
                 )
 
                 result = await session.execute(query)
+                training = result.scalar_one_or_none()
+                if training is None:
+                    raise ValueError("Training not found")
 
-                return [UserDTO.model_validate(user, from_attributes=True) for user in result.scalar_one_or_none().users_on_training]
+                return dtos_from_orm(UserDTO, training.users_on_training)
             except Exception as ex:
                 await session.rollback()
                 raise ex
@@ -718,39 +1543,329 @@ class CoachService():
         return self.user
 
 
+class WaitlistService():
+    @staticmethod
+    async def promote_waitlisted(batch_size: int) -> List[SubscriptionDTO]:
+        """Run one promotion batch, see promote_waitlisted_statement()."""
+        async with async_session_factory() as session:
+            result = await session.execute(promote_waitlisted_statement(batch_size))
+            promoted = [SubscriptionDTO(user_id=row.student_id, training_id=row.training_id) for row in result]
+            await session.commit()
+            return promoted
+
+
+class IdempotencyService():
+    """Storage of the responses replayed to the retries of the writes, see app.idempotency.
+
+    Its statements are bookkeeping: they do not count against the query budget of the routes.
+    """
+
+    @staticmethod
+    async def claim(owner: bytes, key: str, fingerprint: bytes) -> StoredResponseDTO | None:
+        """Claim the key for a new request, None when claimed, else what the key holds."""
+        async with async_session_factory() as session:
+            claimed = (await session.execute(
+                idempotency_claim_statement(owner, key, fingerprint), execution_options={INTERNAL_STATEMENT: True}
+            )).first()
+            if claimed is None:
+                stored = (await session.execute(
+                    select(
+                        IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.content_type, IdempotencyKey.body
+                    ).where(
+                        IdempotencyKey.owner == owner, IdempotencyKey.key == key
+                    ), execution_options={INTERNAL_STATEMENT: True}
+                )).first()
+            await session.commit()
+        if claimed is not None:
+            return None
+        # released between the two statements, the request is retried while another one ran
+        if stored is None:
+            return StoredResponseDTO(fingerprint=fingerprint)
+        return StoredResponseDTO.model_validate(stored, from_attributes=True)
+
+    @staticmethod
+    async def complete(owner: bytes, key: str, status_code: int, content_type: str | None, body: bytes) -> None:
+        async with async_session_factory() as session:
+            await session.execute(
+                update(IdempotencyKey).where(
+                    IdempotencyKey.owner == owner, IdempotencyKey.key == key
+                ).values(
+                    status_code=status_code, content_type=content_type, body=body
+                ), execution_options={INTERNAL_STATEMENT: True}
+            )
+            await session.commit()
+
+    @staticmethod
+    async def release(owner: bytes, key: str) -> None:
+        """Drop the claim of a request that failed, its retries run it again."""
+        async with async_session_factory() as session:
+            await session.execute(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.owner == owner, IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+                ), execution_options={INTERNAL_STATEMENT: True}
+            )
+            await session.commit()
+
+    @staticmethod
+    async def delete_expired(batch_size: int = 10000) -> int:
+        """Delete the keys older than IDEMPOTENCY_TTL_SECONDS by batches, returns the number of deleted keys."""
+        deleted = 0
+        while True:
+            async with async_session_factory() as session:
+                expired = select(
+                    IdempotencyKey.owner, IdempotencyKey.key
+                ).where(
+                    IdempotencyKey.created_at < func.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+                ).limit(
+                    batch_size
+                )
+                result = await session.execute(
+                    delete(IdempotencyKey).where(
+                        tuple_(IdempotencyKey.owner, IdempotencyKey.key).in_(expired)
+                    ), execution_options={INTERNAL_STATEMENT: True}
+                )
+                await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
+
+
+
+class PartitionService():
+    @staticmethod
+    async def create_month_partitions(month: date) -> bool:
+        """Create the partitions of a month in the partitioned tables, see db.partitions.
+
+        Returns False when they already exist. Creating a partition locks its table, the statements
+        give up after a lock_timeout rather than queueing the requests behind them.
+        """
+        async with async_session_factory() as session:
+            exists_already = (await session.execute(
+                select(func.to_regclass(partition_name("trainings", month)).is_not(None)),
+                execution_options={INTERNAL_STATEMENT: True}
+            )).scalar()
+            if exists_already:
+                return False
+            await session.execute(text("SET LOCAL lock_timeout = '5s'"), execution_options={INTERNAL_STATEMENT: True})
+            for statement in create_partition_statements(month):
+                await session.execute(text(statement), execution_options={INTERNAL_STATEMENT: True})
+            await session.commit()
+            return True
+
+class RetentionService():
+    """Removal of the rows of the past trainings, run by RetentionWorker (app.workers).
+
+    Nobody reads the availability of a training once it has started: the partitions of
+    available_trainings of the past months are dropped, the rows of the current month and of the
+    DEFAULT partition are deleted by batches, and so are the waitlists. The subscriptions of the trainings older than
+    SUBSCRIPTIONS_ARCHIVE_AFTER_DAYS are moved to subscription_history by batches.
+    """
+
+    @staticmethod
+    async def past_availability_partitions(before: date) -> List[str]:
+        """The monthly partitions of available_trainings of the months before the month of before, oldest first."""
+        async with async_session_factory() as session:
+            partitions = (await session.execute(
+                text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'available_trainings'::regclass"),
+                execution_options={INTERNAL_STATEMENT: True}
+            )).scalars().all()
+        months = {partition: partition_month(partition) for partition in partitions}
+        return sorted(
+            partition for partition, month in months.items() if month is not None and month < month_start(before)
+        )
+
+    @staticmethod
+    async def drop_availability_partition(partition: str) -> int:
+        """Drop a partition of available_trainings, returns the number of rows it held as estimated by the statistics.
+
+        A dropped partition gives its space back at once, deleted rows leave the table and its indexes
+        to VACUUM. The DROP takes an ACCESS EXCLUSIVE lock on available_trainings, and the requests
+        arriving while it waits for the lock queue behind it (DETACH PARTITION CONCURRENTLY would avoid
+        it but is refused while the table has a DEFAULT partition). It waits RETENTION_LOCK_TIMEOUT_MS
+        at most, far below the deadlines of the requests, and is retried after a pause up to
+        RETENTION_LOCK_ATTEMPTS times before the LockNotAvailable error is raised. Once granted, the
+        lock is held for the catalog change only.
+        """
+        for attempt in range(1, settings.RETENTION_LOCK_ATTEMPTS + 1):
+            try:
+                async with async_session_factory() as session:
+                    rows = (await session.execute(
+                        text("SELECT greatest(reltuples, 0)::bigint FROM pg_class WHERE oid = CAST(:partition AS regclass)"),
+                        {"partition": partition}, execution_options={INTERNAL_STATEMENT: True}
+                    )).scalar()
+                    await session.execute(
+                        text(f"SET LOCAL lock_timeout = '{int(settings.RETENTION_LOCK_TIMEOUT_MS)}ms'"),
+                        execution_options={INTERNAL_STATEMENT: True}
+                    )
+                    await session.execute(text(f"DROP TABLE {partition}"), execution_options={INTERNAL_STATEMENT: True})
+                    await session.commit()
+                return rows
+            except DBAPIError as exc:
+                if getattr(exc.orig, "sqlstate", None) != LOCK_NOT_AVAILABLE or attempt == settings.RETENTION_LOCK_ATTEMPTS:
+                    raise
+            await asyncio.sleep(attempt)
+
+    @staticmethod
+    async def delete_past_availability(batch_size: int) -> int:
+        """Delete the availability of the trainings already started by batches, returns the number of deleted rows."""
+        async with async_session_factory() as session:
+            started = (await session.execute(
+                select(Training.id).where(
+                    Training.time_start < func.now(),
+                    exists().where(training_key(AvailableTraining.training_id, AvailableTraining.training_time_start))
+                ), execution_options={INTERNAL_STATEMENT: True}
+            )).scalars().all()
+        if not started:
+            return 0
+
+        # found through available_trainings_training_id_index, the time_start rechecks a training moved since
+        ids = bindparam("training_ids", started, type_=ARRAY(Integer))
+        deleted = 0
+        while True:
+            async with async_session_factory() as session:
+                past = select(
+                    AvailableTraining.user_id, AvailableTraining.training_id, AvailableTraining.training_time_start
+                ).where(
+                    AvailableTraining.training_id == any_(ids),
+                    AvailableTraining.training_time_start < func.now()
+                ).limit(
+                    batch_size
+                )
+                result = await session.execute(
+                    delete(AvailableTraining).where(
+                        tuple_(AvailableTraining.user_id, AvailableTraining.training_id, AvailableTraining.training_time_start).in_(past)
+                    ), execution_options={INTERNAL_STATEMENT: True}
+                )
+                await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
+
+    @staticmethod
+    async def delete_started_waitlists(batch_size: int) -> int:
+        """Delete the waitlist entries of the trainings already started by batches, returns the number of deleted entries."""
+        deleted = 0
+        while True:
+            async with async_session_factory() as session:
+                started = select(
+                    WaitlistEntry.id
+                ).where(
+                    WaitlistEntry.training_time_start < func.now()
+                ).limit(
+                    batch_size
+                )
+                result = await session.execute(
+                    delete(WaitlistEntry).where(WaitlistEntry.id.in_(started)), execution_options={INTERNAL_STATEMENT: True}
+                )
+                await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
+
+    @staticmethod
+    async def archive_subscriptions(before: datetime, batch_size: int) -> int:
+        """Move the subscriptions of the trainings started before before to subscription_history by batches.
+
+        Returns the number of moved subscriptions. The seats_taken of the trainings are left as they
+        are, they count the students who came.
+        """
+        archived = 0
+        while True:
+            async with async_session_factory() as session:
+                old = select(
+                    Subscription.student_id, Subscription.training_id, Subscription.training_time_start
+                ).where(
+                    Subscription.training_time_start < before
+                ).limit(
+                    batch_size
+                )
+                moved = delete(
+                    Subscription
+                ).where(
+                    tuple_(Subscription.student_id, Subscription.training_id, Subscription.training_time_start).in_(old)
+                ).returning(
+                    Subscription.student_id, Subscription.training_id, Subscription.training_time_start
+                ).cte("moved")
+                history = pg_insert(
+                    SubscriptionHistory
+                ).from_select(
+                    ["student_id", "training_id", "training_time_start"], select(moved)
+                ).on_conflict_do_nothing().cte("history")
+                count = (await session.execute(
+                    select(func.count()).select_from(moved).add_cte(history), execution_options={INTERNAL_STATEMENT: True}
+                )).scalar()
+                await session.commit()
+            archived += count
+            if count < batch_size:
+                return archived
+
+class AgeRolloverService():
+    @staticmethod
+    async def roll_over(day: date, batch_size: int) -> Tuple[int, int, int]:
+        """Move up to batch_size users whose age_type changed by day to their new one, with their availability.
+
+        The users are found through user_age_type_until_index, a run costs the number of users who
+        changed, not the number of users. They are claimed with SKIP LOCKED, several processes share
+        the work. Returns the numbers of users, of removed and of added available trainings.
+        """
+        async with async_session_factory() as session:
+            due = (await session.execute(
+                select(
+                    User.id, User.birth_date
+                ).where(
+                    User.age_type_until <= day
+                ).order_by(
+                    User.age_type_until
+                ).limit(
+                    batch_size
+                ).with_for_update(
+                    skip_locked=True
+                ), execution_options={INTERNAL_STATEMENT: True}
+            )).all()
+            if not due:
+                return 0, 0, 0
+
+            await session.execute(update(User), [
+                {
+                    "id": user.id,
+                    "age": age_on(user.birth_date, day),
+                    "age_type": age_type_of(age_on(user.birth_date, day)),
+                    "age_type_until": next_age_type_change(user.birth_date, day)
+                }
+                for user in due
+            ], execution_options={INTERNAL_STATEMENT: True})
+            users = select(
+                User.id, User.role, User.age_type, User.gender, User.user_type
+            ).where(
+                User.id == any_(bindparam("user_ids", [user.id for user in due], type_=ARRAY(Integer)))
+            ).cte("users")
+            removed, added = (await session.execute(retarget_statement(users), execution_options={INTERNAL_STATEMENT: True})).one()
+            await session.commit()
+        return len(due), removed, added
+
 class RegistrationService():
     def __init__(self, new_user_dto: UserRegisterDTO):
         self.new_user_dto = new_user_dto
 
     def calculate_age(self) -> int:
-        age = datetime.today().year - self.new_user_dto.birth_date.year
-
-        if (datetime.today().month, datetime.today().day) < (self.new_user_dto.birth_date.month, self.new_user_dto.birth_date.day):
-            age -= 1
-        
-        return age    
+        return age_on(self.new_user_dto.birth_date, date.today())
     
     @staticmethod
     async def calculate_and_insert_target_trainings(user: UserDTO, session: AsyncSession) -> None:
         query = select(
-            Training.id
+            Training.id, Training.time_start
         ).join(
             Interest, Interest.discipline == Training.discipline
         ).where(
-            and_(
-                Interest.user_id == user.id,
-                or_(Training.target_auditory == user.age_type, Training.target_auditory.is_(None)),
-                or_(Training.target_gender == user.gender, Training.target_gender.is_(None)),
-                or_(Training.target_usertype == user.user_type, Training.target_usertype.is_(None))
-            )
-            
+            Interest.user_id == user.id,
+            Training.type == TrainingType.GROUP,
+            *audience_filters(Training, user.age_type, user.gender, user.user_type)
         )
 
         result = await session.execute(query)
-        training_ids = [row.id for row in result]
-        if training_ids:
-            stmt = pg_insert(AvailableTraining).values([{"user_id": user.id, "training_id": training_id} for training_id in training_ids]).on_conflict_do_nothing(index_elements=['user_id', 'training_id'])
-            await session.execute(stmt)
+        await insert_available_trainings(session, [
+            {"user_id": user.id, "training_id": row.id, "training_time_start": row.time_start} for row in result
+        ])
 
     async def add_new_user(self) -> UserAddDTO | None:
         async with async_session_factory() as session:
@@ -764,7 +1879,7 @@ class RegistrationService():
             if self.new_user_dto.email in all_emails:
                 raise RegistrationError("The email you have entered is already used", 409)
             
-            hashed_password = ph.hash(self.new_user_dto.password)
+            hashed_password = await get_password_hash_async(self.new_user_dto.password)
 
             age = self.calculate_age()
 
@@ -775,7 +1890,8 @@ class RegistrationService():
                 role=self.new_user_dto.role,
                 age=age,
                 gender=self.new_user_dto.gender,
-                user_type=self.new_user_dto.level
+                user_type=self.new_user_dto.level,
+                birth_date=self.new_user_dto.birth_date
             )
 
             user = User.from_dto(user_add_dto)
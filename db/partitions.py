@@ -0,0 +1,71 @@
+"""Monthly range partitions of the trainings and of their fan-out.
+
+trainings is partitioned by time_start, available_trainings and subscriptions by the
+training_time_start they copy from their training: a month has a partition in each of the three
+tables, and a query bounded in time only reads the partitions of its months. Each table also has
+a DEFAULT partition (models.models) taking the rows of the months without a partition yet.
+
+The migrations create the partitions of the existing rows and of PARTITION_MONTHS_AHEAD months
+ahead, PartitionsMaintainer (app.workers) keeps creating them ahead as the months pass. A month
+already holding rows in the DEFAULT partitions can't be given its own partitions, the trainings
+starting after the partitioned months are refused for that reason (db.database.check_partitioned).
+RetentionWorker (app.workers) drops the partitions of available_trainings once their month is over.
+"""
+import re
+from datetime import date
+from typing import List
+
+# the referenced table first, the partitions of its fan-out reference it
+PARTITIONED_TABLES = ("trainings", "available_trainings", "subscriptions")
+
+_partition_name_re = re.compile(rf"({'|'.join(PARTITIONED_TABLES)})_(\d{{4}}_\d{{2}}|default)")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_from(first: date, count: int) -> List[date]:
+    first = month_start(first)
+    return [add_months(first, offset) for offset in range(count)]
+
+
+def partitioned_until(today: date, months_ahead: int) -> date:
+    """The first month without partitions once PartitionsMaintainer created those of months_ahead months ahead."""
+    return add_months(month_start(today), months_ahead + 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def partition_month(table: str) -> date | None:
+    """The month of a monthly partition, None for the DEFAULT partitions and the other tables."""
+    match = _partition_name_re.fullmatch(table)
+    if match is None or match.group(2) == "default":
+        return None
+    year, month = match.group(2).split("_")
+    return date(int(year), int(month), 1)
+
+
+def is_partition(table: str) -> bool:
+    """Whether table is a partition, the partitions are not declared in the models."""
+    return _partition_name_re.fullmatch(table) is not None
+
+
+def create_partition_statements(month: date) -> List[str]:
+    """CREATE TABLE ... PARTITION OF of the month in the three tables, the existing partitions are skipped.
+
+    The bounds are in UTC, the partitions of a month don't depend on the TimeZone of the session.
+    """
+    month = month_start(month)
+    bounds = f"FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    return [
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} FOR VALUES {bounds}"
+        for table in PARTITIONED_TABLES
+    ]
@@ -0,0 +1,349 @@
+"""Generate a reproducible synthetic dataset and bulk-load it through COPY.
+
+Usage:
+    python -m db.seed --users 100000 --seed 42 --truncate
+
+The available_trainings fan-out dominates the row count: about 50 rows per student with the
+defaults, so --users 10000 gives ~0.5M rows and --users 100000 ~5M rows.
+
+The same --seed and --start-date always produce the same dataset, the start date defaults to
+a week ago so that the trainings are spread around today.
+
+Every student logs in as student{n}@seed.example.com and every coach as coach{n}@seed.example.com,
+all of them with the password SEED_PASSWORD.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import pathlib
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+root_path = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_path))
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, text, union_all, update
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from app.config import settings
+from app.hashing import get_password_hash
+from models.enums import Auditory, Discipline, Gender, Role, TrainingType, UserType
+from models.models import AvailableTraining, Interest, Subscription, Training, User
+from schemas.schemas import birthday, next_age_type_change
+
+SEED_PASSWORD = "SeedPass123"
+STUDENT_EMAIL = "student{}@seed.example.com"
+COACH_EMAIL = "coach{}@seed.example.com"
+
+AGE_TYPE_WEIGHTS = {Auditory.CHILDREN: 0.15, Auditory.ADULTS: 0.70, Auditory.SENIORS: 0.15}
+AGE_RANGES = {Auditory.CHILDREN: (6, 13), Auditory.ADULTS: (14, 59), Auditory.SENIORS: (60, 80)}
+USER_TYPE_WEIGHTS = {UserType.BEGINNER: 0.45, UserType.NON_COMPETITOR: 0.40, UserType.COMPETITOR: 0.15}
+DISCIPLINE_WEIGHTS = {
+    Discipline.MMA: 0.25,
+    Discipline.STRIKING: 0.20,
+    Discipline.BOXE_FEMININ: 0.10,
+    Discipline.WRESTLING: 0.10,
+    Discipline.BJJ: 0.20,
+    Discipline.PHISICAL_PREPARATION: 0.15
+}
+INTERESTS_COUNT_WEIGHTS = {1: 0.50, 2: 0.35, 3: 0.15}
+START_HOURS = (7, 9, 12, 17, 18, 19, 20)
+
+FIRST_NAMES = ("Alice", "Bruno", "Chloe", "David", "Emma", "Farid", "Gabriel", "Hugo", "Ines", "Jade",
+               "Karim", "Lea", "Manon", "Nathan", "Olga", "Paul", "Quentin", "Rose", "Sami", "Theo")
+LAST_NAMES = ("Martin", "Bernard", "Dubois", "Petit", "Durand", "Leroy", "Moreau", "Simon", "Laurent", "Michel",
+              "Garcia", "Roux", "Fournier", "Morel", "Girard", "Andre", "Mercier", "Blanc", "Guerin", "Muller")
+
+USER_COLUMNS = ["id", "age", "age_type", "gender", "role", "user_type", "name", "email", "password", "birth_date", "age_type_until"]
+INTEREST_COLUMNS = ["user_id", "discipline"]
+TRAINING_COLUMNS = ["id", "title", "description", "time_start", "time_end", "target_auditory", "target_gender",
+                    "target_usertype", "type", "individual_for_id", "discipline", "coach_id"]
+
+
+@dataclass
+class SeedConfig:
+    users: int = 10_000
+    students_per_coach: int = 200
+    max_coaches: int = 50 # every student can attend every coach, so the availability grows with users * coaches
+    trainings_per_coach: int = 12
+    individual_share: float = 0.15
+    subscription_share: float = 0.05
+    start_date: date = date.today() - timedelta(days=7)
+    days: int = 28
+    seed: int = 42
+    batch_size: int = 50_000
+
+    @property
+    def coaches(self) -> int:
+        return min(max(1, self.users // self.students_per_coach), self.max_coaches)
+
+    @property
+    def students(self) -> int:
+        return self.users - self.coaches
+
+
+def _choice(rng: random.Random, weights: Dict[Any, float]) -> Any:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _enum_label(value) -> str | None:
+    # enum columns store the member names, as SQLAlchemy does for the ORM
+    return value.name if value is not None else None
+
+
+def _birth(user_id: int, age: int) -> Tuple[date, date | None]:
+    """A birth date of a user of age, spread over the year without drawing from the rng, and the next change of its age_type."""
+    today = date.today()
+    birth_date = birthday(today, -age) - timedelta(days=1 + user_id % 364)
+    return birth_date, next_age_type_change(birth_date, today)
+
+
+def generate_students(cfg: SeedConfig, rng: random.Random, password_hash: str) -> Iterable[Tuple[List[tuple], List[tuple]]]:
+    """Yield batches of (user rows, interest rows), students get the ids after the coaches."""
+    users, interests = [], []
+    for n in range(cfg.students):
+        user_id = cfg.coaches + n + 1
+        age_type = _choice(rng, AGE_TYPE_WEIGHTS)
+        gender = rng.choice((Gender.M, Gender.W))
+        age = rng.randint(*AGE_RANGES[age_type])
+        users.append((
+            user_id,
+            age,
+            _enum_label(age_type),
+            _enum_label(gender),
+            _enum_label(Role.STUDENT),
+            _enum_label(_choice(rng, USER_TYPE_WEIGHTS)),
+            _name(rng),
+            STUDENT_EMAIL.format(n),
+            password_hash,
+            *_birth(user_id, age)
+        ))
+
+        disciplines = dict(DISCIPLINE_WEIGHTS)
+        if gender != Gender.W:
+            disciplines.pop(Discipline.BOXE_FEMININ)
+        for _ in range(_choice(rng, INTERESTS_COUNT_WEIGHTS)):
+            discipline = _choice(rng, disciplines)
+            disciplines.pop(discipline)
+            interests.append((user_id, _enum_label(discipline)))
+
+        if len(users) >= cfg.batch_size:
+            yield users, interests
+            users, interests = [], []
+    if users:
+        yield users, interests
+
+
+def generate_coaches(cfg: SeedConfig, rng: random.Random, password_hash: str) -> List[tuple]:
+    coaches = []
+    for n in range(cfg.coaches):
+        age = rng.randint(25, 55)
+        coaches.append((
+            n + 1,
+            age,
+            _enum_label(Auditory.ADULTS),
+            _enum_label(rng.choice((Gender.M, Gender.W))),
+            _enum_label(Role.COACH),
+            _enum_label(UserType.COMPETITOR),
+            _name(rng),
+            COACH_EMAIL.format(n),
+            password_hash,
+            *_birth(n + 1, age)
+        ))
+    return coaches
+
+
+def generate_trainings(cfg: SeedConfig, rng: random.Random) -> Iterable[List[tuple]]:
+    trainings = []
+    training_id = 0
+    for coach_id in range(1, cfg.coaches + 1):
+        coach_disciplines = rng.sample(list(DISCIPLINE_WEIGHTS), k=rng.choice((1, 2)))
+        for _ in range(cfg.trainings_per_coach):
+            training_id += 1
+            discipline = rng.choice(coach_disciplines)
+            day = cfg.start_date + timedelta(days=rng.randrange(cfg.days))
+            time_start = datetime.combine(day, time(rng.choice(START_HOURS), rng.choice((0, 30))), tzinfo=timezone.utc)
+            time_end = time_start + timedelta(minutes=rng.choice((60, 90)))
+
+            if rng.random() < cfg.individual_share:
+                training_type = TrainingType.INDIVIDUAL
+                individual_for_id = rng.randint(cfg.coaches + 1, cfg.users) if cfg.students else None
+                target_auditory = target_gender = target_usertype = None
+                if individual_for_id is None:
+                    training_type = TrainingType.GROUP
+            else:
+                training_type = TrainingType.GROUP
+                individual_for_id = None
+                target_auditory = _choice(rng, AGE_TYPE_WEIGHTS) if rng.random() < 0.5 else None
+                target_gender = Gender.W if discipline == Discipline.BOXE_FEMININ else (rng.choice((Gender.M, Gender.W)) if rng.random() < 0.2 else None)
+                target_usertype = _choice(rng, USER_TYPE_WEIGHTS) if rng.random() < 0.4 else None
+
+            trainings.append((
+                training_id,
+                f"{discipline.value} {training_type.value}"[:50],
+                f"Seeded {training_type.value} {discipline.value} training",
+                time_start,
+                time_end,
+                _enum_label(target_auditory),
+                _enum_label(target_gender),
+                _enum_label(target_usertype),
+                _enum_label(training_type),
+                individual_for_id,
+                _enum_label(discipline),
+                coach_id
+            ))
+            if len(trainings) >= cfg.batch_size:
+                yield trainings
+                trainings = []
+    if trainings:
+        yield trainings
+
+
+async def copy_records(conn: AsyncConnection, table: str, columns: Sequence[str], records: List[tuple]) -> int:
+    raw_connection = await conn.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(table, records=records, columns=columns)
+    return len(records)
+
+
+def available_trainings_insert():
+    """INSERT ... SELECT of every (student, training) pair matching the targeting rules."""
+    group_matches = select(
+        User.id, Training.id, Training.time_start
+    ).join(
+        Interest, Interest.user_id == User.id
+    ).join(
+        Training, and_(
+            Training.discipline == Interest.discipline,
+            Training.type == TrainingType.GROUP,
+            or_(Training.target_auditory.is_(None), Training.target_auditory == User.age_type),
+            or_(Training.target_gender.is_(None), Training.target_gender == User.gender),
+            or_(Training.target_usertype.is_(None), Training.target_usertype == User.user_type)
+        )
+    ).where(
+        User.role == Role.STUDENT
+    )
+    individual_matches = select(
+        Training.individual_for_id, Training.id, Training.time_start
+    ).where(
+        Training.type == TrainingType.INDIVIDUAL
+    )
+    return insert(AvailableTraining).from_select(
+        ["user_id", "training_id", "training_time_start"], union_all(group_matches, individual_matches)
+    )
+
+
+def subscriptions_insert(cfg: SeedConfig):
+    """Subscribe a deterministic share of the available pairs, reproducible for a given seed."""
+    sampled = func.abs(func.hashtext(
+        func.concat(AvailableTraining.user_id, ":", AvailableTraining.training_id, ":", literal(cfg.seed))
+    )) % 10_000 < int(cfg.subscription_share * 10_000)
+    return insert(Subscription).from_select(
+        ["student_id", "training_id", "training_time_start"],
+        select(AvailableTraining.user_id, AvailableTraining.training_id, AvailableTraining.training_time_start).where(sampled)
+    )
+
+
+async def seed(cfg: SeedConfig, url: str, truncate: bool = False) -> Dict[str, int]:
+    rng = random.Random(cfg.seed)
+    password_hash = get_password_hash(SEED_PASSWORD) # hashed once, Argon2 is too slow to run per row
+    counts = {"users": 0, "interests": 0, "trainings": 0, "available_trainings": 0, "subscriptions": 0}
+
+    engine = create_async_engine(url)
+    try:
+        async with engine.connect() as conn:
+            existing = (await conn.execute(select(func.count()).select_from(User))).scalar()
+            if existing and not truncate:
+                raise RuntimeError(f"The database already has {existing} users, pass --truncate to replace them")
+            if truncate:
+                await conn.execute(text("TRUNCATE users, trainings, interests, subscriptions, available_trainings RESTART IDENTITY CASCADE"))
+            await conn.commit()
+
+            counts["users"] += await copy_records(conn, "users", USER_COLUMNS, generate_coaches(cfg, rng, password_hash))
+            for users, interests in generate_students(cfg, rng, password_hash):
+                counts["users"] += await copy_records(conn, "users", USER_COLUMNS, users)
+                counts["interests"] += await copy_records(conn, "interests", INTEREST_COLUMNS, interests)
+            for trainings in generate_trainings(cfg, rng):
+                counts["trainings"] += await copy_records(conn, "trainings", TRAINING_COLUMNS, trainings)
+
+            for table in ("users", "trainings"):
+                await conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+
+            result = await conn.execute(available_trainings_insert())
+            counts["available_trainings"] = result.rowcount
+            result = await conn.execute(subscriptions_insert(cfg))
+            counts["subscriptions"] = result.rowcount
+            # a subscribed training is not available anymore, as after ClientService.subscribe_to_training
+            result = await conn.execute(
+                delete(AvailableTraining).where(
+                    AvailableTraining.user_id == Subscription.student_id,
+                    AvailableTraining.training_id == Subscription.training_id,
+                    AvailableTraining.training_time_start == Subscription.training_time_start
+                )
+            )
+            counts["available_trainings"] -= result.rowcount
+            # the subscriptions take their seats, the trainings are seeded without a capacity
+            taken = select(
+                Subscription.training_id, func.count().label("taken")
+            ).group_by(
+                Subscription.training_id
+            ).subquery()
+            await conn.execute(
+                update(Training).where(Training.id == taken.c.training_id).values(seats_taken=taken.c.taken)
+            )
+            await conn.commit()
+
+            await conn.execute(text("ANALYZE"))
+    finally:
+        await engine.dispose()
+
+    return counts
+
+
+def parse_args(argv: Sequence[str] | None = None) -> Tuple[SeedConfig, argparse.Namespace]:
+    parser = argparse.ArgumentParser(description="Seed the database with a synthetic dataset.")
+    parser.add_argument("--users", type=int, default=SeedConfig.users, help="number of users, coaches included (10k to 5M)")
+    parser.add_argument("--students-per-coach", type=int, default=SeedConfig.students_per_coach)
+    parser.add_argument("--max-coaches", type=int, default=SeedConfig.max_coaches)
+    parser.add_argument("--trainings-per-coach", type=int, default=SeedConfig.trainings_per_coach)
+    parser.add_argument("--individual-share", type=float, default=SeedConfig.individual_share)
+    parser.add_argument("--subscription-share", type=float, default=SeedConfig.subscription_share)
+    parser.add_argument("--start-date", type=date.fromisoformat, default=SeedConfig.start_date)
+    parser.add_argument("--days", type=int, default=SeedConfig.days, help="trainings are spread over this many days")
+    parser.add_argument("--seed", type=int, default=SeedConfig.seed)
+    parser.add_argument("--batch-size", type=int, default=SeedConfig.batch_size)
+    parser.add_argument("--url", default=settings.get_db_url_with_asyncpg)
+    parser.add_argument("--truncate", action="store_true", help="delete the existing users and trainings first")
+    args = parser.parse_args(argv)
+
+    cfg = SeedConfig(
+        users=args.users,
+        students_per_coach=args.students_per_coach,
+        max_coaches=args.max_coaches,
+        trainings_per_coach=args.trainings_per_coach,
+        individual_share=args.individual_share,
+        subscription_share=args.subscription_share,
+        start_date=args.start_date,
+        days=args.days,
+        seed=args.seed,
+        batch_size=args.batch_size
+    )
+    return cfg, args
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    cfg, args = parse_args(argv)
+    start = perf_counter()
+    counts = asyncio.run(seed(cfg, args.url, truncate=args.truncate))
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"seeded in {perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
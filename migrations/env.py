@@ -6,6 +6,7 @@ from sqlalchemy import pool
 from alembic import context
 
 from app.config import settings
+from db.partitions import is_partition
 from models.models import Base # Import the Base class for models
 
 # this is the Alembic Config object, which provides
@@ -27,6 +28,20 @@ target_metadata = Base.metadata  # Use the Base metadata from models
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave the partitions out of the autogenerated migrations, db.partitions creates them.
+
+    Postgres also clones a foreign key to a partitioned table for each of its partitions.
+    """
+    if type_ == "table":
+        return not is_partition(name)
+    if type_ in ("index", "unique_constraint", "column"):
+        return not is_partition(object.table.name)
+    if type_ == "foreign_key_constraint":
+        return not (is_partition(object.table.name) or is_partition(object.referred_table.name))
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -43,6 +58,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -66,7 +82,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
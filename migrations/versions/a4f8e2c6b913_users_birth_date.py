@@ -0,0 +1,33 @@
+"""Birth date of the users and the next change of their age_type
+
+Revision ID: a4f8e2c6b913
+Revises: d9a5c3e7f102
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f8e2c6b913'
+down_revision: Union[str, Sequence[str], None] = 'd9a5c3e7f102'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the users registered before stay without, their age_type no longer changes
+    op.add_column('users', sa.Column('birth_date', sa.Date(), nullable=True))
+    op.add_column('users', sa.Column('age_type_until', sa.Date(), nullable=True))
+    op.create_index('user_age_type_until_index', 'users', ['age_type_until'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('user_age_type_until_index', table_name='users')
+    op.drop_column('users', 'age_type_until')
+    op.drop_column('users', 'birth_date')
@@ -0,0 +1,40 @@
+"""Training capacity and seats taken
+
+Revision ID: a7c3e91d5b20
+Revises: f668219954b1
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e91d5b20'
+down_revision: Union[str, Sequence[str], None] = 'f668219954b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('trainings', sa.Column('capacity', sa.Integer(), nullable=True))
+    op.add_column('trainings', sa.Column('seats_taken', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    # existing subscriptions already take their seats
+    op.execute(
+        "UPDATE trainings SET seats_taken = counts.taken "
+        "FROM (SELECT training_id, count(*) AS taken FROM subscriptions GROUP BY training_id) AS counts "
+        "WHERE trainings.id = counts.training_id"
+    )
+    op.create_check_constraint(
+        'training_seats_taken_check', 'trainings', 'seats_taken >= 0 AND (capacity IS NULL OR seats_taken <= capacity)'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('training_seats_taken_check', 'trainings', type_='check')
+    op.drop_column('trainings', 'seats_taken')
+    op.drop_column('trainings', 'capacity')
@@ -0,0 +1,134 @@
+"""Monthly partitions of the trainings and of their fan-out
+
+Revision ID: b7e2f4a91c58
+Revises: f3c6d1b8a924
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+from db.partitions import PARTITIONED_TABLES, create_partition_statements, month_start, months_from
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f4a91c58'
+down_revision: Union[str, Sequence[str], None] = 'f3c6d1b8a924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FANOUT_TABLES = {"available_trainings": "user_id", "subscriptions": "student_id"}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a partitioned table can't be unique on id alone, the references to the trainings carry their time_start
+    op.drop_constraint('subscriptions_training_id_fkey', 'subscriptions', type_='foreignkey')
+    op.drop_constraint('available_trainings_training_id_fkey', 'available_trainings', type_='foreignkey')
+    op.drop_constraint('waitlist_training_id_fkey', 'waitlist', type_='foreignkey')
+
+    # a table can't be partitioned in place, the rows are copied to new tables
+    for table in PARTITIONED_TABLES:
+        op.rename_table(table, f'{table}_unpartitioned')
+        op.execute(f'ALTER INDEX {table}_pkey RENAME TO {table}_unpartitioned_pkey')
+    for index in ('training_target_auditory_index', 'training_target_gemder_index', 'training_coach_id_time_start_index',
+                  'available_trainings_training_id_index', 'available_trainings_user_id_index'):
+        op.drop_index(index)
+    op.execute('ALTER SEQUENCE trainings_id_seq OWNED BY NONE')
+
+    # the columns with their enum types, the default of the id and the check constraint of the seats
+    op.execute('CREATE TABLE trainings (LIKE trainings_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (time_start)')
+    op.execute('ALTER SEQUENCE trainings_id_seq OWNED BY trainings.id')
+    for table, user_column in FANOUT_TABLES.items():
+        op.create_table(table,
+        sa.Column(user_column, sa.Integer(), nullable=False),
+        sa.Column('training_id', sa.Integer(), nullable=False),
+        sa.Column('training_time_start', sa.DateTime(timezone=True), nullable=False),
+        postgresql_partition_by='RANGE (training_time_start)'
+        )
+
+    connection = op.get_bind()
+    first = connection.execute(sa.text('SELECT min(time_start) FROM trainings_unpartitioned')).scalar()
+    first = month_start(first.date() if first is not None else date.today())
+    today = date.today()
+    months = (today.year - first.year) * 12 + today.month - first.month + settings.PARTITION_MONTHS_AHEAD + 1
+    for table in PARTITIONED_TABLES:
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+    for month in months_from(first, months):
+        for statement in create_partition_statements(month):
+            op.execute(statement)
+
+    op.execute('INSERT INTO trainings SELECT * FROM trainings_unpartitioned')
+    for table, user_column in FANOUT_TABLES.items():
+        op.execute(
+            f'INSERT INTO {table} ({user_column}, training_id, training_time_start) '
+            f'SELECT fanout.{user_column}, fanout.training_id, trainings.time_start FROM {table}_unpartitioned AS fanout '
+            f'JOIN trainings_unpartitioned AS trainings ON trainings.id = fanout.training_id'
+        )
+    op.add_column('waitlist', sa.Column('training_time_start', sa.DateTime(timezone=True), nullable=True))
+    op.execute('UPDATE waitlist SET training_time_start = trainings.time_start FROM trainings WHERE trainings.id = waitlist.training_id')
+    op.alter_column('waitlist', 'training_time_start', nullable=False)
+
+    # after the copy the keys are built and checked once, not row by row
+    op.create_primary_key('trainings_pkey', 'trainings', ['id', 'time_start'])
+    op.create_foreign_key('trainings_coach_id_fkey', 'trainings', 'users', ['coach_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('trainings_individual_for_id_fkey', 'trainings', 'users', ['individual_for_id'], ['id'], ondelete='CASCADE')
+    for table, user_column in FANOUT_TABLES.items():
+        op.create_primary_key(f'{table}_pkey', table, [user_column, 'training_id', 'training_time_start'])
+        op.create_foreign_key(f'{table}_{user_column}_fkey', table, 'users', [user_column], ['id'], ondelete='CASCADE')
+    for table in (*FANOUT_TABLES, 'waitlist'):
+        op.create_foreign_key(f'{table}_training_fkey', table, 'trainings', ['training_id', 'training_time_start'], ['id', 'time_start'],
+                              ondelete='CASCADE', onupdate='CASCADE')
+    op.create_index('training_target_auditory_index', 'trainings', ['target_auditory'], unique=False)
+    op.create_index('training_target_gemder_index', 'trainings', ['target_gender'], unique=False)
+    op.create_index('training_coach_id_time_start_index', 'trainings', ['coach_id', 'time_start'], unique=False)
+    op.create_index('available_trainings_training_id_index', 'available_trainings', ['training_id'], unique=False)
+    op.create_index('available_trainings_user_id_index', 'available_trainings', ['user_id'], unique=False)
+
+    for table in reversed(PARTITIONED_TABLES):
+        op.drop_table(f'{table}_unpartitioned')
+    op.execute('ANALYZE trainings, available_trainings, subscriptions')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('waitlist_training_fkey', 'waitlist', type_='foreignkey')
+    op.drop_column('waitlist', 'training_time_start')
+    for table in PARTITIONED_TABLES:
+        op.rename_table(table, f'{table}_partitioned')
+        op.execute(f'ALTER INDEX {table}_pkey RENAME TO {table}_partitioned_pkey')
+    for index in ('training_target_auditory_index', 'training_target_gemder_index', 'training_coach_id_time_start_index',
+                  'available_trainings_training_id_index', 'available_trainings_user_id_index'):
+        op.drop_index(index)
+    op.execute('ALTER SEQUENCE trainings_id_seq OWNED BY NONE')
+
+    op.execute('CREATE TABLE trainings (LIKE trainings_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    op.execute('ALTER SEQUENCE trainings_id_seq OWNED BY trainings.id')
+    op.execute('INSERT INTO trainings SELECT * FROM trainings_partitioned')
+    for table, user_column in FANOUT_TABLES.items():
+        op.create_table(table,
+        sa.Column(user_column, sa.Integer(), nullable=False),
+        sa.Column('training_id', sa.Integer(), nullable=False)
+        )
+        op.execute(f'INSERT INTO {table} ({user_column}, training_id) SELECT {user_column}, training_id FROM {table}_partitioned')
+
+    op.create_primary_key('trainings_pkey', 'trainings', ['id'])
+    op.create_foreign_key('trainings_coach_id_fkey', 'trainings', 'users', ['coach_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('trainings_individual_for_id_fkey', 'trainings', 'users', ['individual_for_id'], ['id'], ondelete='CASCADE')
+    for table, user_column in FANOUT_TABLES.items():
+        op.create_primary_key(f'{table}_pkey', table, [user_column, 'training_id'])
+        op.create_foreign_key(f'{table}_{user_column}_fkey', table, 'users', [user_column], ['id'], ondelete='CASCADE')
+    for table in (*FANOUT_TABLES, 'waitlist'):
+        op.create_foreign_key(f'{table}_training_id_fkey', table, 'trainings', ['training_id'], ['id'], ondelete='CASCADE')
+    op.create_index('training_target_auditory_index', 'trainings', ['target_auditory'], unique=False)
+    op.create_index('training_target_gemder_index', 'trainings', ['target_gender'], unique=False)
+    op.create_index('training_coach_id_time_start_index', 'trainings', ['coach_id', 'time_start'], unique=False)
+    op.create_index('available_trainings_training_id_index', 'available_trainings', ['training_id'], unique=False)
+    op.create_index('available_trainings_user_id_index', 'available_trainings', ['user_id'], unique=False)
+
+    for table in reversed(PARTITIONED_TABLES):
+        op.drop_table(f'{table}_partitioned')
@@ -0,0 +1,39 @@
+"""Waitlist of the full trainings
+
+Revision ID: c2d84f6e1a37
+Revises: a7c3e91d5b20
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d84f6e1a37'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e91d5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('waitlist',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('training_id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['student_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['training_id'], ['trainings.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('training_id', 'student_id', name='waitlist_training_id_student_id_key')
+    )
+    op.create_index('waitlist_training_id_id_index', 'waitlist', ['training_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('waitlist_training_id_id_index', table_name='waitlist')
+    op.drop_table('waitlist')
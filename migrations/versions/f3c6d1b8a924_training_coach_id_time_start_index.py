@@ -0,0 +1,28 @@
+"""Index of the trainings of a coach by start
+
+Revision ID: f3c6d1b8a924
+Revises: e4b8a2d9c613
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c6d1b8a924'
+down_revision: Union[str, Sequence[str], None] = 'e4b8a2d9c613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('training_coach_id_time_start_index', 'trainings', ['coach_id', 'time_start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('training_coach_id_time_start_index', table_name='trainings')
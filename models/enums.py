@@ -29,4 +29,11 @@ class Gender(str, Enum):
 class Auditory(str, Enum):
     CHILDREN = "children"
     ADULTS = "adults"
-    SENIORS = "seniors"
\ No newline at end of file
+    SENIORS = "seniors"
+
+class SubscriptionStatus(str, Enum): # Enum for the outcome of an item of a batch subscribe or unsubscribe
+    SUBSCRIBED = "subscribed"
+    UNSUBSCRIBED = "unsubscribed"
+    NOT_AVAILABLE = "not_available"
+    NOT_SUBSCRIBED = "not_subscribed"
+    FULL = "full"
@@ -2,12 +2,13 @@ import sys
 import pathlib
 
 from models.enums import Auditory, Discipline, Gender, Role, TrainingType, UserType
-from schemas.schemas import TrainingAddDTO, UserAddDTO, UserDTO
+from schemas.schemas import TrainingAddDTO, UserAddDTO, UserDTO, next_age_type_change
 root_path = pathlib.Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(root_path))
 
+from datetime import date
 from typing import Annotated, Any, Dict, List
-from sqlalchemy import Table, Column, Integer, String, MetaData, DateTime, ForeignKey, Index
+from sqlalchemy import Table, Column, Integer, String, MetaData, Date, DateTime, DDL, ForeignKey, ForeignKeyConstraint, Index, CheckConstraint, UniqueConstraint, LargeBinary, event, func, text
 from sqlalchemy import Enum as SQLAlchemyEnum
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, relationship
 from enum import Enum
@@ -44,6 +45,8 @@ class User(Base): # Model for user
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     email: Mapped[str] = mapped_column(String(50), nullable=False, unique=True)
     password: Mapped[str] = mapped_column(String(128), nullable=False)
+    birth_date: Mapped[date | None] = mapped_column(Date, nullable=True) # unknown for the users registered before it was stored
+    age_type_until: Mapped[date | None] = mapped_column(Date, nullable=True) # next change of age_type, NULL for the seniors
 
     subs: Mapped[List["Training"]] = relationship(
         back_populates="users_on_training",
@@ -62,14 +65,17 @@ class User(Base): # Model for user
 
     __table_args__ = (
         Index("user_age_type_index", "age_type"),
-        Index("user_gender_index", "gender")
+        Index("user_gender_index", "gender"),
+        Index("user_age_type_until_index", "age_type_until")
     )
 
     @classmethod
     def from_dto(cls, data: UserAddDTO) -> "User":
+        age_type_until = next_age_type_change(data.birth_date, date.today()) if data.birth_date is not None else None
         data = data.model_dump() # Convert Pydantic model to dict
         return cls(
-            **data
+            **data,
+            age_type_until=age_type_until
         )
 
     #reps_cols = ("id", "name", "subs")
@@ -81,7 +87,7 @@ class Training(Base): # Model for training
     id: Mapped[intpk]
     title: Mapped[str] = mapped_column(String(50), nullable=False)
     description: Mapped[str] = mapped_column(String(255), nullable=True)
-    time_start: Mapped[TrainingSchedule]
+    time_start: Mapped[TrainingSchedule] = mapped_column(primary_key=True) # the partition key, a primary key of a partitioned table must include it
     time_end: Mapped[TrainingSchedule]
     target_auditory: Mapped[Auditory] = mapped_column(SQLAlchemyEnum(Auditory), nullable=True, default=None) # Target auditory for training, if None then it's for all
     target_gender: Mapped[Gender] = mapped_column(SQLAlchemyEnum(Gender), nullable=True, default=None) # Target gender for training, if None then it's for all
@@ -90,6 +96,8 @@ class Training(Base): # Model for training
     individual_for_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=True) # Individual training for a specific user, if None then it's a group training
     discipline: Mapped[Discipline]
     coach_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE")) # In a logic i need to check if a user with this idis a coach
+    capacity: Mapped[int] = mapped_column(Integer, nullable=True, default=None) # Maximum number of subscribers, if None then it's unlimited
+    seats_taken: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text("0")) # Number of subscribers, kept by the subscribe and unsubscribe statements
 
     users_on_training: Mapped[List[User]] = relationship(
         back_populates="subs",
@@ -103,8 +111,13 @@ class Training(Base): # Model for training
 
     __table_args__ =(
         Index("training_target_auditory_index", "target_auditory"),
-        Index("training_target_gemder_index", "target_gender")
+        Index("training_target_gemder_index", "target_gender"),
+        Index("training_coach_id_time_start_index", "coach_id", "time_start"), # the trainings of a coach in a window
+        CheckConstraint("seats_taken >= 0 AND (capacity IS NULL OR seats_taken <= capacity)", name="training_seats_taken_check"),
+        {"postgresql_partition_by": "RANGE (time_start)"} # a partition per month, see db.partitions
     )
+    # the ids stay unique, they are given by a sequence, so the ORM identifies a training by its id alone
+    __mapper_args__ = {"primary_key": ["id"]}
 
     @classmethod
     def from_dto(cls, data: "TrainingAddDTO") -> "Training":
@@ -121,18 +134,77 @@ class Subscription(Base): # Model for subscription
     __tablename__ = 'subscriptions'
 
     student_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
-    training_id: Mapped[int] = mapped_column(ForeignKey("trainings.id", ondelete="CASCADE"), primary_key=True)
+    training_id: Mapped[int] = mapped_column(primary_key=True)
+    training_time_start: Mapped[TrainingSchedule] = mapped_column(primary_key=True) # the partition key, copied from the training
+
+    __table_args__ = (
+        # a training moved to another time moves its subscriptions along
+        ForeignKeyConstraint(
+            ["training_id", "training_time_start"], ["trainings.id", "trainings.time_start"],
+            ondelete="CASCADE", onupdate="CASCADE", name="subscriptions_training_fkey"
+        ),
+        {"postgresql_partition_by": "RANGE (training_time_start)"}
+    )
+
+
+class SubscriptionHistory(Base): # Subscription to a past training, moved out of subscriptions by the retention worker
+    __tablename__ = 'subscription_history'
+
+    student_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    training_id: Mapped[int] = mapped_column(primary_key=True) # no foreign key, the history outlives the trainings
+    training_time_start: Mapped[TrainingSchedule]
+
+
+class WaitlistEntry(Base): # A student waiting for a seat of a full training, promoted in the order of the ids
+    __tablename__ = 'waitlist'
+
+    id: Mapped[intpk]
+    training_id: Mapped[int]
+    training_time_start: Mapped[TrainingSchedule] # the trainings are partitioned, a reference to one carries its partition key
+    student_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    created_at: Mapped[TrainingSchedule] = mapped_column(server_default=func.now())
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["training_id", "training_time_start"], ["trainings.id", "trainings.time_start"],
+            ondelete="CASCADE", onupdate="CASCADE", name="waitlist_training_fkey"
+        ),
+        UniqueConstraint("training_id", "student_id", name="waitlist_training_id_student_id_key"),
+        Index("waitlist_training_id_id_index", "training_id", "id")
+    )
+
+
+class IdempotencyKey(Base): # Response of a write sent with an Idempotency-Key, replayed to the retries of the same request
+    __tablename__ = 'idempotency_keys'
+
+    owner: Mapped[bytes] = mapped_column(LargeBinary, primary_key=True) # sha256 of the credentials of the request
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    fingerprint: Mapped[bytes] = mapped_column(LargeBinary) # sha256 of the method, path, query and body
+    status_code: Mapped[int | None] = mapped_column(nullable=True) # NULL while the first request runs
+    content_type: Mapped[str | None] = mapped_column(nullable=True)
+    body: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[TrainingSchedule] = mapped_column(server_default=func.now())
+
+    __table_args__ = (
+        Index("idempotency_keys_created_at_index", "created_at"),
+    )
 
 
 class AvailableTraining(Base): # Represents available training for a specific user. The evaluation is based on the type of training, target auditory, target gender, and user type.
     __tablename__ = 'available_trainings'
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
-    training_id: Mapped[int] = mapped_column(ForeignKey("trainings.id", ondelete="CASCADE"), primary_key=True)
+    training_id: Mapped[int] = mapped_column(primary_key=True)
+    training_time_start: Mapped[TrainingSchedule] = mapped_column(primary_key=True) # the partition key, copied from the training
 
     __table_args__ = (
+        ForeignKeyConstraint(
+            ["training_id", "training_time_start"], ["trainings.id", "trainings.time_start"],
+            ondelete="CASCADE", onupdate="CASCADE", name="available_trainings_training_fkey"
+        ),
         Index("available_trainings_training_id_index", "training_id"),
-        Index("available_trainings_user_id_index", "user_id")
+        Index("available_trainings_user_id_index", "user_id"),
+        {"postgresql_partition_by": "RANGE (training_time_start)"}
     )
 
 class Interest(Base): # Model for user interests
@@ -148,4 +220,14 @@ class Interest(Base): # Model for user interests
     __table_args__ = (
         Index("interest_user_id_index", "user_id"),
         Index("interest_discipline_index", "discipline")
-    )
\ No newline at end of file
+    )
+
+
+# a partitioned table only accepts the rows of its partitions, the DEFAULT one takes the rows of the months
+# without a partition yet, db.partitions creates the monthly ones
+for partitioned in (Training, AvailableTraining, Subscription):
+    event.listen(
+        partitioned.__table__,
+        "after_create",
+        DDL("CREATE TABLE %(table)s_default PARTITION OF %(table)s DEFAULT")
+    )
@@ -25,4 +25,18 @@ class RegistrationError(Exception):
     def __init__(self, message: str, code: int = 400):
         self.message = message
         self.code = code
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class QueryBudgetExceededError(Exception):
+    """Exception raised when a request runs more SQL statements than its route allows."""
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+class TrainingIsFullError(Exception):
+    """Exception raised when every seat of a training is taken."""
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
@@ -1,10 +1,70 @@
-from pydantic import BaseModel, EmailStr, model_validator, field_validator, Field
-from models.enums import Auditory, Discipline, Gender, Role, TrainingType, UserType
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, TypeAdapter, ValidationError, model_validator, field_validator, Field
+from models.enums import Auditory, Discipline, Gender, Role, SubscriptionStatus, TrainingType, UserType
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Literal, Optional, Type, TypeVar
 from datetime import datetime, timedelta, time, date as _date
 
 from schemas.exceptions import RegistrationError, TimeValidationError, BusinessRulesValidationError
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+TRAININGS_IMPORT_MAX_SIZE = 500 # trainings created by one import, 12 bind parameters each
+BATCH_MAX_REQUESTS = 20 # sub-requests accepted by /batch
+
+_date_re = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+_time_re = re.compile(r"(\d{1,2}):(\d{1,2}):(\d{1,2})")
+
+def parse_date(value: str) -> _date:
+    """Parse 'YYYY-MM-DD', accepts what datetime.strptime(value, "%Y-%m-%d") accepts at a fraction of its cost."""
+    match = _date_re.fullmatch(value)
+    if match is None:
+        raise ValueError(f"Invalid date: {value}")
+    return _date(int(match[1]), int(match[2]), int(match[3]))
+
+def parse_time(value: str) -> time:
+    """Parse 'HH:MM:SS', accepts what datetime.strptime(value, "%H:%M:%S") accepts at a fraction of its cost."""
+    match = _time_re.fullmatch(value)
+    if match is None:
+        raise ValueError(f"Invalid time: {value}")
+    return time(int(match[1]), int(match[2]), int(match[3]))
+
+@lru_cache(maxsize=None)
+def dto_list_adapter(dto_class: Type[ModelT]) -> TypeAdapter:
+    return TypeAdapter(List[dto_class])
+
+def dtos_from_orm(dto_class: Type[ModelT], objects: Iterable[Any]) -> List[ModelT]:
+    """Build DTOs from ORM objects in a single call into pydantic-core instead of one model_validate per object."""
+    return dto_list_adapter(dto_class).validate_python(objects, from_attributes=True)
+
+# the ages at which the age_type of a user changes, to adults then to seniors
+AGE_TYPE_BOUNDARIES = ((14, Auditory.ADULTS), (60, Auditory.SENIORS))
+
+def age_on(birth_date: _date, day: _date) -> int:
+    return day.year - birth_date.year - ((day.month, day.day) < (birth_date.month, birth_date.day))
+
+def age_type_of(age: int) -> Auditory:
+    age_type = Auditory.CHILDREN
+    for boundary, next_age_type in AGE_TYPE_BOUNDARIES:
+        if age >= boundary:
+            age_type = next_age_type
+    return age_type
+
+def birthday(birth_date: _date, age: int) -> _date:
+    """The day someone born on birth_date turns age, the 1st of March for the ones born a 29th of February."""
+    try:
+        return birth_date.replace(year=birth_date.year + age)
+    except ValueError:
+        return _date(birth_date.year + age, 3, 1)
+
+def next_age_type_change(birth_date: _date, day: _date) -> _date | None:
+    """The first day after day when the age_type of someone born on birth_date changes, None for the seniors."""
+    for boundary, _ in AGE_TYPE_BOUNDARIES:
+        change = birthday(birth_date, boundary)
+        if change > day:
+            return change
+    return None
+
 class UserAddDTO(BaseModel):
     name: str
     email: str
@@ -14,19 +74,26 @@ class UserAddDTO(BaseModel):
     gender: Gender
     age_type: Auditory | None = None
     user_type: UserType = Field(default=UserType.NON_COMPETITOR)
+    birth_date: _date | None = None
 
     @model_validator(mode="after")
     def validate_age_type(self) -> dict:
         if self.age_type is None:
-            if self.age < 14:
-                self.age_type = Auditory.CHILDREN
-            elif self.age < 60:
-                self.age_type = Auditory.ADULTS
-            else:
-                self.age_type = Auditory.SENIORS
+            self.age_type = age_type_of(self.age)
 
         return self
 
+class UserRegisteredDTO(BaseModel):
+    """The new user answered by the registration, without its password hash, the response is stored for the retries."""
+    name: str
+    email: str
+    role: str
+    age: int
+    gender: Gender
+    age_type: Auditory | None = None
+    user_type: UserType
+    birth_date: _date | None = None
+
 class UserDTO(UserAddDTO):
     id: int
 
@@ -50,6 +117,30 @@ class UserRegisterDTO(BaseModel):
             raise RegistrationError("Passwords must match")
         return self
     
+class UserProfileUpdateDTO(BaseModel):
+    name: Optional[str] = Field(default=None, max_length=50)
+    birth_date: Optional[_date] = Field(default=None, description="Your birthdate")
+    gender: Optional[Gender] = Field(default=None, description="Your gender")
+    level: Optional[UserType] = Field(default=None, description="Your level")
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if all(getattr(self, field) is None for field in type(self).model_fields):
+            raise BusinessRulesValidationError("Nothing to update, specify at least one field of the profile")
+        return self
+
+class InterestsUpdateDTO(BaseModel):
+    add: List[Discipline] = Field(default_factory=list, description="Disciplines to add to your interests")
+    remove: List[Discipline] = Field(default_factory=list, description="Disciplines to remove from your interests")
+
+    @model_validator(mode="after")
+    def check_changes(self):
+        if not self.add and not self.remove:
+            raise BusinessRulesValidationError("Nothing to update, specify disciplines to add or to remove")
+        if set(self.add) & set(self.remove):
+            raise BusinessRulesValidationError("A discipline can't be both added and removed")
+        return self
+
 class UserLoginDTO(BaseModel):
     email: EmailStr
     password: str
@@ -73,24 +164,25 @@ class TrainingOnInputDTO(BaseModel):
     target_auditory: Optional[Auditory] = Field(default=None, example="adults", description="For clients of which specific age group this training is dedicated. Shold be specified if type is 'grpoup'. If not specified, training is dedicated for all age groups")  # e.g., "adults", "children"
     target_gender: Optional[Gender] = Field(default=None, example="men", description="For clients of which specific gender this training is dedicated. Shold be specified if type is 'grpoup'. If not specified, training is dedicated for all genders")
     target_usertype: Optional[UserType] = Field(default=None, description="For clients of which specific user type this training is dedicated. Shold be specified if type is 'grpoup'. If not specified, training is dedicated for all user types")
+    capacity: Optional[int] = Field(default=None, ge=1, example=20, description="Maximum number of subscribers. If not specified, the number of subscribers is unlimited")
 
     @field_validator("date", mode="before")
     def validate_date(cls, v):
-        try:
-            if v is not None:
-                datetime.strptime(v, "%Y-%m-%d")
-        except ValueError:
-            raise TimeValidationError("Date must be in a format 'YYYY-MM-DD'")
+        if isinstance(v, str):
+            try:
+                return parse_date(v)
+            except ValueError:
+                raise TimeValidationError("Date must be in a format 'YYYY-MM-DD'")
         return v
     
     @field_validator("time_start", "time_end", mode="before")
     def validate_time(cls, v):
-        try:
-            if v is not None:
-                datetime.strptime(v, "%H:%M:%S")
-            return v
-        except ValueError:
-            raise TimeValidationError("Time should be in a format 'HH:MM:SS'")
+        if isinstance(v, str):
+            try:
+                return parse_time(v)
+            except ValueError:
+                raise TimeValidationError("Time should be in a format 'HH:MM:SS'")
+        return v
         
     @model_validator(mode="after")
     def check_time_and_business_rules(self):
@@ -111,6 +203,70 @@ class TrainingOnInputDTO(BaseModel):
         return self
     
 
+class TrainingsImportDTO(BaseModel):
+    trainings: List[TrainingOnInputDTO] = Field(..., min_length=1, max_length=TRAININGS_IMPORT_MAX_SIZE)
+
+    @field_validator("trainings", mode="before")
+    def validate_every_training(cls, v):
+        # all the trainings are checked before any is created, the errors are reported together
+        if not isinstance(v, list) or len(v) > TRAININGS_IMPORT_MAX_SIZE:
+            return v
+        trainings, errors = [], []
+        for index, item in enumerate(v):
+            try:
+                trainings.append(item if isinstance(item, TrainingOnInputDTO) else TrainingOnInputDTO.model_validate(item))
+            except (TimeValidationError, BusinessRulesValidationError) as e:
+                errors.append(f"training {index}: {e.message}")
+            except ValidationError as e:
+                errors.extend(f"training {index}: {'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        if errors:
+            raise BusinessRulesValidationError("; ".join(errors))
+        return trainings
+
+class TrainingsSelectionDTO(BaseModel):
+    """Trainings of the coach a bulk operation applies to, all the given filters must match."""
+    date_start: Optional[_date] = Field(default=None, example="2025-12-24", description="First day of the window")
+    date_end: Optional[_date] = Field(default=None, example="2026-01-02", description="Last day of the window, included")
+    discipline: Optional[Discipline] = None
+    title: Optional[str] = Field(default=None, description="Trainings of a series, e.g. the ones of an import, share their title")
+    training_ids: Optional[List[int]] = Field(default=None, max_length=TRAININGS_IMPORT_MAX_SIZE)
+
+    @field_validator("date_start", "date_end", mode="before")
+    def validate_date(cls, v):
+        if isinstance(v, str):
+            try:
+                return parse_date(v)
+            except ValueError:
+                raise TimeValidationError("Date must be in a format 'YYYY-MM-DD'")
+        return v
+
+    @model_validator(mode="after")
+    def check_filters(self):
+        if not self.model_dump(include=set(TrainingsSelectionDTO.model_fields), exclude_none=True):
+            raise BusinessRulesValidationError("At least one filter is required")
+        if self.date_start is not None and self.date_end is not None and self.date_start > self.date_end:
+            raise TimeValidationError("The end of the window should be after its start")
+        return self
+
+class TrainingsShiftDTO(TrainingsSelectionDTO):
+    minutes: int = Field(..., ge=-7 * 24 * 60, le=7 * 24 * 60, example=30, description="Minutes added to the start and the end, negative to move earlier")
+
+    @model_validator(mode="after")
+    def check_shift(self):
+        if self.minutes == 0:
+            raise BusinessRulesValidationError("The trainings must be shifted by at least a minute")
+        return self
+
+class TrainingTemplateDTO(BaseModel):
+    """What the trainings imported from a calendar share, the events only give their title, description and times."""
+    type: TrainingType = Field(default=TrainingType.GROUP)
+    discipline: Discipline = Field(default=Discipline.MMA)
+    individual_for_id: Optional[int] = None
+    target_auditory: Optional[Auditory] = None
+    target_gender: Optional[Gender] = None
+    target_usertype: Optional[UserType] = None
+    capacity: Optional[int] = Field(default=None, ge=1)
+
 class TrainingOnInputToUpdateDTO(TrainingOnInputDTO):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -123,14 +279,15 @@ class TrainingOnInputToUpdateDTO(TrainingOnInputDTO):
     target_auditory: Optional[Auditory] = Field(default=None, example="adults")  # e.g., "adults", "children"
     target_gender: Optional[Gender] = Field(default=None, example="men")
     target_usertype: Optional[UserType] = None
+    capacity: Optional[int] = Field(default=None, ge=1, example=20)
 
 class TrainingSearchDTO(BaseModel):
     title: Optional[str] = Field(default=None, description="A title of a new training")
     description: Optional[str] = Field(default=None, description="Description of a training")
     date_start_search: Optional[_date] = Field(default_factory=lambda: datetime.today().date(), example="2024-12-31")
     date_end_search: Optional[_date] = Field(default=None, example="2025-12-31")
-    time_start_search: Optional[time] = Field(default=datetime.strptime("00:00:00", "%H:%M:%S").time(), example="9:00:00")
-    time_end_search: Optional[time] = Field(default=datetime.strptime("23:59:59", "%H:%M:%S").time(), example="18:00:00")
+    time_start_search: Optional[time] = Field(default=time(0, 0, 0), example="9:00:00")
+    time_end_search: Optional[time] = Field(default=time(23, 59, 59), example="18:00:00")
     type: Optional[TrainingType] = Field(default=None, description="A type of a training: group or individual. For a individual training the parameter individual_for_id is required")
     discipline: Optional[Discipline] = Field(default=None, description="Discipline of a training: MMA, striking, boxe feminin, wrestling, BJJ, physical_preparation")
     individual_for_id: Optional[int] = Field(default=None, description="Id of a person for whom this training is dedicated. Should be specified only if the type is 'individual'")
@@ -144,18 +301,18 @@ class TrainingSearchDTO(BaseModel):
             return v
         if isinstance(v, str):
             try:
-                return datetime.strptime(v, "%Y-%m-%d").date()
+                return parse_date(v)
             except ValueError:
                 raise TimeValidationError("Date must be in a format 'YYYY-MM-DD'")
         return v
 
-    @field_validator("time_start_search", "time_end_search", "time_start_search", "time_end_search", mode="before")
+    @field_validator("time_start_search", "time_end_search", mode="before")
     def validate_time(cls, v):
         if isinstance(v, time):
             return v
         if isinstance(v, str):
             try:
-                return datetime.strptime(v, "%H:%M:%S").time()
+                return parse_time(v)
             except ValueError:
                 raise TimeValidationError("Time should be in a format 'HH:MM:SS'")
         return v
@@ -197,10 +354,12 @@ class TrainingAddDTO(BaseModel):
     target_auditory: Optional[Auditory] = None  # e.g., "adults", "children"
     target_gender: Optional[Gender] = None
     target_usertype: Optional[UserType] = None
+    capacity: Optional[int] = None
 
 
 class TrainingDTO(TrainingAddDTO):
     id: int
+    seats_taken: int = 0
 
 class UserRelWithSubscriptionsDTO(UserDTO):
     subs: list["TrainingDTO"]
@@ -219,6 +378,35 @@ class SubscriptionDTO(BaseModel):
     user_id: int
     training_id: int
 
+class WaitlistDTO(SubscriptionDTO):
+    position: int
+
+class TrainingIdsDTO(BaseModel):
+    training_ids: List[int] = Field(..., min_length=1, max_length=50, example=[1, 2, 3], description="Ids of the trainings, at most 50")
+
+class SubscriptionResultDTO(BaseModel):
+    training_id: int
+    status: SubscriptionStatus
+
+class StoredResponseDTO(BaseModel):
+    fingerprint: bytes
+    status_code: int | None = None # None while the request holding the key runs
+    content_type: str | None = None
+    body: bytes | None = None
+
+class BatchSubRequestDTO(BaseModel):
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"]
+    path: str = Field(..., pattern=r"^/", example="/client/users/me/client/subscriptions/")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Query parameters")
+    body: Any = Field(None, description="JSON body")
+
+class BatchDTO(BaseModel):
+    requests: List[BatchSubRequestDTO] = Field(..., min_length=1, max_length=BATCH_MAX_REQUESTS)
+
+class BatchResultDTO(BaseModel):
+    status: int
+    body: Any = None
+
 class InterestDTO(BaseModel):
     user_id: int
     disipline: Discipline
\ No newline at end of file
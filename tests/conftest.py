@@ -1,15 +1,24 @@
+from datetime import date
+from typing import Dict, List
 import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from app.config import settings
+import app.routers.auth as auth
+import db.database as database
 from db.database import ORMBase
-from models.models import Base
+from db.partitions import create_partition_statements, months_from
+from models.models import Base, User
 import logging
 from app.main import app
 from schemas.schemas import UserAddDTO
 from sqlalchemy.ext.asyncio import AsyncSession
 from faker import Faker
+
+# query budget violations fail the tests instead of being logged
+settings.QUERY_BUDGET_STRICT = True
 # make a fixture to create the test database, insert some test data, and drop the database after tests are done
 
 logging.basicConfig(level=logging.DEBUG)
@@ -29,6 +38,10 @@ async def engine():
             # Drop all existing tables and create new ones
             await conn.run_sync(Base.metadata.drop_all)
             await conn.run_sync(Base.metadata.create_all)
+            # the monthly partitions the migrations create
+            for month in months_from(date.today(), settings.PARTITION_MONTHS_AHEAD + 1):
+                for statement in create_partition_statements(month):
+                    await conn.execute(text(statement))
 
             logging.debug("Test tables created.")
             # Insert test data
@@ -65,8 +78,68 @@ async def db_session(engine):
         yield session
 
 
+# the background workers act on the whole database, a test starts those it needs with app_settings
+BACKGROUND_WORKERS = (
+    "WAITLIST_WORKER_ENABLED", "IDEMPOTENCY_CLEANUP_ENABLED", "PARTITION_MAINTENANCE_ENABLED", "RETENTION_ENABLED", "AGE_ROLLOVER_ENABLED"
+)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def app_lifespan(request, monkeypatch, engine):
+    """The lifespan of the app around the test, with its engine on the test database and no background workers.
+
+    The settings of a @pytest.mark.app_settings(NAME=value) marker are applied before it starts,
+    e.g. to start a worker.
+    """
+    monkeypatch.setattr(settings, "DB_NAME", settings.DB_TEST_NAME)
+    for name in BACKGROUND_WORKERS:
+        monkeypatch.setattr(settings, name, False)
+    marker = request.node.get_closest_marker("app_settings")
+    for name, value in (marker.kwargs if marker is not None else {}).items():
+        monkeypatch.setattr(settings, name, value)
+    # the lifespan creates the engine on the event loop of the test
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+@pytest_asyncio.fixture(scope="function")
+async def db_rows(app_lifespan):
+    """Add rows to the database for the test, the users added are deleted after it.
+
+    Yields an async function committing the rows it is given and returning them, with their ids.
+    The rows stay readable once committed. Everything referencing a deleted user goes with it:
+    its trainings, interests, availability, subscriptions and waitlist entries.
+    """
+    user_ids: List[int] = []
+
+    async def add(*rows: Base) -> List[Base]:
+        async with database.async_session_factory(expire_on_commit=False) as session:
+            session.add_all(rows)
+            await session.commit()
+        user_ids.extend(row.id for row in rows if isinstance(row, User))
+        return list(rows)
+
+    try:
+        yield add
+    finally:
+        async with database.async_session_factory() as session:
+            await session.execute(delete(User).where(User.id.in_(user_ids)))
+            await session.commit()
+
+
+@pytest.fixture(scope="function")
+def auth_headers(monkeypatch):
+    """Returns the Authorization header of a user, given its email, signed with a key of the test."""
+    monkeypatch.setattr(auth, "jwt_key", "test-key")
+
+    def headers(email: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {auth.create_access_token(data={'sub': email})}"}
+
+    return headers
+
+
 @pytest_asyncio.fixture(scope="function")
-async def client():
+async def client(app_lifespan):
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         yield ac
     logging.debug("Closing AsyncClient...")
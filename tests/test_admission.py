@@ -0,0 +1,70 @@
+from httpx import AsyncClient
+import pytest
+from app.admission import LIMITERS, PRIORITY, READ, WRITE, AIMDLimiter, SharedCap, route_class
+from app.config import settings
+from app.context import iter_routes
+from app.main import app
+
+@pytest.mark.admission_limiter
+def test_limiter_backs_off_once_per_window_and_grows_when_saturated():
+    limiter = AIMDLimiter("test", initial=8, minimum=2, maximum=10, backoff=0.75)
+    for _ in range(8):
+        assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    limiter.release(started_at=1.0, congested=True)
+    limiter.release(started_at=1.0, congested=True) # started before the first cut
+    assert limiter.limit == 6
+
+    limiter.release(started_at=1.0, congested=False)
+    assert limiter.limit == pytest.approx(6 + 1 / 6)
+
+@pytest.mark.admission_limiter
+def test_shared_cap_bounds_the_classes_together():
+    shared = SharedCap("test_shared", 3)
+    read = AIMDLimiter("test_read", initial=2, minimum=2, maximum=2, shared=shared)
+    write = AIMDLimiter("test_write", initial=2, minimum=2, maximum=2, shared=shared)
+    priority = AIMDLimiter("test_priority", initial=2, minimum=2, maximum=2)
+    assert read.try_acquire() and read.try_acquire() and write.try_acquire()
+    assert not write.try_acquire() # below its own limit, above the shared one
+    assert priority.try_acquire() and priority.try_acquire()
+
+    read.release(started_at=1.0, congested=False)
+    assert write.try_acquire()
+    assert shared.in_flight == 3
+
+@pytest.mark.admission_limiter
+def test_non_priority_classes_leave_the_priority_connections():
+    pool_capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    assert LIMITERS[READ].shared is LIMITERS[WRITE].shared
+    assert LIMITERS[READ].shared.limit + settings.ADMISSION_PRIORITY_RESERVED <= pool_capacity
+    assert LIMITERS[PRIORITY].shared is None
+    assert LIMITERS[PRIORITY].limit <= LIMITERS[PRIORITY].maximum <= pool_capacity
+
+@pytest.mark.admission_limiter
+def test_route_classes():
+    classes = {
+        (route.path, method): route_class(route, method)
+        for route in iter_routes(app.routes) for method in getattr(route, "methods", ())
+    }
+    assert classes[("/auth/token", "POST")] == "auth"
+    assert classes[("/client/users/me/client/available_trainings/", "GET")] == READ
+    assert classes[("/coach/users/me/coach/trainings/create", "POST")] == "write"
+    assert classes[("/client/users/me/client/available_trainings/subscribe/", "POST")] == PRIORITY
+    assert classes[("/metrics", "GET")] is None
+
+@pytest.mark.asyncio
+@pytest.mark.admission_shedding
+async def test_requests_above_the_limit_are_shed(client: AsyncClient):
+    limiter = LIMITERS[READ]
+    limiter.in_flight += int(limiter.limit)
+    try:
+        response = await client.get("/client/users/me/client/available_trainings/")
+    finally:
+        limiter.in_flight -= int(limiter.limit)
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+    metrics = await client.get("/metrics")
+    assert 'admission_rejected_total{class="read",reason="limit"}' in metrics.text
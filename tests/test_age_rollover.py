@@ -0,0 +1,72 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import select
+from app.workers import AgeRolloverWorker
+import db.database as database
+from models.enums import Auditory, Discipline, Gender, Role, TrainingType
+from models.models import AvailableTraining, Interest, Subscription, Training, User
+from schemas.schemas import birthday, next_age_type_change
+
+@pytest.mark.age_rollover
+@pytest.mark.parametrize("birth_date, day, change", [
+    (date(2012, 5, 10), date(2026, 5, 9), date(2026, 5, 10)),
+    (date(2012, 5, 10), date(2026, 5, 10), date(2072, 5, 10)),
+    (date(2012, 2, 29), date(2026, 2, 28), date(2026, 3, 1)),
+    (date(1960, 1, 1), date(2026, 1, 1), None)
+])
+def test_next_age_type_change(birth_date, day, change):
+    assert next_age_type_change(birth_date, day) == change
+
+@pytest.mark.asyncio
+@pytest.mark.age_rollover
+async def test_a_child_turning_14_gets_the_adult_trainings_only(db_rows):
+    today = date.today()
+    start = datetime.combine(today + timedelta(days=3), datetime.min.time()).replace(hour=18)
+    coach, student = await db_rows(
+        User(name="Rollover coach", email="coach@rollover.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M),
+        User(
+            name="Rollover student", email="student@rollover.example.com", password="x", role=Role.STUDENT, age=13,
+            age_type=Auditory.CHILDREN, gender=Gender.M, birth_date=birthday(today, -14), age_type_until=today
+        )
+    )
+    trainings = await db_rows(*(
+        Training(
+            title="Rollover", time_start=start + offset, time_end=start + offset + timedelta(hours=1), type=type_,
+            discipline=Discipline.MMA, coach_id=coach.id, target_auditory=auditory,
+            individual_for_id=student.id if type_ == TrainingType.INDIVIDUAL else None
+        )
+        for offset, type_, auditory in (
+            (timedelta(0), TrainingType.GROUP, Auditory.CHILDREN),
+            (timedelta(days=1), TrainingType.GROUP, Auditory.CHILDREN),
+            (timedelta(days=2), TrainingType.GROUP, Auditory.ADULTS),
+            (timedelta(days=-10), TrainingType.GROUP, Auditory.ADULTS),
+            (timedelta(days=4), TrainingType.INDIVIDUAL, None)
+        )
+    ))
+    children, subscribed, adults, past_adults, individual = trainings
+    await db_rows(
+        Interest(user_id=student.id, discipline=Discipline.MMA),
+        *(AvailableTraining(user_id=student.id, training_id=training.id, training_time_start=training.time_start) for training in (children, individual)),
+        Subscription(student_id=student.id, training_id=subscribed.id, training_time_start=subscribed.time_start)
+    )
+    ids = {name: training.id for name, training in zip(("children", "subscribed", "adults", "past_adults", "individual"), trainings)}
+
+    users, removed, added = await AgeRolloverWorker(batch_size=100, interval=86400).run_once()
+
+    async with database.async_session_factory() as session:
+        rolled = (await session.execute(
+            select(User.age, User.age_type, User.age_type_until).where(User.id == student.id)
+        )).one()
+        available = set((await session.execute(
+            select(AvailableTraining.training_id).where(AvailableTraining.user_id == student.id)
+        )).scalars())
+        subscriptions = (await session.execute(
+            select(Subscription.training_id).where(Subscription.student_id == student.id)
+        )).scalars().all()
+
+    # the student is the only user of the test database due today
+    assert (users, removed, added) == (1, 1, 1)
+    assert tuple(rolled) == (14, Auditory.ADULTS, birthday(today, 46))
+    # the children training goes, the upcoming adult one comes, the subscription and the individual training stay
+    assert available == {ids["adults"], ids["individual"]}
+    assert subscriptions == [ids["subscribed"]]
@@ -0,0 +1,87 @@
+from datetime import datetime
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete
+from app.admission import LIMITERS, READ
+import db.database as database
+from models.enums import Discipline, Gender, Role, TrainingType
+from models.models import AvailableTraining, IdempotencyKey, Training, User
+
+@pytest.mark.asyncio
+@pytest.mark.batch_api
+async def test_batch_runs_sub_requests_in_order(monkeypatch, db_rows, auth_headers, client: AsyncClient):
+    lookups = []
+    get_user_by = database.ORMBase.get_user_by
+
+    async def counting_get_user_by(**kwargs):
+        lookups.append(kwargs)
+        return await get_user_by(**kwargs)
+
+    monkeypatch.setattr(database.ORMBase, "get_user_by", counting_get_user_by)
+    headers = auth_headers("student@batchapi.example.com")
+
+    coach, student = await db_rows(
+        User(name="Batch coach", email="coach@batchapi.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M),
+        User(name="Batch student", email="student@batchapi.example.com", password="x", role=Role.STUDENT, age=30, gender=Gender.M)
+    )
+    training, = await db_rows(Training(
+        title="Batch API", time_start=datetime(2025, 12, 31, 18), time_end=datetime(2025, 12, 31, 19),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=coach.id
+    ))
+    await db_rows(AvailableTraining(user_id=student.id, training_id=training.id, training_time_start=training.time_start))
+    training_id = training.id
+
+    available = {"method": "GET", "path": "/client/users/me/client/available_trainings/"}
+    response = await client.post("/batch", headers=headers, json={"requests": [
+        {"method": "GET", "path": "/client/users/me/client"},
+        available,
+        available,
+        {"method": "POST", "path": "/client/users/me/client/available_trainings/subscribe/", "params": {"training_id": training_id}},
+        {"method": "GET", "path": "/client/users/me/client/subscriptions/"},
+        available,
+        {"method": "GET", "path": "/client/users/me/client/unknown"},
+        {"method": "POST", "path": "/batch", "body": {"requests": []}}
+    ]})
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["status"] for result in results] == [200, 200, 200, 200, 200, 404, 404, 400]
+    assert results[0]["body"]["email"] == "student@batchapi.example.com"
+    # the reads before the subscription do not see it, the reads after it do
+    assert [training["id"] for training in results[1]["body"]] == [training_id]
+    assert results[2] == results[1]
+    assert results[3]["body"] == {"user_id": student.id, "training_id": training_id}
+    assert [training["id"] for training in results[4]["body"]] == [training_id]
+    assert results[5]["body"]["detail"] == "You have no available trainings"
+    # one principal for the whole batch
+    assert len(lookups) == 1
+
+@pytest.mark.asyncio
+@pytest.mark.batch_api
+async def test_batch_sub_requests_are_admitted_and_the_batch_is_idempotent(db_rows, auth_headers, client: AsyncClient):
+    headers = auth_headers("admitted@batchapi.example.com")
+    profile = {"method": "GET", "path": "/client/users/me/client"}
+    await db_rows(User(name="Batch student", email="admitted@batchapi.example.com", password="x", role=Role.STUDENT, age=30, gender=Gender.M))
+
+    limiter = LIMITERS[READ]
+    limiter.in_flight += int(limiter.limit)
+    try:
+        shed = await client.post("/batch", headers=headers, json={"requests": [profile]})
+    finally:
+        limiter.in_flight -= int(limiter.limit)
+
+    try:
+        first = await client.post("/batch", headers={**headers, "Idempotency-Key": "batch-1"}, json={"requests": [profile]})
+        retry = await client.post("/batch", headers={**headers, "Idempotency-Key": "batch-1"}, json={"requests": [profile]})
+    finally:
+        async with database.async_session_factory() as session:
+            await session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == "batch-1"))
+            await session.commit()
+
+    # the batch is admitted as a write, its read is shed in its slot
+    assert shed.status_code == 200
+    assert [result["status"] for result in shed.json()] == [503]
+
+    assert [result["status"] for result in first.json()] == [200]
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime
+import pytest
+from sqlalchemy import func, select
+import db.database as database
+from db.database import ClientService
+from models.enums import Discipline, Gender, Role, SubscriptionStatus, TrainingType
+from models.models import AvailableTraining, Subscription, Training, User
+from schemas.schemas import UserDTO
+
+# the fan-out rows carry the time_start of their training, the partition key
+START = datetime(2025, 12, 31, 18)
+
+async def add_students_and_trainings(db_rows, students: int, capacities):
+    users = await db_rows(*(
+        User(
+            name=f"Batch {n}", email=f"batch{n}@batch.example.com", password="x",
+            role=Role.COACH if n == 0 else Role.STUDENT, age=30, gender=Gender.M
+        )
+        for n in range(students + 1)
+    ))
+    trainings = await db_rows(*(
+        Training(
+            title="Batch", time_start=START, time_end=datetime(2025, 12, 31, 19),
+            type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=users[0].id, capacity=capacity
+        )
+        for capacity in capacities
+    ))
+    return users, [training.id for training in trainings]
+
+@pytest.mark.asyncio
+@pytest.mark.batch_subscriptions
+async def test_batch_subscribe_reports_each_training(db_rows):
+    users, (open_id, full_id, other_id) = await add_students_and_trainings(db_rows, 2, [5, 1, None])
+    await db_rows(
+        AvailableTraining(user_id=users[1].id, training_id=open_id, training_time_start=START),
+        AvailableTraining(user_id=users[1].id, training_id=full_id, training_time_start=START),
+        AvailableTraining(user_id=users[2].id, training_id=full_id, training_time_start=START)
+    )
+    student, other = [ClientService(UserDTO.model_validate(user, from_attributes=True)) for user in users[1:]]
+
+    await other.subscribe_to_training(full_id)
+
+    results = await student.subscribe_to_trainings([open_id, full_id, other_id, open_id])
+    assert [(result.training_id, result.status) for result in results] == [
+        (open_id, SubscriptionStatus.SUBSCRIBED),
+        (full_id, SubscriptionStatus.FULL),
+        (other_id, SubscriptionStatus.NOT_AVAILABLE)
+    ]
+    # a full training stays available
+    assert [training.id for training in await student.show_available_trainings()] == [full_id]
+
+    results = await student.unsubscribe_from_trainings([open_id, full_id])
+    assert [result.status for result in results] == [SubscriptionStatus.UNSUBSCRIBED, SubscriptionStatus.NOT_SUBSCRIBED]
+    async with database.async_session_factory() as session:
+        assert (await session.get(Training, open_id)).seats_taken == 0
+
+@pytest.mark.asyncio
+@pytest.mark.batch_subscriptions
+async def test_concurrent_batches_in_any_order_keep_the_seats_consistent(db_rows):
+    users, training_ids = await add_students_and_trainings(db_rows, 10, [4, 4, 4])
+    await db_rows(*(
+        AvailableTraining(user_id=user.id, training_id=training_id, training_time_start=START) for user in users[1:] for training_id in training_ids
+    ))
+    students = [ClientService(UserDTO.model_validate(user, from_attributes=True)) for user in users[1:]]
+
+    await asyncio.gather(*(
+        student.subscribe_to_trainings(training_ids if n % 2 else training_ids[::-1])
+        for n, student in enumerate(students)
+    ))
+    async with database.async_session_factory() as session:
+        for training_id in training_ids:
+            subscribers = (await session.execute(
+                select(func.count()).select_from(Subscription).where(Subscription.training_id == training_id)
+            )).scalar()
+            assert subscribers == (await session.get(Training, training_id)).seats_taken == 4
@@ -0,0 +1,60 @@
+from datetime import datetime
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+import db.database as database
+from models.enums import Discipline, Gender, Role, TrainingType
+from models.models import Training, User
+
+def training(coach_id: int, title: str, start: datetime, discipline: Discipline = Discipline.MMA) -> Training:
+    return Training(
+        title=title, time_start=start, time_end=start.replace(hour=start.hour + 1),
+        type=TrainingType.GROUP, discipline=discipline, coach_id=coach_id
+    )
+
+@pytest.mark.asyncio
+@pytest.mark.bulk_schedule
+async def test_shift_and_cancel_only_touch_the_selected_trainings_of_the_coach(db_rows, auth_headers, client: AsyncClient):
+    headers = auth_headers("coach@bulkschedule.example.com")
+    coach, other = await db_rows(
+        User(name="Bulk coach", email="coach@bulkschedule.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M),
+        User(name="Other coach", email="other@bulkschedule.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M)
+    )
+    coach_id, other_id = coach.id, other.id
+    first, second, third, grappling, foreign = [training.id for training in await db_rows(
+        training(coach_id, "Evening", datetime(2025, 12, 22, 18)),
+        training(coach_id, "Evening", datetime(2025, 12, 29, 18)),
+        training(coach_id, "Evening", datetime(2026, 1, 5, 18)),
+        training(coach_id, "Grappling", datetime(2025, 12, 23, 18), Discipline.WRESTLING),
+        training(other_id, "Evening", datetime(2025, 12, 22, 18))
+    )]
+
+    unfiltered = await client.post("/coach/users/me/coach/trainings/cancel", headers=headers, json={})
+    shifted = await client.patch("/coach/users/me/coach/trainings/shift", headers=headers, json={
+        "title": "Evening", "date_start": "2025-12-22", "date_end": "2025-12-31", "minutes": 30
+    })
+    cancelled = await client.post("/coach/users/me/coach/trainings/cancel", headers=headers, json={
+        "discipline": "wrestling", "training_ids": [grappling, foreign]
+    })
+
+    async with database.async_session_factory() as session:
+        starts = {
+            training_id: time_start.replace(tzinfo=None) for training_id, time_start in (await session.execute(
+                select(Training.id, Training.time_start).where(Training.coach_id.in_([coach_id, other_id]))
+            )).all()
+        }
+
+    assert unfiltered.status_code == 422
+
+    assert shifted.status_code == 200
+    assert sorted(training["id"] for training in shifted.json()["detail"]["content"]) == [first, second]
+    assert cancelled.status_code == 200
+    assert cancelled.json()["ids"] == [grappling]
+
+    # the window is inclusive of its last day, the trainings of another coach are never selected
+    assert starts == {
+        first: datetime(2025, 12, 22, 18, 30),
+        second: datetime(2025, 12, 29, 18, 30),
+        third: datetime(2026, 1, 5, 18),
+        foreign: datetime(2025, 12, 22, 18)
+    }
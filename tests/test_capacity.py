@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import db.database as database
+from db.database import ClientService, CoachService
+from models.enums import Discipline, Gender, Role, TrainingType
+from models.models import AvailableTraining, Training, User
+from schemas.exceptions import BusinessRulesValidationError, TrainingIsFullError
+from schemas.schemas import UserDTO
+
+@pytest.mark.asyncio
+@pytest.mark.training_capacity
+async def test_concurrent_subscribers_never_exceed_the_capacity(db_rows):
+    users = await db_rows(*(
+        User(
+            name=f"Capacity {n}", email=f"capacity{n}@capacity.example.com", password="x",
+            role=Role.COACH if n == 0 else Role.STUDENT, age=30, gender=Gender.M
+        )
+        for n in range(9)
+    ))
+    training, = await db_rows(Training(
+        title="Capacity", time_start=datetime(2025, 12, 31, 18), time_end=datetime(2025, 12, 31, 19),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=users[0].id, capacity=3
+    ))
+    await db_rows(*(AvailableTraining(user_id=user.id, training_id=training.id, training_time_start=training.time_start) for user in users[1:]))
+    training_id = training.id
+    students = [UserDTO.model_validate(user, from_attributes=True) for user in users[1:]]
+
+    results = await asyncio.gather(
+        *(ClientService(student).subscribe_to_training(training_id) for student in students),
+        return_exceptions=True
+    )
+    subscribed = [student for student, result in zip(students, results) if not isinstance(result, Exception)]
+    assert len(subscribed) == 3
+    assert all(isinstance(result, TrainingIsFullError) for result in results if isinstance(result, Exception))
+
+    await ClientService(subscribed[0]).unsubscribe_from_training(training_id)
+
+    async with database.async_session_factory() as session:
+        assert (await session.get(Training, training_id)).seats_taken == 2
+        available = (await session.execute(
+            select(func.count()).select_from(AvailableTraining).where(AvailableTraining.training_id == training_id)
+        )).scalar()
+        # the rejected subscribers keep the training available, the unsubscribed one gets it back
+        assert available == 6
+
+@pytest.mark.asyncio
+@pytest.mark.training_capacity
+async def test_capacity_lowered_below_a_concurrent_subscription_is_rejected(monkeypatch, db_rows):
+    start = datetime.now().replace(microsecond=0) + timedelta(days=7)
+    coach, = await db_rows(User(name="Capacity coach", email="coach@lowered.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M))
+    training, = await db_rows(Training(
+        title="Capacity", time_start=start, time_end=start + timedelta(hours=1),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=coach.id, capacity=3, seats_taken=1
+    ))
+
+    get = AsyncSession.get
+
+    async def get_then_subscribe(session, *args, **kwargs):
+        # a student takes a seat between the check of the capacity and the update
+        found = await get(session, *args, **kwargs)
+        async with database.async_session_factory() as other:
+            await other.execute(update(Training).where(Training.id == training.id).values(seats_taken=Training.seats_taken + 1))
+            await other.commit()
+        return found
+
+    monkeypatch.setattr(AsyncSession, "get", get_then_subscribe)
+    with pytest.raises(BusinessRulesValidationError):
+        await CoachService(UserDTO.model_validate(coach, from_attributes=True)).update_training(training.id, capacity=1)
@@ -0,0 +1,47 @@
+import asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from app.context import RequestContext, RequestContextMiddleware, _request_context
+from app.deadlines import DeadlineMiddleware, deadline
+import db.database as database
+
+slow_app = FastAPI()
+
+@slow_app.get("/slow")
+@deadline(0.05)
+async def slow():
+    await asyncio.sleep(5)
+
+slow_app.add_middleware(DeadlineMiddleware, router=slow_app.router)
+slow_app.add_middleware(RequestContextMiddleware)
+
+@pytest.mark.asyncio
+@pytest.mark.deadlines_request
+async def test_request_past_its_deadline_returns_504():
+    async with AsyncClient(transport=ASGITransport(app=slow_app), base_url="http://test") as client:
+        response = await client.get("/slow")
+
+    assert response.status_code == 504
+
+@pytest.mark.asyncio
+@pytest.mark.deadlines_statement_timeout
+async def test_deadline_is_propagated_as_statement_timeout(app_lifespan):
+    ctx = RequestContext(scope={"type": "http", "method": "GET"})
+    ctx.deadline = ctx.started_at + 2
+    token = _request_context.set(ctx)
+    try:
+        async with database.async_session_factory() as session:
+            timeout = (await session.execute(text("SHOW statement_timeout"))).scalar()
+
+        ctx.deadline = ctx.started_at
+        with pytest.raises(DBAPIError) as error:
+            async with database.async_session_factory() as session:
+                await session.execute(text("SELECT pg_sleep(1)"))
+    finally:
+        _request_context.reset(token)
+
+    assert timeout != "0" # the default, no timeout
+    assert error.value.orig.sqlstate == "57014"
@@ -0,0 +1,49 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import func, select
+from app.config import settings
+import db.database as database
+from models.enums import Discipline, Role, TrainingType
+from models.models import AvailableTraining, Training, User
+
+# the fan-out rows carry the time_start of their training, the partition key
+START = datetime(2025, 12, 31, 18)
+
+async def add_training_and_students(session, students: int):
+    users = [
+        User(name=f"Fanout {n}", email=f"fanout{n}@fanout.example.com", password="x", role=Role.COACH if n == 0 else Role.STUDENT)
+        for n in range(students + 1)
+    ]
+    session.add_all(users)
+    await session.flush()
+    training = Training(
+        title="Fan-out", time_start=START, time_end=datetime(2025, 12, 31, 19),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=users[0].id
+    )
+    session.add(training)
+    await session.flush()
+    return training.id, [user.id for user in users[1:]]
+
+async def available_count(session, training_id: int) -> int:
+    return (await session.execute(
+        select(func.count()).select_from(AvailableTraining).where(AvailableTraining.training_id == training_id)
+    )).scalar()
+
+@pytest.mark.asyncio
+@pytest.mark.fanout_copy
+@pytest.mark.parametrize("threshold", [100, 1])
+async def test_fanout_writers_skip_existing_pairs(monkeypatch, app_lifespan, threshold):
+    monkeypatch.setattr(settings, "DB_COPY_THRESHOLD", threshold)
+    # nothing to clean up, the rows are rolled back
+    async with database.async_session_factory() as session:
+        try:
+            training_id, student_ids = await add_training_and_students(session, 5)
+            rows = [{"user_id": user_id, "training_id": training_id, "training_time_start": START} for user_id in student_ids]
+
+            await database.insert_available_trainings(session, rows[:2])
+            # twice in a transaction, the second one overlapping the first
+            await database.insert_available_trainings(session, rows)
+
+            assert await available_count(session, training_id) == 5
+        finally:
+            await session.rollback()
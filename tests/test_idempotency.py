@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+import pytest
+from httpx import AsyncClient
+from fastapi import Request
+from sqlalchemy import delete, func, select
+from app.idempotency import request_owner
+import db.database as database
+from models.enums import Gender, Role
+from models.models import IdempotencyKey, Training, User
+
+@pytest.mark.asyncio
+@pytest.mark.idempotency_keys
+async def test_retried_create_training_runs_once(db_rows, auth_headers, client: AsyncClient):
+    headers = auth_headers("coach@idempotency.example.com")
+    training = {
+        "title": "Idempotent",
+        "date": str(date.today() + timedelta(days=7)),
+        "time_start": "18:00:00",
+        "time_end": "19:00:00",
+        "type": "group",
+        "discipline": "MMA"
+    }
+
+    coach, = await db_rows(
+        User(name="Idempotent coach", email="coach@idempotency.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M)
+    )
+    try:
+        path = "/coach/users/me/coach/trainings/create"
+        first = await client.post(path, headers={**headers, "Idempotency-Key": "create-1"}, json=training)
+        retry = await client.post(path, headers={**headers, "Idempotency-Key": "create-1"}, json=training)
+        other = await client.post(path, headers={**headers, "Idempotency-Key": "create-1"}, json={**training, "title": "Other"})
+        without_key = await client.post(path, headers=headers, json=training)
+
+        async with database.async_session_factory() as session:
+            created = (await session.execute(
+                select(func.count()).select_from(Training).where(Training.coach_id == coach.id)
+            )).scalar()
+    finally:
+        async with database.async_session_factory() as session:
+            await session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == "create-1"))
+            await session.commit()
+
+    assert first.status_code == 201
+    assert (retry.status_code, retry.content) == (201, first.content)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert other.status_code == 422
+    assert without_key.status_code == 201
+    # the retry was not run again, the request without a key was
+    assert created == 2
+
+@pytest.mark.idempotency_keys
+def test_anonymous_owners_are_scoped_to_the_client_address():
+    def owner(client, headers=()):
+        return request_owner(Request({"type": "http", "headers": [(name.encode(), value.encode()) for name, value in headers], "client": client}))
+
+    assert owner(("10.0.0.1", 1000)) == owner(("10.0.0.1", 2000))
+    assert owner(("10.0.0.1", 1000)) != owner(("10.0.0.2", 1000))
+    # a header can't pose as the address of another client
+    assert owner(("10.0.0.1", 1000), [("authorization", "anonymous:10.0.0.2")]) != owner(("10.0.0.2", 1000))
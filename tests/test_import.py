@@ -0,0 +1,94 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+import db.database as database
+from app.ical import parse_events
+from models.enums import Discipline, Gender, Role
+from models.models import AvailableTraining, Interest, Training, User
+from schemas.exceptions import BusinessRulesValidationError
+
+CALENDAR = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+SUMMARY:Wrestling\\, beginners
+DTSTART;TZID=Europe/Paris:20250901T180000
+DTEND;TZID=Europe/Paris:20250901T193000
+RRULE:FREQ=WEEKLY;BYDAY=MO,TH;COUNT=4
+EXDATE;TZID=Europe/Paris:20250904T180000
+END:VEVENT
+END:VCALENDAR
+"""
+
+@pytest.mark.asyncio
+@pytest.mark.trainings_import
+async def test_import_creates_trainings_and_their_fanout(db_rows, auth_headers, client: AsyncClient):
+    headers = auth_headers("coach@import.example.com")
+    coach, man, woman = await db_rows(
+        User(name="Import coach", email="coach@import.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M),
+        User(name="Import man", email="man@import.example.com", password="x", role=Role.STUDENT, age=30, gender=Gender.M),
+        User(name="Import woman", email="woman@import.example.com", password="x", role=Role.STUDENT, age=30, gender=Gender.W)
+    )
+    await db_rows(
+        Interest(user_id=man.id, discipline=Discipline.MMA),
+        Interest(user_id=woman.id, discipline=Discipline.MMA),
+        Interest(user_id=woman.id, discipline=Discipline.WRESTLING)
+    )
+    coach_id, man_id, woman_id = coach.id, man.id, woman.id
+
+    season = [
+        {"date": "2025-09-01", "time_start": "18:00:00", "time_end": "19:00:00", "discipline": "MMA", "target_gender": "men"},
+        {"date": "2025-09-08", "time_start": "18:00:00", "time_end": "19:00:00", "discipline": "MMA", "target_gender": "men"},
+        {"date": "2025-09-02", "time_start": "18:00:00", "time_end": "19:00:00", "discipline": "MMA"},
+        {"date": "2025-09-03", "time_start": "12:00:00", "time_end": "13:00:00", "type": "individual", "individual_for_id": woman_id}
+    ]
+    invalid = await client.post("/coach/users/me/coach/trainings/import", headers=headers, json={"trainings": [
+        season[0], {**season[1], "time_end": "17:00:00"}, {**season[2], "type": "individual"}
+    ]})
+    imported = await client.post("/coach/users/me/coach/trainings/import", headers=headers, json={"trainings": season})
+    calendar = await client.post(
+        "/coach/users/me/coach/trainings/import/ical", headers={**headers, "Content-Type": "text/calendar"},
+        params={"discipline": "wrestling", "capacity": 10}, content=CALENDAR
+    )
+
+    async with database.async_session_factory() as session:
+        trainings = (await session.execute(
+            select(Training.id, Training.title, Training.capacity).where(Training.coach_id == coach_id).order_by(Training.time_start)
+        )).all()
+        fanout = set((await session.execute(
+            select(AvailableTraining.user_id, AvailableTraining.training_id).where(
+                AvailableTraining.training_id.in_([training.id for training in trainings])
+            )
+        )).all())
+
+    # nothing is created when a training of the season is invalid
+    assert invalid.status_code == 422
+    assert "training 1:" in invalid.json()["detail"] and "training 2:" in invalid.json()["detail"]
+
+    assert imported.status_code == 201
+    monday, tuesday, wednesday, next_monday = [training["id"] for training in imported.json()["detail"]["content"]]
+    assert calendar.status_code == 201
+    wrestling = [training["id"] for training in calendar.json()["detail"]["content"]]
+    assert len(wrestling) == 3
+    assert [(training.title, training.capacity) for training in trainings if training.id in wrestling] == [("Wrestling, beginners", 10)] * 3
+
+    assert fanout == {
+        (man_id, monday), (man_id, next_monday),
+        (man_id, tuesday), (woman_id, tuesday),
+        (woman_id, wednesday),
+        *((woman_id, training_id) for training_id in wrestling)
+    }
+
+
+@pytest.mark.trainings_import
+@pytest.mark.parametrize("rule", [
+    "FREQ=WEEKLY;INTERVAL=0;BYDAY=MO;UNTIL=20271231",
+    "FREQ=WEEKLY;INTERVAL=-1;COUNT=3",
+    "FREQ=WEEKLY;INTERVAL=abc;COUNT=3",
+    "FREQ=WEEKLY;BYDAY=XX;COUNT=3",
+    "FREQ=WEEKLY;COUNT=0",
+    "FREQ=WEEKLY;UNTIL=20251332",
+    "FREQ=WEEKLY;BYDAY=MO;UNTIL=99991231"
+])
+def test_import_rejects_unsupported_rrules(rule):
+    calendar = CALENDAR.replace("FREQ=WEEKLY;BYDAY=MO,TH;COUNT=4", rule)
+    with pytest.raises(BusinessRulesValidationError):
+        parse_events(calendar, 500)
@@ -0,0 +1,30 @@
+from datetime import date
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.main import app
+import db.database as database
+from db.database import available_trainings_window_query, warm_up_statements
+
+@pytest.mark.asyncio
+@pytest.mark.lifespan_engine
+async def test_lifespan_warms_up_and_disposes_the_engine(monkeypatch, engine):
+    monkeypatch.setattr(settings, "DB_NAME", settings.DB_TEST_NAME)
+    async with app.router.lifespan_context(app):
+        engine = database.async_engine
+        assert engine is not None
+        assert engine.pool.checkedin() == settings.DB_POOL_SIZE
+
+        async with engine.connect() as connection:
+            driver_connection = (await connection.get_raw_connection()).driver_connection
+            prepared = await driver_connection.fetchval("SELECT count(*) FROM pg_prepared_statements")
+            assert prepared >= len(warm_up_statements())
+
+            # the statement of the handler was prepared by the warm-up, none is added
+            async with AsyncSession(bind=connection) as session:
+                await session.execute(available_trainings_window_query(42, date(2026, 1, 1), date(2026, 1, 31)))
+                await session.rollback()
+            assert await driver_connection.fetchval("SELECT count(*) FROM pg_prepared_statements") == prepared
+
+    assert database.async_engine is None
+    assert engine.pool.checkedin() == 0
@@ -0,0 +1,28 @@
+from httpx import AsyncClient
+import pytest
+from app.metrics import Histogram, MetricsRegistry
+
+@pytest.mark.metrics_histogram
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("test_latency_seconds", "Test latency.", ("route",), (0.1, 1.0)))
+    histogram.observe("/a", value=0.05)
+    histogram.observe("/a", value=0.5)
+
+    rendered = registry.render()
+
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in rendered
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in rendered
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 2' in rendered
+    assert 'test_latency_seconds_count{route="/a"} 2' in rendered
+
+@pytest.mark.asyncio
+@pytest.mark.metrics_endpoint
+async def test_metrics_endpoint_exposes_route_latency(client: AsyncClient):
+    await client.post("/auth/token", data={})
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="POST",route="/auth/token",status="422"}' in response.text
+    assert "db_pool_checked_out" in response.text
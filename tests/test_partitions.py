@@ -0,0 +1,115 @@
+from datetime import date, datetime, time, timedelta
+import pytest
+from sqlalchemy import literal_column, select, text
+from sqlalchemy.dialects import postgresql
+import db.database as database
+from db.database import ClientService, CoachService, PartitionService, available_trainings_query, day_window
+from app.config import settings
+from db.partitions import add_months, month_start, partition_name, partitioned_until
+from models.enums import Discipline, Gender, Role, TrainingType
+from models.models import AvailableTraining, Subscription, Training, User
+from schemas.exceptions import BusinessRulesValidationError
+from schemas.schemas import TrainingAddDTO, TrainingsSelectionDTO, UserDTO
+
+@pytest.mark.asyncio
+@pytest.mark.partitions
+async def test_windowed_queries_read_the_partitions_of_their_months_only(app_lifespan):
+    month = date(2099, 1, 1)
+    try:
+        assert await PartitionService.create_month_partitions(month)
+        assert not await PartitionService.create_month_partitions(month)
+
+        query = available_trainings_query(
+            0, *day_window(AvailableTraining.training_time_start, month, month + timedelta(days=30)),
+            *day_window(Training.time_start, month, month + timedelta(days=30))
+        )
+        async with database.async_session_factory() as session:
+            sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            plan = "\n".join((await session.execute(text(f"EXPLAIN {sql}"))).scalars())
+    finally:
+        async with database.async_session_factory() as session:
+            for table in ("subscriptions", "available_trainings"):
+                await session.execute(text(f"DROP TABLE {partition_name(table, month)}"))
+            # the foreign keys of the fan-out reference the partitions of the trainings until they are detached
+            await session.execute(text(f"ALTER TABLE trainings DETACH PARTITION {partition_name('trainings', month)}"))
+            await session.execute(text(f"DROP TABLE {partition_name('trainings', month)}"))
+            await session.commit()
+
+    assert partition_name("trainings", month) in plan and partition_name("available_trainings", month) in plan
+    assert "_default" not in plan and "trainings_2098_12" not in plan
+
+@pytest.mark.asyncio
+@pytest.mark.partitions
+async def test_a_training_moved_to_another_month_takes_its_fanout_along(db_rows):
+    # the last evening of the current month, the migrations and the maintainer created its partitions and the next ones
+    start = datetime.combine(add_months(month_start(date.today()), 1) - timedelta(days=1), time(18))
+    coach, *students = await db_rows(
+        User(name="Partition coach", email="coach@partitions.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M),
+        *(
+            User(name=f"Partition {n}", email=f"student{n}@partitions.example.com", password="x", role=Role.STUDENT, age=30, gender=Gender.M)
+            for n in range(2)
+        )
+    )
+    training, = await db_rows(Training(
+        title="Partitions", time_start=start, time_end=start + timedelta(hours=1),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=coach.id
+    ))
+    await db_rows(*(
+        AvailableTraining(user_id=student.id, training_id=training.id, training_time_start=training.time_start) for student in students
+    ))
+    coach_dto = UserDTO.model_validate(coach, from_attributes=True)
+    subscriber, other = [ClientService(UserDTO.model_validate(student, from_attributes=True)) for student in students]
+    training_id = training.id
+
+    await subscriber.subscribe_to_training(training_id)
+    await CoachService(coach_dto).shift_trainings(TrainingsSelectionDTO(training_ids=[training_id]), minutes=2 * 24 * 60)
+
+    async with database.async_session_factory() as session:
+        partitions = {
+            row.partition: row.training_time_start for row in (await session.execute(
+                select(literal_column("tableoid::regclass::text").label("partition"), Subscription.training_time_start).where(
+                    Subscription.training_id == training_id
+                ).union_all(
+                    select(literal_column("tableoid::regclass::text"), AvailableTraining.training_time_start).where(
+                        AvailableTraining.training_id == training_id
+                    )
+                )
+            )).all()
+        }
+    available = await other.show_available_trainings(
+        date_start=start.date() + timedelta(days=2), date_end=start.date() + timedelta(days=2)
+    )
+    await subscriber.unsubscribe_from_training(training_id)
+
+    next_month = add_months(month_start(date.today()), 1)
+    assert set(partitions) == {partition_name("subscriptions", next_month), partition_name("available_trainings", next_month)}
+    assert {moved.replace(tzinfo=None) for moved in partitions.values()} == {start + timedelta(days=2)}
+    assert [training.id for training in available] == [training_id]
+
+@pytest.mark.asyncio
+@pytest.mark.partitions
+async def test_trainings_after_the_partitioned_months_are_refused(db_rows):
+    until = partitioned_until(date.today(), settings.PARTITION_MONTHS_AHEAD)
+    last = datetime.combine(until - timedelta(days=1), time(18))
+    coach, = await db_rows(
+        User(name="Horizon coach", email="coach@horizon.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M)
+    )
+    training, = await db_rows(Training(
+        title="Horizon", time_start=last, time_end=last + timedelta(hours=1),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=coach.id
+    ))
+    coach_service = CoachService(UserDTO.model_validate(coach, from_attributes=True))
+    later = TrainingAddDTO(
+        title="Horizon", time_start=last + timedelta(days=1), time_end=last + timedelta(days=1, hours=1),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=coach.id
+    )
+
+    with pytest.raises(BusinessRulesValidationError):
+        await coach_service.create_trainings([later])
+    with pytest.raises(BusinessRulesValidationError):
+        await coach_service.shift_trainings(TrainingsSelectionDTO(training_ids=[training.id]), minutes=24 * 60)
+
+    async with database.async_session_factory() as session:
+        starts = (await session.execute(select(Training.time_start).where(Training.coach_id == coach.id))).scalars().all()
+    # the shift is rolled back
+    assert [start.replace(tzinfo=None) for start in starts] == [last]
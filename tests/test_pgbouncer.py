@@ -0,0 +1,62 @@
+import asyncio
+import os
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from db.database import available_trainings_query, create_engine, user_by_email_query
+
+PGBOUNCER_TEST_URL = os.environ.get("PGBOUNCER_TEST_URL") # postgresql+asyncpg://... of a PgBouncer in transaction pooling
+
+
+async def prepared_statements(engine) -> int:
+    async with engine.connect() as connection:
+        driver_connection = (await connection.get_raw_connection()).driver_connection
+        return await driver_connection.fetchval("SELECT count(*) FROM pg_prepared_statements")
+
+
+@pytest.mark.asyncio
+@pytest.mark.pgbouncer_mode
+async def test_pgbouncer_mode_leaves_no_prepared_statement_on_the_server_connection():
+    engine = create_engine(settings.get_db_url_with_asyncpg_test, pgbouncer_mode=True)
+    try:
+        for _ in range(3):
+            async with AsyncSession(bind=engine) as session:
+                await session.execute(user_by_email_query("nobody@example.com"))
+                await session.execute(available_trainings_query(0))
+        assert await prepared_statements(engine) == 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.pgbouncer_mode
+async def test_default_mode_keeps_the_prepared_statements():
+    engine = create_engine(settings.get_db_url_with_asyncpg_test)
+    try:
+        async with AsyncSession(bind=engine) as session:
+            await session.execute(user_by_email_query("nobody@example.com"))
+        assert await prepared_statements(engine) > 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.pgbouncer_mode
+@pytest.mark.skipif(PGBOUNCER_TEST_URL is None, reason="PGBOUNCER_TEST_URL is not set")
+async def test_concurrent_sessions_through_pgbouncer():
+    # more sessions than server connections, every transaction may land on another backend
+    engine = create_engine(PGBOUNCER_TEST_URL, pgbouncer_mode=True)
+
+    async def worker(number: int) -> None:
+        for _ in range(10):
+            async with AsyncSession(bind=engine) as session:
+                async with session.begin():
+                    await session.execute(text("SET LOCAL statement_timeout = 5000"))
+                    await session.execute(user_by_email_query(f"nobody{number}@example.com"))
+                    await session.execute(available_trainings_query(number))
+
+    try:
+        await asyncio.gather(*(worker(number) for number in range(settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)))
+    finally:
+        await engine.dispose()
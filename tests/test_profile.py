@@ -0,0 +1,68 @@
+from datetime import date, datetime, timedelta
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+import db.database as database
+from models.enums import Auditory, Discipline, Gender, Role, TrainingType, UserType
+from models.models import AvailableTraining, Interest, Subscription, Training, User
+
+@pytest.mark.asyncio
+@pytest.mark.profile_update
+async def test_profile_and_interests_updates_apply_the_availability_diff(db_rows, auth_headers, client: AsyncClient):
+    headers = auth_headers("student@profile.example.com")
+    start = datetime.combine(date.today() + timedelta(days=3), datetime.min.time()).replace(hour=18)
+    coach, student = await db_rows(
+        User(name="Profile coach", email="coach@profile.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M),
+        User(
+            name="Profile student", email="student@profile.example.com", password="x", role=Role.STUDENT, age=30,
+            age_type=Auditory.ADULTS, gender=Gender.M, user_type=UserType.BEGINNER
+        )
+    )
+    men, subscribed, women, bjj = await db_rows(*(
+        Training(
+            title="Profile", time_start=start + timedelta(days=day), time_end=start + timedelta(days=day, hours=1),
+            type=TrainingType.GROUP, discipline=discipline, coach_id=coach.id, target_gender=gender
+        )
+        for day, discipline, gender in (
+            (0, Discipline.MMA, Gender.M), (1, Discipline.MMA, Gender.M), (2, Discipline.MMA, Gender.W), (3, Discipline.BJJ, None)
+        )
+    ))
+    await db_rows(
+        Interest(user_id=student.id, discipline=Discipline.MMA),
+        AvailableTraining(user_id=student.id, training_id=men.id, training_time_start=men.time_start),
+        Subscription(student_id=student.id, training_id=subscribed.id, training_time_start=subscribed.time_start)
+    )
+
+    async def available():
+        async with database.async_session_factory() as session:
+            return set((await session.execute(
+                select(AvailableTraining.training_id).where(AvailableTraining.user_id == student.id)
+            )).scalars())
+
+    empty = await client.patch("/client/users/me/client", headers=headers, json={})
+    profile = await client.patch("/client/users/me/client", headers=headers, json={"gender": "woman", "level": "competitor"})
+    after_profile = await available()
+    interests = await client.patch("/client/users/me/client/interests", headers=headers, json={"add": ["BJJ"], "remove": ["MMA"]})
+    after_interests = await available()
+    # the sub-requests after the update see the updated user
+    batch = await client.post("/batch", headers=headers, json={"requests": [
+        {"method": "PATCH", "path": "/client/users/me/client", "body": {"name": "Renamed"}},
+        {"method": "GET", "path": "/client/users/me/client"}
+    ]})
+
+    async with database.async_session_factory() as session:
+        subscriptions = (await session.execute(
+            select(Subscription.training_id).where(Subscription.student_id == student.id)
+        )).scalars().all()
+
+    assert empty.status_code == 422
+    assert profile.status_code == 200
+    assert (profile.json()["gender"], profile.json()["user_type"]) == ("woman", "competitor")
+    assert after_profile == {women.id}
+
+    assert interests.status_code == 200 and interests.json() == ["BJJ"]
+    assert after_interests == {bjj.id}
+
+    assert [result["status"] for result in batch.json()] == [200, 200]
+    assert batch.json()[1]["body"]["name"] == "Renamed"
+    assert subscriptions == [subscribed.id]
@@ -0,0 +1,31 @@
+from httpx import AsyncClient
+import pytest
+from app.config import settings
+
+@pytest.mark.asyncio
+@pytest.mark.profiler_request
+async def test_profiled_request_stores_collapsed_stacks(client: AsyncClient, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "admin-secret")
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_INTERVAL_MS", 0.1)
+    admin_headers = {"X-Admin-Token": "admin-secret"}
+
+    response = await client.post("/auth/logout", headers={"X-Profile": "1", **admin_headers})
+    profile_id = response.headers["X-Profile-Id"]
+    profile = await client.get(f"/admin/profiles/{profile_id}", headers=admin_headers)
+
+    assert response.status_code == 204
+    assert profile.status_code == 200
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in profile.text.splitlines())
+
+@pytest.mark.asyncio
+@pytest.mark.profiler_request
+async def test_profile_header_is_ignored_without_admin_token(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "admin-secret")
+
+    response = await client.post("/auth/logout", headers={"X-Profile": "1"})
+
+    assert response.status_code == 204
+    assert "X-Profile-Id" not in response.headers
@@ -0,0 +1,35 @@
+import pytest
+from app.context import RequestContext
+from app.query_budget import find_violations, query_budget, statement_shape
+
+class FakeRoute:
+    def __init__(self, path, endpoint):
+        self.path = path
+        self.endpoint = endpoint
+
+@query_budget(2)
+async def budgeted_endpoint():
+    pass
+
+def make_context(statements):
+    ctx = RequestContext(scope={"method": "GET", "route": FakeRoute("/budgeted", budgeted_endpoint)})
+    for statement in statements:
+        ctx.statements += 1
+        shape = statement_shape(statement)
+        ctx.statement_shapes[shape] = ctx.statement_shapes.get(shape, 0) + 1
+    return ctx
+
+@pytest.mark.query_budget_shape
+def test_statement_shape_ignores_parameters():
+    assert statement_shape("SELECT * FROM users WHERE id IN ($1, $2, $3)") == statement_shape("SELECT * FROM users WHERE id IN ($1)")
+    assert statement_shape("SELECT *\nFROM users WHERE id = $1") == "SELECT * FROM users WHERE id = ?"
+
+@pytest.mark.query_budget_violations
+def test_budget_and_repeated_statements_are_reported():
+    assert find_violations(make_context(["SELECT 1", "SELECT 2"])) == []
+
+    over_budget = find_violations(make_context(["SELECT 1", "SELECT 2", "SELECT 3"]))
+    assert len(over_budget) == 1 and "budget is 2" in over_budget[0]
+
+    n_plus_one = find_violations(make_context(["SELECT * FROM users WHERE id = $1"] * 5))
+    assert any("possible N+1" in violation for violation in n_plus_one)
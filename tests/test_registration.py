@@ -23,6 +23,7 @@ async def test_user_registration_success(client: AsyncClient, db_session: AsyncS
     logger.debug(f"Received response: status={response.status_code}, body={response.json()}")
     assert response.status_code == 201
     assert response.json()["email"] == test_user_data["email"]
+    assert "password" not in response.json()
     #user_exists = await ORMBase.user_exists(name=test_user_data["name"], email=test_user_data["email"], session=db_session)
     #assert user_exists
 
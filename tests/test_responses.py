@@ -0,0 +1,39 @@
+import pytest
+from datetime import datetime, timezone
+from typing import List
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from app.responses import DTOListResponse
+from models.enums import Discipline, TrainingType
+from schemas.schemas import TrainingDTO
+
+trainings = [
+    TrainingDTO(
+        id=id, title="Évening MMA", time_start=datetime(2025, 12, 31, 18, tzinfo=timezone.utc),
+        time_end=datetime(2025, 12, 31, 19, 30, tzinfo=timezone.utc), type=TrainingType.GROUP,
+        discipline=Discipline.MMA, coach_id=1
+    )
+    for id in range(3)
+]
+
+app = FastAPI()
+
+@app.get("/validated", response_model=List[TrainingDTO])
+async def validated() -> List[TrainingDTO]:
+    return trainings
+
+@app.get("/direct", response_model=List[TrainingDTO], response_class=DTOListResponse)
+async def direct():
+    return DTOListResponse(trainings)
+
+@pytest.mark.asyncio
+@pytest.mark.responses_dto_list
+async def test_dto_list_response_matches_response_model_output():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        validated_response = await client.get("/validated")
+        direct_response = await client.get("/direct")
+
+    assert direct_response.status_code == 200
+    assert direct_response.headers["content-type"] == "application/json"
+    assert direct_response.json() == validated_response.json()
+    assert DTOListResponse([]).body == b"[]"
@@ -0,0 +1,83 @@
+from datetime import date, datetime, timedelta
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, text
+from app.metrics import RETENTION_ROWS_RECLAIMED
+from app.workers import RetentionWorker
+import db.database as database
+from db.database import PartitionService
+from db.partitions import partition_name
+from models.enums import Discipline, Gender, Role, TrainingType
+from models.models import AvailableTraining, Subscription, SubscriptionHistory, Training, User, WaitlistEntry
+
+@pytest_asyncio.fixture
+async def past_month(app_lifespan):
+    month = date(2001, 1, 1)
+    assert await PartitionService.create_month_partitions(month)
+    yield month
+    # after db_rows deleted the users, and with them the rows of the month
+    async with database.async_session_factory() as session:
+        await session.execute(text(f"DROP TABLE IF EXISTS {partition_name('available_trainings', month)}"))
+        await session.execute(text(f"DROP TABLE {partition_name('subscriptions', month)}"))
+        await session.execute(text(f"ALTER TABLE trainings DETACH PARTITION {partition_name('trainings', month)}"))
+        await session.execute(text(f"DROP TABLE {partition_name('trainings', month)}"))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+@pytest.mark.retention
+async def test_retention_prunes_past_availability_and_archives_old_subscriptions(past_month, db_rows):
+    month = past_month
+    now = datetime.now()
+    coach, student = await db_rows(
+        User(name="Retention coach", email="coach@retention.example.com", password="x", role=Role.COACH, age=30, gender=Gender.M),
+        User(name="Retention student", email="student@retention.example.com", password="x", role=Role.STUDENT, age=30, gender=Gender.M)
+    )
+    old, recent, upcoming = trainings = await db_rows(*(
+        Training(
+            title="Retention", time_start=start, time_end=start + timedelta(hours=1),
+            type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=coach.id
+        )
+        for start in (datetime(2001, 1, 10, 18), now - timedelta(days=1), now + timedelta(days=7))
+    ))
+    await db_rows(
+        *(AvailableTraining(user_id=student.id, training_id=training.id, training_time_start=training.time_start) for training in trainings),
+        *(Subscription(student_id=coach.id, training_id=training.id, training_time_start=training.time_start) for training in (old, recent)),
+        *(WaitlistEntry(student_id=student.id, training_id=training.id, training_time_start=training.time_start) for training in (recent, upcoming))
+    )
+    user_ids = [coach.id, student.id]
+    async with database.async_session_factory() as session:
+        # the rows of a dropped partition are counted from its statistics
+        await session.execute(text(f"ANALYZE {partition_name('available_trainings', month)}"))
+        await session.commit()
+
+    dropped_before = RETENTION_ROWS_RECLAIMED.get("available_trainings", "dropped")
+    reclaimed = await RetentionWorker(batch_size=1, archive_after_days=30, interval=3600).run_once()
+
+    async with database.async_session_factory() as session:
+        available = (await session.execute(
+            select(AvailableTraining.training_id).where(AvailableTraining.user_id.in_(user_ids))
+        )).scalars().all()
+        subscribed = (await session.execute(
+            select(Subscription.training_id).where(Subscription.student_id.in_(user_ids))
+        )).scalars().all()
+        waitlisted = (await session.execute(
+            select(WaitlistEntry.training_id).where(WaitlistEntry.student_id.in_(user_ids))
+        )).scalars().all()
+        archived = (await session.execute(
+            select(SubscriptionHistory.training_id, SubscriptionHistory.training_time_start).where(SubscriptionHistory.student_id.in_(user_ids))
+        )).all()
+        partition_left = (await session.execute(
+            select(func.to_regclass(partition_name("available_trainings", month)))
+        )).scalar()
+
+    # the partition of the past month is dropped, the rows of the started trainings of the other months are deleted
+    assert partition_left is None
+    assert available == [upcoming.id]
+    assert reclaimed["dropped"] == 1 and reclaimed["deleted"] == 1
+    assert RETENTION_ROWS_RECLAIMED.get("available_trainings", "dropped") - dropped_before == reclaimed["dropped"]
+    assert waitlisted == [upcoming.id] and reclaimed["waitlist"] == 1
+
+    assert subscribed == [recent.id]
+    assert [(training_id, start.replace(tzinfo=None)) for training_id, start in archived] == [(old.id, datetime(2001, 1, 10, 18))]
+    assert reclaimed["archived"] == 1
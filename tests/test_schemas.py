@@ -0,0 +1,38 @@
+import pytest
+from datetime import date, datetime, time
+from models.enums import Auditory, Discipline, TrainingType
+from schemas.exceptions import TimeValidationError
+from schemas.schemas import TrainingDTO, TrainingOnInputDTO, dtos_from_orm, parse_date, parse_time
+
+class FakeTraining:
+    def __init__(self, **columns):
+        self.__dict__.update(columns)
+
+@pytest.mark.schemas_parsing
+@pytest.mark.parametrize("value", ["2025-12-31", "2025-1-5", "2024-02-29"])
+def test_parse_date_matches_strptime(value):
+    assert parse_date(value) == datetime.strptime(value, "%Y-%m-%d").date()
+
+@pytest.mark.schemas_parsing
+@pytest.mark.parametrize("value", ["9:00:00", "18:30:59", "00:00:00"])
+def test_parse_time_matches_strptime(value):
+    assert parse_time(value) == datetime.strptime(value, "%H:%M:%S").time()
+
+@pytest.mark.schemas_parsing
+@pytest.mark.parametrize("field, value", [("date", "2025-02-30"), ("date", "31.12.2025"), ("time_start", "24:00:00"), ("time_start", "9:00")])
+def test_invalid_date_and_time_are_rejected(field, value):
+    data = {"date": "2025-12-31", "time_start": "09:00:00", "time_end": "10:00:00"}
+    data[field] = value
+    with pytest.raises(TimeValidationError):
+        TrainingOnInputDTO(**data)
+
+@pytest.mark.schemas_parsing
+def test_dtos_from_orm():
+    training = FakeTraining(
+        id=1, title="MMA", description=None, time_start=datetime(2025, 12, 31, 9), time_end=datetime(2025, 12, 31, 10),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=1, individual_for_id=None,
+        target_auditory=Auditory.ADULTS, target_gender=None, target_usertype=None
+    )
+    dto = TrainingOnInputDTO(date="2025-12-31", time_start="9:00:00", time_end="10:00:00")
+    assert (dto.date, dto.time_start) == (date(2025, 12, 31), time(9))
+    assert dtos_from_orm(TrainingDTO, [training]) == [TrainingDTO.model_validate(training, from_attributes=True)]
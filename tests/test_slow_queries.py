@@ -0,0 +1,37 @@
+from httpx import AsyncClient
+import pytest
+from sqlalchemy import text
+from app.config import settings
+from app.slow_queries import _explain, record_slow_query, redact_parameters
+import db.database as database
+
+@pytest.mark.slow_queries_redaction
+def test_slow_query_parameters_are_redacted():
+    assert redact_parameters(("alice@example.com", 42)) == ["<str>", "<int>"]
+    assert redact_parameters({"email": "alice@example.com"}) == {"email": "<str>"}
+    assert redact_parameters([(1, 2), (3, 4)], executemany=True) == "<2 parameter sets>"
+
+@pytest.mark.asyncio
+@pytest.mark.slow_queries_admin
+async def test_slow_queries_endpoint_requires_admin_token(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "admin-secret")
+    record_slow_query({"statement": "SELECT 1", "duration_ms": 500.0})
+
+    forbidden = await client.get("/admin/slow-queries", headers={"X-Admin-Token": "wrong"})
+    allowed = await client.get("/admin/slow-queries", headers={"X-Admin-Token": "admin-secret"})
+
+    assert forbidden.status_code == 403
+    assert allowed.status_code == 200
+    assert allowed.json()[0]["statement"] == "SELECT 1"
+
+@pytest.mark.asyncio
+@pytest.mark.slow_queries_explain
+async def test_failed_explain_leaves_the_transaction_usable(app_lifespan):
+    async with database.async_session_factory() as session:
+        assert (await session.execute(text("SELECT 1"))).scalar() == 1
+        plan = await session.run_sync(lambda sync_session: _explain(sync_session.connection(), "SELECT 1 / 0", ()))
+        assert plan is None
+        assert (await session.execute(text("SELECT 2"))).scalar() == 2
+
+        plan = await session.run_sync(lambda sync_session: _explain(sync_session.connection(), "SELECT 3", ()))
+        assert any("Result" in line for line in plan)
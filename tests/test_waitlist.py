@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete, select, update
+from app.workers import WaitlistWorker
+import db.database as database
+from db.database import ClientService
+from models.enums import Discipline, Gender, Role, TrainingType
+from models.models import AvailableTraining, Subscription, Training, User
+from schemas.exceptions import TrainingIsFullError
+from schemas.schemas import UserDTO
+
+@pytest.mark.asyncio
+@pytest.mark.waitlist_promotion
+async def test_freed_seats_go_to_the_waitlist_in_order(db_rows):
+    start = datetime.now().replace(microsecond=0) + timedelta(days=7)
+    users = await db_rows(*(
+        User(
+            name=f"Waitlist {n}", email=f"waitlist{n}@waitlist.example.com", password="x",
+            role=Role.COACH if n == 0 else Role.STUDENT, age=30, gender=Gender.M
+        )
+        for n in range(5)
+    ))
+    training, = await db_rows(Training(
+        title="Waitlist", time_start=start, time_end=start + timedelta(hours=1),
+        type=TrainingType.GROUP, discipline=Discipline.MMA, coach_id=users[0].id, capacity=1
+    ))
+    await db_rows(*(AvailableTraining(user_id=user.id, training_id=training.id, training_time_start=training.time_start) for user in users[1:]))
+    training_id = training.id
+    first, second, third, fourth = [ClientService(UserDTO.model_validate(user, from_attributes=True)) for user in users[1:]]
+
+    await first.subscribe_to_training(training_id)
+    assert (await second.join_waitlist(training_id)).position == 1
+    assert (await third.join_waitlist(training_id)).position == 2
+    assert (await second.join_waitlist(training_id)).position == 1
+
+    await first.unsubscribe_from_training(training_id)
+    # the freed seat is kept for the waitlist
+    with pytest.raises(TrainingIsFullError):
+        await fourth.subscribe_to_training(training_id)
+
+    workers = [WaitlistWorker(batch_size=10, poll_interval=1) for _ in range(2)]
+    assert await workers[0].run_once() == 1
+    assert [entry.position for entry in await third.show_my_waitlist()] == [1]
+
+    # a student re-targeted out of the training since joining is not promoted
+    assert (await fourth.join_waitlist(training_id)).position == 2
+    async with database.async_session_factory() as session:
+        await session.execute(delete(AvailableTraining).where(AvailableTraining.user_id == fourth.user.id))
+        await session.execute(update(Training).where(Training.id == training_id).values(capacity=5))
+        await session.commit()
+    # concurrent workers promote the remaining student once
+    assert sum(await asyncio.gather(*(worker.run_once() for worker in workers))) == 1
+
+    async with database.async_session_factory() as session:
+        subscribers = (await session.execute(
+            select(Subscription.student_id).where(Subscription.training_id == training_id)
+        )).scalars().all()
+        assert sorted(subscribers) == sorted([second.user.id, third.user.id])
+        assert (await session.get(Training, training_id)).seats_taken == 2
+        assert await third.show_my_waitlist() == []
+        assert [entry.position for entry in await fourth.show_my_waitlist()] == [1]
+
+    # nor is anybody once the training started
+    started = start - timedelta(days=8)
+    async with database.async_session_factory() as session:
+        await session.execute(update(Training).where(Training.id == training_id).values(time_start=started))
+        await session.execute(AvailableTraining.__table__.insert().values(
+            user_id=fourth.user.id, training_id=training_id, training_time_start=started
+        ))
+        await session.commit()
+    assert await workers[0].run_once() == 0